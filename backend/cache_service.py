@@ -6,14 +6,20 @@ This module provides caching functionality for API responses:
 - Search results caching
 - Automatic cache invalidation on mutations
 - TTL-based expiration
+- Stale-while-revalidate (soft/hard TTL) for catalog data
 - Cache warming for frequently accessed data
 """
 
 import redis.asyncio as redis
+from redis.exceptions import WatchError
+from redis_pool import RedisPool, get_redis_pool
+import asyncio
 import hashlib
 import json
 import logging
-from typing import Optional, Dict, Any, List
+import time
+import uuid
+from typing import Optional, Dict, Any, List, Callable, Awaitable
 from datetime import timedelta
 import os
 
@@ -22,6 +28,9 @@ logger = logging.getLogger(__name__)
 class CacheService:
     """Manages API response caching using Redis"""
     
+    # Hash field marking a fully loaded cart (so empty carts are cacheable)
+    CART_LOADED_FIELD = "__loaded__"
+    
     def __init__(self, redis_url: str = None):
         """Initialize Redis connection for caching
         
@@ -29,29 +38,46 @@ class CacheService:
             redis_url: Redis connection URL (default: from environment or localhost)
         """
         self.redis_url = redis_url or os.environ.get('REDIS_URL', 'redis://localhost:6379')
+        # An explicit URL gets its own pool; otherwise use the shared one
+        self._own_pool = RedisPool(redis_url) if redis_url else None
         self.redis_client: Optional[redis.Redis] = None
+        # Namespace for every cache key on the shared Redis pool
+        self.key_prefix = ""
         self.default_ttl = 300  # 5 minutes default TTL
+        # Extra time a value may still be served (stale) after its soft TTL
+        self.stale_ttl = int(os.environ.get('CACHE_STALE_TTL', '3600'))
+        # In-flight background refreshes, one per key
+        self._refresh_tasks: Dict[str, asyncio.Task] = {}
         
     async def connect(self):
         """Establish Redis connection"""
+        pool = self._own_pool or get_redis_pool()
         try:
-            self.redis_client = await redis.from_url(
-                self.redis_url,
-                encoding="utf-8",
-                decode_responses=True
-            )
+            self.redis_client = pool.get_client()
+            self.key_prefix = pool.key_prefix_for("cache")
             await self.redis_client.ping()
             logger.info("Redis cache connection established")
         except Exception as e:
             logger.warning(f"Failed to connect to Redis cache: {e}")
-            # Don't raise - app should work without cache
+            # Don't raise - app should work without cache; the circuit
+            # breaker keeps calls cheap until Redis comes back
     
     async def disconnect(self):
         """Close Redis connection"""
+        for task in list(self._refresh_tasks.values()):
+            task.cancel()
+        self._refresh_tasks.clear()
         if self.redis_client:
-            await self.redis_client.close()
+            # The shared pool is closed once at shutdown
+            if self._own_pool:
+                await self._own_pool.close()
+            self.redis_client = None
             logger.info("Redis cache connection closed")
     
+    def _key(self, key: str) -> str:
+        """Apply the cache namespace prefix to a key"""
+        return f"{self.key_prefix}{key}"
+    
     def _generate_cache_key(self, prefix: str, *args, **kwargs) -> str:
         """Generate cache key from prefix and parameters
         
@@ -90,7 +116,7 @@ class CacheService:
             return None
             
         try:
-            cached = await self.redis_client.get(key)
+            cached = await self.redis_client.get(self._key(key))
             if cached:
                 logger.debug(f"Cache HIT: {key}")
                 return json.loads(cached)
@@ -114,7 +140,7 @@ class CacheService:
         try:
             ttl = ttl_seconds or self.default_ttl
             await self.redis_client.setex(
-                key,
+                self._key(key),
                 ttl,
                 json.dumps(value)
             )
@@ -132,7 +158,7 @@ class CacheService:
             return
             
         try:
-            await self.redis_client.delete(key)
+            await self.redis_client.delete(self._key(key))
             logger.debug(f"Cache DELETE: {key}")
         except Exception as e:
             logger.error(f"Cache delete error for {key}: {e}")
@@ -152,7 +178,7 @@ class CacheService:
             while True:
                 cursor, keys = await self.redis_client.scan(
                     cursor,
-                    match=pattern,
+                    match=self._key(pattern),
                     count=100
                 )
                 if keys:
@@ -164,6 +190,141 @@ class CacheService:
         except Exception as e:
             logger.error(f"Cache delete pattern error for {pattern}: {e}")
     
+    # ============ Stale-While-Revalidate ============
+    
+    async def set_with_soft_ttl(
+        self,
+        key: str,
+        value: Any,
+        soft_ttl: int,
+        hard_ttl: Optional[int] = None
+    ):
+        """Cache value that turns stale after soft_ttl and expires after hard_ttl
+        
+        Args:
+            key: Cache key
+            value: Value to cache
+            soft_ttl: Seconds the value is considered fresh
+            hard_ttl: Seconds until Redis evicts the value (default: soft_ttl + stale_ttl)
+        """
+        if not self.redis_client:
+            return
+        
+        try:
+            hard = hard_ttl or soft_ttl + self.stale_ttl
+            envelope = {"value": value, "fresh_until": time.time() + soft_ttl}
+            await self.redis_client.setex(self._key(key), hard, json.dumps(envelope))
+            logger.debug(f"Cache SET (SWR): {key} (soft: {soft_ttl}s, hard: {hard}s)")
+        except Exception as e:
+            logger.error(f"Cache set error for {key}: {e}")
+    
+    async def get_or_revalidate(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        soft_ttl: int,
+        hard_ttl: Optional[int] = None
+    ) -> Any:
+        """Return cached value, refreshing it in the background once stale
+        
+        Fresh values are returned as-is. Stale values (past soft_ttl but not
+        yet evicted) are returned immediately while a single background task
+        rebuilds them. Only a complete miss awaits the loader.
+        
+        Args:
+            key: Cache key
+            loader: Coroutine function that rebuilds the value from the database
+            soft_ttl: Seconds the value is considered fresh
+            hard_ttl: Seconds until the value is evicted (default: soft_ttl + stale_ttl)
+            
+        Returns:
+            Cached or freshly loaded value
+        """
+        if not self.redis_client:
+            return await loader()
+        
+        envelope = await self.get(key)
+        if isinstance(envelope, dict) and "fresh_until" in envelope:
+            if time.time() >= envelope["fresh_until"]:
+                logger.debug(f"Cache STALE: {key}")
+                self._schedule_refresh(key, loader, soft_ttl, hard_ttl)
+            return envelope["value"]
+        
+        # Hard miss: coalesce concurrent rebuilds of the same key
+        task = self._refresh_tasks.get(key)
+        if task is None or task.done():
+            task = self._track(key, self._load(key, loader, soft_ttl, hard_ttl))
+        value = await asyncio.shield(task)
+        if value is None:
+            # Joined a background refresh that deferred to another worker
+            value = await loader()
+        return value
+    
+    def _track(self, key: str, coro: Awaitable[Any]) -> asyncio.Task:
+        """Run coro as the single in-flight rebuild task for key"""
+        task = asyncio.create_task(coro)
+        self._refresh_tasks[key] = task
+        
+        def _untrack(done: asyncio.Task):
+            if self._refresh_tasks.get(key) is done:
+                del self._refresh_tasks[key]
+        
+        task.add_done_callback(_untrack)
+        return task
+    
+    def _schedule_refresh(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        soft_ttl: int,
+        hard_ttl: Optional[int]
+    ):
+        """Start a background refresh for key unless one is already running"""
+        task = self._refresh_tasks.get(key)
+        if task and not task.done():
+            return
+        self._track(key, self._refresh(key, loader, soft_ttl, hard_ttl))
+    
+    async def _load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        soft_ttl: int,
+        hard_ttl: Optional[int]
+    ) -> Any:
+        """Rebuild a key from the loader and cache the result"""
+        value = await loader()
+        await self.set_with_soft_ttl(key, value, soft_ttl, hard_ttl)
+        return value
+    
+    async def _refresh(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        soft_ttl: int,
+        hard_ttl: Optional[int]
+    ) -> Any:
+        """Rebuild a stale key; a short Redis lock keeps other workers from doing the same"""
+        lock_key = self._key(f"lock:refresh:{key}")
+        try:
+            acquired = await self.redis_client.set(lock_key, "1", nx=True, ex=30)
+            if not acquired:
+                logger.debug(f"Cache refresh already running elsewhere: {key}")
+                return None
+            
+            try:
+                value = await self._load(key, loader, soft_ttl, hard_ttl)
+                logger.debug(f"Cache REFRESHED: {key}")
+                return value
+            finally:
+                await self.redis_client.delete(lock_key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Keep serving the stale value; the next request retries
+            logger.error(f"Cache background refresh failed for {key}: {e}")
+            return None
+    
     # ============ Product Caching ============
     
     async def get_products(self, filters: Dict[str, Any]) -> Optional[List[Dict]]:
@@ -212,6 +373,44 @@ class CacheService:
         key = f"products:detail:{product_id}"
         await self.set(key, product, ttl_seconds)
     
+    async def get_or_load_products(
+        self,
+        filters: Dict[str, Any],
+        loader: Callable[[], Awaitable[List[Dict]]],
+        soft_ttl: int = 300
+    ) -> List[Dict]:
+        """Get product list, serving stale data while it is rebuilt
+        
+        Args:
+            filters: Filter parameters
+            loader: Coroutine function that queries the product list
+            soft_ttl: Seconds before the list is refreshed (default: 5 minutes)
+            
+        Returns:
+            Product list
+        """
+        key = self._generate_cache_key("products:list", **filters)
+        return await self.get_or_revalidate(key, loader, soft_ttl)
+    
+    async def get_or_load_product(
+        self,
+        product_id: str,
+        loader: Callable[[], Awaitable[Dict]],
+        soft_ttl: int = 600
+    ) -> Dict:
+        """Get single product, serving stale data while it is rebuilt
+        
+        Args:
+            product_id: Product ID
+            loader: Coroutine function that queries the product
+            soft_ttl: Seconds before the product is refreshed (default: 10 minutes)
+            
+        Returns:
+            Product data
+        """
+        key = f"products:detail:{product_id}"
+        return await self.get_or_revalidate(key, loader, soft_ttl)
+    
     async def invalidate_products(self):
         """Invalidate all product caches"""
         await self.delete_pattern("products:*")
@@ -226,38 +425,468 @@ class CacheService:
         # Also invalidate product lists since they contain this product
         await self.delete_pattern("products:list:*")
     
+    # ============ Rating Summary Caching ============
+    
+    # Left in place of a summary after a review write; fills can't land until it expires
+    RATING_TOMBSTONE = "-"
+    RATING_TOMBSTONE_SECONDS = 5
+    
+    async def get_rating_summaries(self, product_ids: List[str]) -> Dict[str, Dict]:
+        """Get cached rating summaries for many products in one MGET
+        
+        Args:
+            product_ids: Product IDs
+            
+        Returns:
+            Mapping of product ID to summary for the IDs that are cached
+        """
+        if not self.redis_client or not product_ids:
+            return {}
+        
+        try:
+            values = await self.redis_client.mget(
+                [self._key(f"ratings:{product_id}") for product_id in product_ids]
+            )
+            return {
+                product_id: json.loads(value)
+                for product_id, value in zip(product_ids, values)
+                if value and value != self.RATING_TOMBSTONE
+            }
+        except Exception as e:
+            logger.error(f"Cache get error for rating summaries: {e}")
+            return {}
+    
+    async def set_rating_summaries(self, summaries: Dict[str, Dict], ttl_seconds: int = 3600):
+        """Cache rating summaries read from the database
+        
+        Only fills missing keys (SET NX): a summary read before a review write
+        committed can't overwrite the write's tombstone and linger for the TTL.
+        
+        Args:
+            summaries: Mapping of product ID to summary
+            ttl_seconds: Time to live (default: 1 hour)
+        """
+        if not self.redis_client or not summaries:
+            return
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for product_id, summary in summaries.items():
+                pipe.set(self._key(f"ratings:{product_id}"), json.dumps(summary), ex=ttl_seconds, nx=True)
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Cache set error for rating summaries: {e}")
+    
+    async def invalidate_product_rating(self, product_id: str):
+        """Invalidate caches holding a product's rating after a review write
+        
+        The summary is replaced by a short tombstone rather than deleted, so
+        a reader that loaded the old summary just before the commit can't
+        cache it again. Product lists are left alone; they overlay ratings
+        from the rating summary cache on every read.
+        
+        Args:
+            product_id: Product ID
+        """
+        if self.redis_client:
+            try:
+                await self.redis_client.set(
+                    self._key(f"ratings:{product_id}"), self.RATING_TOMBSTONE, ex=self.RATING_TOMBSTONE_SECONDS
+                )
+            except Exception as e:
+                logger.error(f"Cache tombstone error for ratings:{product_id}: {e}")
+        await self.delete(f"products:detail:{product_id}")
+    
+    # ============ Recently Viewed Buffer ============
+    
+    # Sorted-set member marking a history that was seeded from the database
+    VIEWS_LOADED_MEMBER = "__loaded__"
+    # Hash of views not yet written to MySQL ("user_id|product_id" -> timestamp)
+    VIEWS_PENDING_KEY = "recently_viewed:pending"
+    
+    async def record_view(self, user_id: str, product_id: str, viewed_at: float, max_items: int) -> bool:
+        """Buffer a product view in the user's sorted set
+        
+        Args:
+            user_id: User ID
+            product_id: Viewed product ID
+            viewed_at: View time (epoch seconds)
+            max_items: Number of products kept per user
+            
+        Returns:
+            True if buffered, False if Redis is unavailable
+        """
+        if not self.redis_client:
+            return False
+        
+        key = self._key(f"recently_viewed:{user_id}")
+        try:
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.zadd(key, {product_id: viewed_at})
+            # Keep the newest max_items (the loaded marker scores +inf and always survives)
+            pipe.zremrangebyrank(key, 0, -(max_items + 2))
+            pipe.expire(key, 86400 * 30)
+            pipe.hset(self._key(self.VIEWS_PENDING_KEY), f"{user_id}|{product_id}", viewed_at)
+            await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Cache view buffer error for {key}: {e}")
+            return False
+    
+    async def get_recent_views(self, user_id: str, limit: int) -> Optional[List[tuple]]:
+        """Get buffered views, newest first
+        
+        Args:
+            user_id: User ID
+            limit: Maximum number of views
+            
+        Returns:
+            [(product_id, viewed_at)] or None if the history was never seeded
+        """
+        if not self.redis_client:
+            return None
+        
+        key = self._key(f"recently_viewed:{user_id}")
+        try:
+            entries = await self.redis_client.zrevrange(key, 0, limit, withscores=True)
+            if not entries or entries[0][0] != self.VIEWS_LOADED_MEMBER:
+                return None
+            return entries[1:limit + 1]
+        except Exception as e:
+            logger.error(f"Cache get error for {key}: {e}")
+            return None
+    
+    async def seed_recent_views(self, user_id: str, views: List[tuple], max_items: int):
+        """Merge database history into the buffer and mark it loaded
+        
+        Views buffered before seeding keep their (newer) timestamps.
+        
+        Args:
+            user_id: User ID
+            views: [(product_id, viewed_at)] from the database
+            max_items: Number of products kept per user
+        """
+        if not self.redis_client:
+            return
+        
+        key = self._key(f"recently_viewed:{user_id}")
+        try:
+            pipe = self.redis_client.pipeline(transaction=True)
+            if views:
+                pipe.zadd(key, dict(views), nx=True)
+            pipe.zadd(key, {self.VIEWS_LOADED_MEMBER: float("inf")})
+            pipe.zremrangebyrank(key, 0, -(max_items + 2))
+            pipe.expire(key, 86400 * 30)
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Cache set error for {key}: {e}")
+    
+    async def take_pending_views(self) -> Optional[Dict[str, str]]:
+        """Atomically take all views waiting to be written to MySQL
+        
+        Returns:
+            {"user_id|product_id": timestamp}, {} if nothing is pending,
+            or None if Redis is unavailable
+        """
+        if not self.redis_client:
+            return None
+        
+        pending = self._key(self.VIEWS_PENDING_KEY)
+        claimed = f"{pending}:{uuid.uuid4()}"
+        try:
+            if not await self.redis_client.exists(pending):
+                return {}
+            # RENAME hands the batch to exactly one flusher
+            await self.redis_client.rename(pending, claimed)
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.hgetall(claimed)
+            pipe.delete(claimed)
+            views, _ = await pipe.execute()
+            return views
+        except redis.ResponseError:
+            # Another flusher claimed it between EXISTS and RENAME
+            return {}
+        except Exception as e:
+            logger.error(f"Cache take pending views error: {e}")
+            return None
+    
+    async def restore_pending_views(self, views: Dict[str, str]):
+        """Put back views whose database write failed
+        
+        A view recorded since the batch was taken is newer, so it is kept
+        (HSETNX) rather than overwritten with the older timestamp.
+        
+        Args:
+            views: {"user_id|product_id": timestamp}
+        """
+        if not self.redis_client or not views:
+            return
+        
+        key = self._key(self.VIEWS_PENDING_KEY)
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for member, viewed_at in views.items():
+                pipe.hsetnx(key, member, viewed_at)
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Cache restore pending views error: {e}")
+    
     # ============ User-Specific Caching ============
     
     async def get_cart(self, user_id: str) -> Optional[List[Dict]]:
-        """Get cached cart
+        """Get cached cart items
+        
+        The cart is a Redis hash keyed by product ID. A marker field
+        distinguishes a cached empty cart from a cart that was never loaded.
         
         Args:
             user_id: User ID
             
         Returns:
-            Cached cart or None
+            Cart items (without product details) or None if not cached
         """
-        key = f"cart:{user_id}"
-        return await self.get(key)
+        if not self.redis_client:
+            return None
+        
+        key = self._key(f"cart:{user_id}")
+        try:
+            fields = await self.redis_client.hgetall(key)
+            if self.CART_LOADED_FIELD not in fields:
+                logger.debug(f"Cache MISS: {key}")
+                return None
+            logger.debug(f"Cache HIT: {key}")
+            items = [
+                json.loads(value)
+                for field, value in fields.items()
+                if field != self.CART_LOADED_FIELD
+            ]
+            return sorted(items, key=lambda item: item.get("added_at") or "")
+        except Exception as e:
+            logger.error(f"Cache get error for {key}: {e}")
+            return None
+    
+    def _cart_version_key(self, user_id: str) -> str:
+        return self._key(f"cart_version:{user_id}")
     
-    async def set_cart(self, user_id: str, cart: List[Dict], ttl_seconds: int = 600):
-        """Cache user cart
+    async def get_cart_version(self, user_id: str) -> Optional[str]:
+        """Current cart version, read before loading the cart from MySQL
+        
+        Every cart write bumps the version, so a cache fill that carries the
+        version it started from can tell that a write raced it.
         
         Args:
             user_id: User ID
-            cart: Cart data
-            ttl_seconds: Time to live (default: 10 minutes)
+            
+        Returns:
+            Opaque version token (None if the cart was never written)
+        """
+        if not self.redis_client:
+            return None
+        
+        try:
+            return await self.redis_client.get(self._cart_version_key(user_id))
+        except Exception as e:
+            logger.error(f"Cache get cart version error: {e}")
+            return None
+    
+    async def set_cart(self, user_id: str, cart: List[Dict], ttl_seconds: int = 86400,
+                       fill_version: Optional[str] = None, fill: bool = False):
+        """Replace user cart hash with the given items
+        
+        A write after a committed cart change bumps the cart version. A fill
+        (fill=True) from a database read only lands if the version still
+        equals fill_version, so a read that raced a write can't pin a stale
+        cart for the whole TTL.
+        
+        Args:
+            user_id: User ID
+            cart: Cart items (id, product_id, quantity, added_at)
+            ttl_seconds: Time to live (default: 24 hours, refreshed on every write)
+            fill_version: Version read before the database load (fills only)
+            fill: Whether this is a cache fill rather than a cart change
+        """
+        if not self.redis_client:
+            return
+        
+        key = self._key(f"cart:{user_id}")
+        version_key = self._cart_version_key(user_id)
+        mapping = {item["product_id"]: json.dumps(item) for item in cart}
+        mapping[self.CART_LOADED_FIELD] = "1"
+        try:
+            async with self.redis_client.pipeline(transaction=True) as pipe:
+                if fill:
+                    await pipe.watch(version_key)
+                    if await pipe.get(version_key) != fill_version:
+                        logger.debug(f"Cache fill skipped, cart changed: {key}")
+                        return
+                    pipe.multi()
+                pipe.delete(key)
+                pipe.hset(key, mapping=mapping)
+                pipe.expire(key, ttl_seconds)
+                if not fill:
+                    pipe.incr(version_key)
+                    pipe.expire(version_key, ttl_seconds)
+                await pipe.execute()
+            logger.debug(f"Cache SET: {key} ({len(cart)} items)")
+        except WatchError:
+            logger.debug(f"Cache fill skipped, cart changed: {key}")
+        except Exception as e:
+            logger.error(f"Cache set error for {key}: {e}")
+            if not fill:
+                await self.invalidate_cart(user_id)
+    
+    async def set_cart_item(self, user_id: str, item: Dict, ttl_seconds: int = 86400):
+        """Write-through a single cart item
+        
+        Only touches carts that are already cached; an unloaded cart stays
+        a miss so it is rebuilt in full from the database. The version is
+        bumped either way, and a fill landing between the check and the
+        write aborts the transaction and drops the cart.
+        
+        Args:
+            user_id: User ID
+            item: Cart item (id, product_id, quantity, added_at)
+            ttl_seconds: Time to live (default: 24 hours)
+        """
+        if not self.redis_client:
+            return
+        
+        key = self._key(f"cart:{user_id}")
+        version_key = self._cart_version_key(user_id)
+        try:
+            async with self.redis_client.pipeline(transaction=True) as pipe:
+                await pipe.watch(key)
+                loaded = await pipe.hexists(key, self.CART_LOADED_FIELD)
+                pipe.multi()
+                if loaded:
+                    pipe.hset(key, item["product_id"], json.dumps(item))
+                    pipe.expire(key, ttl_seconds)
+                pipe.incr(version_key)
+                pipe.expire(version_key, ttl_seconds)
+                await pipe.execute()
+            logger.debug(f"Cache HSET: {key} -> {item['product_id']}")
+        except Exception as e:
+            if not isinstance(e, WatchError):
+                logger.error(f"Cache set error for {key}: {e}")
+            await self.invalidate_cart(user_id)
+    
+    async def remove_cart_item(self, user_id: str, product_id: str, ttl_seconds: int = 86400):
+        """Write-through removal of a cart item
+        
+        Args:
+            user_id: User ID
+            product_id: Product ID of the removed item
+            ttl_seconds: Time to live of the cart version
         """
-        key = f"cart:{user_id}"
-        await self.set(key, cart, ttl_seconds)
+        if not self.redis_client:
+            return
+        
+        key = self._key(f"cart:{user_id}")
+        version_key = self._cart_version_key(user_id)
+        try:
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.hdel(key, product_id)
+            pipe.incr(version_key)
+            pipe.expire(version_key, ttl_seconds)
+            await pipe.execute()
+            logger.debug(f"Cache HDEL: {key} -> {product_id}")
+        except Exception as e:
+            logger.error(f"Cache delete error for {key}: {e}")
+            await self.invalidate_cart(user_id)
     
-    async def invalidate_cart(self, user_id: str):
-        """Invalidate user cart cache
+    async def get_cart_count(self, user_id: str) -> Optional[int]:
+        """Get total quantity in cached cart (for header badges)
         
         Args:
             user_id: User ID
+            
+        Returns:
+            Total item quantity or None if the cart is not cached
         """
-        await self.delete(f"cart:{user_id}")
+        items = await self.get_cart(user_id)
+        if items is None:
+            return None
+        return sum(item.get("quantity", 0) for item in items)
+    
+    async def invalidate_cart(self, user_id: str, ttl_seconds: int = 86400):
+        """Invalidate user cart cache (and any fill in flight)
+        
+        Args:
+            user_id: User ID
+            ttl_seconds: Time to live of the cart version
+        """
+        if not self.redis_client:
+            return
+        
+        key = self._key(f"cart:{user_id}")
+        version_key = self._cart_version_key(user_id)
+        try:
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.delete(key)
+            pipe.incr(version_key)
+            pipe.expire(version_key, ttl_seconds)
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Cache invalidate error for {key}: {e}")
+    
+    async def get_product_snapshots(self, product_ids: List[str]) -> Dict[str, Dict]:
+        """Get cached product snapshots referenced by carts
+        
+        Args:
+            product_ids: Product IDs
+            
+        Returns:
+            Mapping of product ID to snapshot for the IDs that are cached
+        """
+        if not self.redis_client or not product_ids:
+            return {}
+        
+        try:
+            values = await self.redis_client.mget(
+                [self._key(f"products:snapshot:{product_id}") for product_id in product_ids]
+            )
+            return {
+                product_id: json.loads(value)
+                for product_id, value in zip(product_ids, values)
+                if value
+            }
+        except Exception as e:
+            logger.error(f"Cache get error for product snapshots: {e}")
+            return {}
+    
+    async def set_product_snapshots(self, products: List[Dict], ttl_seconds: int = 3600):
+        """Cache product snapshots referenced by carts
+        
+        Args:
+            products: Product snapshots (must include id)
+            ttl_seconds: Time to live (default: 1 hour)
+        """
+        if not self.redis_client or not products:
+            return
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for product in products:
+                pipe.setex(self._key(f"products:snapshot:{product['id']}"), ttl_seconds, json.dumps(product))
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Cache set error for product snapshots: {e}")
+    
+    async def delete_product_snapshots(self, product_ids: List[str]):
+        """Drop product snapshots after stock or catalog changes
+        
+        Args:
+            product_ids: Product IDs
+        """
+        if not self.redis_client or not product_ids:
+            return
+        
+        try:
+            await self.redis_client.delete(
+                *[self._key(f"products:snapshot:{product_id}") for product_id in product_ids]
+            )
+        except Exception as e:
+            logger.error(f"Cache delete error for product snapshots: {e}")
     
     async def get_wishlist(self, user_id: str) -> Optional[List[Dict]]:
         """Get cached wishlist
@@ -379,6 +1008,25 @@ class CacheService:
         key = f"search:suggestions:{query.lower()}"
         await self.set(key, suggestions, ttl_seconds)
     
+    async def get_or_load_search_suggestions(
+        self,
+        query: str,
+        loader: Callable[[], Awaitable[Dict]],
+        soft_ttl: int = 1800
+    ) -> Dict:
+        """Get search suggestions, serving stale data while they are rebuilt
+        
+        Args:
+            query: Search query
+            loader: Coroutine function that builds the suggestions
+            soft_ttl: Seconds before suggestions are refreshed (default: 30 minutes)
+            
+        Returns:
+            Suggestions data
+        """
+        key = f"search:suggestions:{query.lower()}"
+        return await self.get_or_revalidate(key, loader, soft_ttl)
+    
     # ============ Recommended Products Caching ============
     
     async def get_recommended_products(self, user_id: str) -> Optional[List[Dict]]:
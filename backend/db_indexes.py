@@ -0,0 +1,74 @@
+"""Declared Index Reconciliation
+
+create_all only creates missing tables, so indexes added to a model never
+reach an existing database. This module closes that gap:
+- Compares indexes declared on the models with the live schema
+- Matches by column list, so equivalent indexes under other names
+  (e.g. the idx_* keys in mysql_schema.sql) are not duplicated
+- Creates missing non-unique indexes; InnoDB builds them online
+- Unique indexes are reported, not created (existing rows may need deduplicating)
+"""
+
+import logging
+from typing import List, Tuple, Set
+
+from sqlalchemy import inspect, Index, MetaData
+
+logger = logging.getLogger(__name__)
+
+
+def existing_index_columns(inspector, table_name: str) -> Set[Tuple[str, ...]]:
+    """Column lists of every index (including unique keys) on a table"""
+    columns = {tuple(index["column_names"]) for index in inspector.get_indexes(table_name)}
+    primary_key = inspector.get_pk_constraint(table_name).get("constrained_columns")
+    if primary_key:
+        columns.add(tuple(primary_key))
+    return columns
+
+
+def find_missing_indexes(sync_conn, metadata: MetaData) -> List[Index]:
+    """Declared indexes whose column list has no match in the database
+
+    Tables that don't exist yet are skipped; create_all builds them with
+    all their indexes. So are indexes on columns that don't exist yet: the
+    migration that adds the column creates them.
+    """
+    inspector = inspect(sync_conn)
+    tables = set(inspector.get_table_names())
+    missing = []
+    for table in metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        present = existing_index_columns(inspector, table.name)
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for index in sorted(table.indexes, key=lambda ix: ix.name):
+            index_columns = tuple(column.name for column in index.columns)
+            if not set(index_columns) <= columns:
+                continue
+            if index_columns not in present:
+                missing.append(index)
+    return missing
+
+
+async def ensure_indexes(conn, metadata: MetaData) -> List[str]:
+    """Create declared indexes that are missing from existing tables
+
+    Args:
+        conn: Async connection (inside a transaction block)
+        metadata: Model metadata
+
+    Returns:
+        Names of the indexes created
+    """
+    created = []
+    for index in await conn.run_sync(find_missing_indexes, metadata):
+        if index.unique:
+            logger.warning(
+                f"[DATABASE] Unique index {index.name} on {index.table.name} is missing; "
+                f"it needs a data migration and was not created"
+            )
+            continue
+        logger.info(f"[DATABASE] Creating index {index.name} on {index.table.name}...")
+        await conn.run_sync(index.create)
+        created.append(index.name)
+    return created
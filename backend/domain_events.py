@@ -0,0 +1,183 @@
+"""Order and Payment Domain Events
+
+Order handlers used to send emails and touch caches inline, after the commit
+but before responding. They now publish domain events instead:
+- OrderCreated, OrderStatusChanged, OrderDeleted, PaymentCaptured and
+  PaymentReversed are published after the transaction that caused them commits
+- Publishing never blocks: events go on a bounded in-process queue, and a
+  full queue drops the event with a warning rather than slow a request
+- Subscribers (emails, cache invalidation, sales rollups) are async and run
+  in a small pool of background workers; a failing subscriber is logged and
+  does not affect the others
+- Delivery is at most once and in-process: an event still queued when the
+  worker dies is lost, so subscribers must be best-effort side effects
+"""
+
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Callable, Awaitable, Type
+
+logger = logging.getLogger(__name__)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@dataclass
+class OrderCreated:
+    """A new order was committed"""
+    order_id: str
+    user_id: str
+    total_amount: float
+    payment_status: str
+    order_status: str
+    shipping_address: str
+    items: List[Dict[str, Any]]
+    payment_method: Optional[str] = None
+    cart_cleared: bool = False
+    # Name, email and email preferences when the publisher already has them
+    customer: Optional[Dict[str, Any]] = None
+    occurred_at: datetime = field(default_factory=_now)
+
+
+@dataclass
+class OrderStatusChanged:
+    """An order moved to a new fulfilment status"""
+    order_id: str
+    user_id: str
+    old_status: str
+    new_status: str
+    tracking_number: Optional[str] = None
+    estimated_delivery: Optional[datetime] = None
+    occurred_at: datetime = field(default_factory=_now)
+
+
+@dataclass
+class OrderDeleted:
+    """An admin deleted an order (undoes what its other events counted)"""
+    order_id: str
+    user_id: str
+    total_amount: float
+    payment_status: str
+    order_status: str
+    created_at: Optional[datetime] = None
+    occurred_at: datetime = field(default_factory=_now)
+
+
+@dataclass
+class PaymentCaptured:
+    """Payment for an order was received"""
+    order_id: str
+    user_id: str
+    amount: float
+    gateway: str  # stripe, razorpay, manual (admin)
+    session_id: Optional[str] = None
+    customer: Optional[Dict[str, Any]] = None
+    occurred_at: datetime = field(default_factory=_now)
+
+
+@dataclass
+class PaymentReversed:
+    """A paid order went back to pending, failed or refunded (undoes PaymentCaptured)"""
+    order_id: str
+    user_id: str
+    amount: float
+    new_status: str
+    occurred_at: datetime = field(default_factory=_now)
+
+
+EventHandler = Callable[[Any], Awaitable[None]]
+
+
+class DomainEventBus:
+    """In-process queue of domain events with async subscribers"""
+
+    def __init__(self):
+        """Initialize bus"""
+        self.queue_size = int(os.environ.get('DOMAIN_EVENT_QUEUE_SIZE', '10000'))
+        self.worker_count = int(os.environ.get('DOMAIN_EVENT_WORKERS', '4'))
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._handlers: Dict[Type, List[EventHandler]] = defaultdict(list)
+        self._tasks: List[asyncio.Task] = []
+        self.published = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def subscribe(self, event_type: Type, handler: Optional[EventHandler] = None):
+        """Register an async handler for one event type
+
+        Usable directly or as a decorator:
+            @bus.subscribe(OrderCreated)
+            async def handler(event): ...
+        """
+        if handler is None:
+            def decorator(func: EventHandler) -> EventHandler:
+                self._handlers[event_type].append(func)
+                return func
+            return decorator
+        self._handlers[event_type].append(handler)
+        return handler
+
+    def publish(self, event):
+        """Queue an event for its subscribers (call after the commit)"""
+        if not self._handlers.get(type(event)):
+            return
+        try:
+            self._queue.put_nowait(event)
+            self.published += 1
+        except asyncio.QueueFull:
+            # Never block a request on a slow subscriber
+            self.dropped += 1
+            logger.warning(f"Domain event queue full, dropped {type(event).__name__}")
+
+    def start(self):
+        """Deliver queued events to subscribers in the background"""
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(max(1, self.worker_count))]
+
+    async def _run(self):
+        while True:
+            event = await self._queue.get()
+            try:
+                await self._deliver(event)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, event):
+        for handler in self._handlers.get(type(event), []):
+            try:
+                await handler(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"{type(event).__name__} handler {handler.__name__} failed: {e}")
+
+    async def stop(self, timeout: float = 10.0):
+        """Deliver what is queued (up to timeout), then stop the workers"""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Domain event bus stopped with {self._queue.qsize()} events undelivered")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "published": self.published,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "queued": self._queue.qsize(),
+            "workers": len(self._tasks),
+            "subscribers": {event_type.__name__: len(handlers) for event_type, handlers in self._handlers.items()},
+        }
@@ -0,0 +1,83 @@
+"""Set-Based Inventory Updates
+
+This module applies stock levels for many products in a few statements:
+- One locking read per chunk returns current (old) stock
+- One joined UPDATE per chunk against a VALUES ROW() table (MySQL 8.0.19+)
+- Large payloads are split into chunks; the caller owns the transaction
+"""
+
+import os
+from typing import Dict, Any, List, Tuple
+
+from sqlalchemy import text, bindparam
+
+# Rows per statement; keeps packets and bound-parameter counts bounded
+STOCK_UPDATE_CHUNK_SIZE = int(os.environ.get('INVENTORY_BULK_CHUNK_SIZE', '5000'))
+
+SELECT_STOCK_FOR_UPDATE = text(
+    "SELECT id, name, stock FROM products WHERE id IN :ids ORDER BY id FOR UPDATE"
+).bindparams(bindparam("ids", expanding=True))
+
+
+def _update_from_values(count: int):
+    rows = ", ".join(f"ROW(:id_{i}, :stock_{i})" for i in range(count))
+    return text(
+        "UPDATE products p "
+        f"JOIN (VALUES {rows}) AS staged (product_id, stock) ON p.id = staged.product_id "
+        "SET p.stock = staged.stock"
+    )
+
+
+async def apply_stock_levels(
+    session,
+    levels: Dict[str, int],
+    chunk_size: int = STOCK_UPDATE_CHUNK_SIZE
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Set absolute stock levels without committing
+
+    Rows are locked in primary-key order, so concurrent bulk updates
+    can't deadlock on each other.
+
+    Args:
+        session: Async session (caller commits or rolls back)
+        levels: Mapping of product ID to new stock level
+        chunk_size: Products per statement
+
+    Returns:
+        (updated, missing): [{product_id, product_name, old_stock, new_stock}]
+        in input order, and IDs that don't exist (nothing is updated then)
+    """
+    product_ids = list(levels)
+    current: Dict[str, Any] = {}
+
+    locking_order = sorted(product_ids)
+    for start in range(0, len(locking_order), chunk_size):
+        result = await session.execute(
+            SELECT_STOCK_FOR_UPDATE, {"ids": locking_order[start:start + chunk_size]}
+        )
+        current.update({row.id: row for row in result.all()})
+
+    missing = [product_id for product_id in product_ids if product_id not in current]
+    if missing:
+        return [], missing
+
+    # Only touch rows whose stock actually changes
+    changed = [product_id for product_id in product_ids if current[product_id].stock != levels[product_id]]
+    for start in range(0, len(changed), chunk_size):
+        chunk = changed[start:start + chunk_size]
+        params = {}
+        for i, product_id in enumerate(chunk):
+            params[f"id_{i}"] = product_id
+            params[f"stock_{i}"] = levels[product_id]
+        await session.execute(_update_from_values(len(chunk)), params)
+
+    updated = [
+        {
+            "product_id": product_id,
+            "product_name": current[product_id].name,
+            "old_stock": current[product_id].stock,
+            "new_stock": levels[product_id],
+        }
+        for product_id in product_ids
+    ]
+    return updated, []
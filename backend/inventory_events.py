@@ -0,0 +1,284 @@
+"""Inventory Change Events and Low-Stock Alerts
+
+This module turns committed stock changes into pushed alerts:
+- Stock writers publish inventory-change events to an in-process bus
+  (non-blocking; the request never waits for subscribers)
+- Low-stock thresholds are persisted (global default plus per-product overrides)
+- An alert is raised only when a change crosses a threshold, not on every write
+- Alerts fan out to SSE subscribers on every worker via Redis pub/sub,
+  or locally when Redis is unavailable
+"""
+
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass, asdict, field
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Callable, Awaitable, Set
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# inventory_thresholds row holding the store-wide default
+GLOBAL_THRESHOLD_KEY = "*"
+
+
+@dataclass
+class InventoryEvent:
+    """A committed stock change for one product"""
+    product_id: str
+    product_name: str
+    old_stock: int
+    new_stock: int
+    source: str  # order, bulk_update, import
+    occurred_at: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+
+class InventoryEventBus:
+    """In-process queue of inventory events with async subscribers"""
+
+    def __init__(self):
+        """Initialize bus"""
+        self.queue_size = int(os.environ.get('INVENTORY_EVENT_QUEUE_SIZE', '10000'))
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._handlers: List[Callable[[List[InventoryEvent]], Awaitable[None]]] = []
+        self._task: Optional[asyncio.Task] = None
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, handler: Callable[[List[InventoryEvent]], Awaitable[None]]):
+        """Register an async handler called with each published batch"""
+        self._handlers.append(handler)
+
+    def publish(self, events: List[InventoryEvent]):
+        """Queue events for subscribers (call after the stock change commits)
+
+        Args:
+            events: Stock changes; unchanged levels are ignored
+        """
+        events = [event for event in events if event.old_stock != event.new_stock]
+        if not events:
+            return
+        try:
+            self._queue.put_nowait(events)
+            self.published += len(events)
+        except asyncio.QueueFull:
+            # Never block a checkout on a slow subscriber
+            self.dropped += len(events)
+            logger.warning(f"Inventory event queue full, dropped {len(events)} events")
+
+    def start(self):
+        """Deliver queued events to subscribers in the background"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            events = await self._queue.get()
+            for handler in self._handlers:
+                try:
+                    await handler(events)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Inventory event handler failed: {e}")
+
+    async def stop(self):
+        """Stop delivering events"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "published": self.published,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+            "subscribers": len(self._handlers),
+        }
+
+
+class LowStockMonitor:
+    """Raises alerts when stock crosses a persisted threshold"""
+
+    CHANNEL = "inventory:alerts"
+
+    def __init__(self, session_maker, cache=None):
+        """Initialize monitor
+
+        Args:
+            session_maker: Async session factory
+            cache: Cache service whose Redis client relays alerts between workers (optional)
+        """
+        self.session_maker = session_maker
+        self.cache = cache
+        self.default_threshold = int(os.environ.get('LOW_STOCK_THRESHOLD', '10'))
+        self.global_threshold = self.default_threshold
+        self.product_thresholds: Dict[str, int] = {}
+        self.client_queue_size = int(os.environ.get('INVENTORY_ALERT_CLIENT_QUEUE_SIZE', '100'))
+        self._clients: Set[asyncio.Queue] = set()
+        self._listening = False
+        self._task: Optional[asyncio.Task] = None
+
+    # ============ Thresholds ============
+
+    def threshold_for(self, product_id: str) -> int:
+        return self.product_thresholds.get(product_id, self.global_threshold)
+
+    async def load_thresholds(self):
+        """Load persisted thresholds"""
+        async with self.session_maker() as session:
+            result = await session.execute(text("SELECT product_id, threshold FROM inventory_thresholds"))
+            rows = result.all()
+
+        thresholds = {row.product_id: row.threshold for row in rows}
+        self.global_threshold = thresholds.pop(GLOBAL_THRESHOLD_KEY, self.default_threshold)
+        self.product_thresholds = thresholds
+
+    async def set_threshold(self, threshold: Optional[int], product_id: Optional[str] = None):
+        """Persist a threshold
+
+        Args:
+            threshold: Alert when stock falls to this level (None removes a product override)
+            product_id: Product to override, or None for the global threshold
+        """
+        key = product_id or GLOBAL_THRESHOLD_KEY
+        async with self.session_maker() as session:
+            if threshold is None:
+                await session.execute(
+                    text("DELETE FROM inventory_thresholds WHERE product_id = :key"), {"key": key}
+                )
+            else:
+                await session.execute(
+                    text(
+                        "INSERT INTO inventory_thresholds (product_id, threshold, updated_at) "
+                        "VALUES (:key, :threshold, :now) "
+                        "ON DUPLICATE KEY UPDATE threshold = VALUES(threshold), updated_at = VALUES(updated_at)"
+                    ),
+                    {"key": key, "threshold": threshold, "now": datetime.now(timezone.utc).replace(tzinfo=None)}
+                )
+            await session.commit()
+
+        await self.load_thresholds()
+        # Other workers reload too
+        await self._publish({"type": "thresholds"})
+
+    # ============ Alerts ============
+
+    @staticmethod
+    def alert_level(stock: int, threshold: int) -> str:
+        """Same levels as the alerts snapshot endpoint"""
+        return "critical" if stock == 0 else "warning" if stock <= threshold / 2 else "low"
+
+    def alert_for(self, event: InventoryEvent) -> Optional[Dict[str, Any]]:
+        """Build the alert an event triggers, if any
+
+        A drop through the threshold (or to zero) raises an alert; a rise
+        back above it resolves it. Changes that stay on one side are silent.
+        """
+        threshold = self.threshold_for(event.product_id)
+        if event.new_stock < event.old_stock and (
+            event.old_stock > threshold >= event.new_stock
+            or event.old_stock > 0 == event.new_stock
+        ):
+            level = self.alert_level(event.new_stock, threshold)
+        elif event.new_stock > event.old_stock and event.old_stock <= threshold < event.new_stock:
+            level = "resolved"
+        else:
+            return None
+        return {"alert_level": level, "threshold": threshold, **asdict(event)}
+
+    async def handle(self, events: List[InventoryEvent]):
+        """Inventory bus subscriber"""
+        for alert in filter(None, map(self.alert_for, events)):
+            await self._publish({"type": "alert", "alert": alert})
+
+    # ============ Fan-out ============
+
+    def subscribe(self) -> asyncio.Queue:
+        """Register an SSE client; alerts are put on the returned queue"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.client_queue_size)
+        self._clients.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._clients.discard(queue)
+
+    async def _publish(self, message: Dict[str, Any]):
+        client = getattr(self.cache, "redis_client", None)
+        if client is not None and self._listening:
+            try:
+                await client.publish(self.cache._key(self.CHANNEL), json.dumps(message))
+                return
+            except Exception as e:
+                logger.warning(f"Inventory alert relay failed, delivering locally: {e}")
+        await self._deliver(message)
+
+    async def _deliver(self, message: Dict[str, Any]):
+        if message.get("type") == "thresholds":
+            await self.load_thresholds()
+            return
+        alert = message["alert"]
+        for queue in list(self._clients):
+            try:
+                queue.put_nowait(alert)
+            except asyncio.QueueFull:
+                # A stalled client loses alerts rather than holding up the rest
+                pass
+
+    def start(self):
+        """Load thresholds and relay alerts published by other workers"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        try:
+            await self.load_thresholds()
+        except Exception as e:
+            logger.error(f"Loading inventory thresholds failed: {e}")
+
+        while getattr(self.cache, "redis_client", None) is not None:
+            pubsub = self.cache.redis_client.pubsub()
+            try:
+                await pubsub.subscribe(self.cache._key(self.CHANNEL))
+                self._listening = True
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        await self._deliver(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Inventory alert relay disconnected: {e}")
+            finally:
+                self._listening = False
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(5)
+
+    async def stop(self):
+        """Stop relaying alerts"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "global_threshold": self.global_threshold,
+            "product_overrides": len(self.product_thresholds),
+            "sse_clients": len(self._clients),
+            "redis_relay": self._listening,
+        }
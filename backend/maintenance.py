@@ -0,0 +1,421 @@
+"""Table Retention and Compaction
+
+This module keeps append-heavy tables small:
+- recently_viewed: keep the latest N products per user, drop views older than a cutoff
+- order_tracking: move old status rows into a compressed per-order archive
+  (the latest status of every order always stays in place)
+- Small batched deletes with pauses, so hot tables are never locked for long
+- Configurable policies via environment variables
+- Runs periodically on one worker per interval; scheduled and manual runs
+  share a Redis run lock, so only one run is in progress at a time
+- Archiving picks candidates with a plain read along the created_at index
+  (no locks, resumes after the last row), then locks the batch by primary
+  key, so even an overlapping run never archives a row twice
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+import zlib
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List
+
+from sqlalchemy import text, bindparam
+
+from payment_security import EXTEND_LOCK_SCRIPT, RELEASE_LOCK_SCRIPT
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RetentionPolicy:
+    """Retention settings (0 disables a rule)"""
+    recently_viewed_per_user: int = 50
+    recently_viewed_days: int = 180
+    order_tracking_days: int = 365
+    batch_size: int = 500
+    batch_pause_seconds: float = 0.05
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        return cls(
+            recently_viewed_per_user=int(os.environ.get(
+                'RETENTION_RECENTLY_VIEWED_PER_USER', os.environ.get('RECENTLY_VIEWED_MAX_ITEMS', '50')
+            )),
+            recently_viewed_days=int(os.environ.get('RETENTION_RECENTLY_VIEWED_DAYS', '180')),
+            order_tracking_days=int(os.environ.get('RETENTION_ORDER_TRACKING_DAYS', '365')),
+            batch_size=int(os.environ.get('RETENTION_BATCH_SIZE', '500')),
+            batch_pause_seconds=float(os.environ.get('RETENTION_BATCH_PAUSE_SECONDS', '0.05')),
+        )
+
+
+class MaintenanceBusyError(RuntimeError):
+    """Raised when another maintenance run is in progress"""
+
+
+class MaintenanceService:
+    """Applies retention policies in small batches"""
+
+    # Spaces scheduled runs one interval apart across workers
+    LOCK_KEY = "lock:maintenance"
+    # Held by the run in progress, scheduled or manual
+    RUN_LOCK_KEY = "lock:maintenance:run"
+
+    def __init__(self, session_maker, cache=None, policy: Optional[RetentionPolicy] = None):
+        """Initialize maintenance service
+
+        Args:
+            session_maker: Async session factory
+            cache: Cache service whose Redis client provides the run lock (optional)
+            policy: Retention policy (default: from environment)
+        """
+        self.session_maker = session_maker
+        self.cache = cache
+        self.policy = policy or RetentionPolicy.from_env()
+        self.interval_seconds = int(os.environ.get('RETENTION_INTERVAL_SECONDS', '86400'))
+        # Renewed after every batch, so it only expires if the run dies
+        self.run_lock_seconds = int(os.environ.get('RETENTION_RUN_LOCK_SECONDS', '300'))
+        self.last_report: Optional[Dict[str, Any]] = None
+        # True while a run is in progress on this worker
+        self.running = False
+        self._run_token: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # ============ Batching ============
+
+    @staticmethod
+    def _cutoff(days: int) -> datetime:
+        # DATETIME columns hold naive UTC values
+        return (datetime.now(timezone.utc) - timedelta(days=days)).replace(tzinfo=None)
+
+    async def _pause(self):
+        """Pause between batches and keep the run lock"""
+        await self._renew_run_lock()
+        await asyncio.sleep(self.policy.batch_pause_seconds)
+
+    async def _delete_ids(self, table: str, ids: List[str]) -> int:
+        """Delete rows by primary key in batches, one short transaction each"""
+        deleted = 0
+        statement = text(f"DELETE FROM {table} WHERE id IN :ids").bindparams(
+            bindparam("ids", expanding=True)
+        )
+        for start in range(0, len(ids), self.policy.batch_size):
+            batch = ids[start:start + self.policy.batch_size]
+            async with self.session_maker() as session:
+                result = await session.execute(statement, {"ids": batch})
+                await session.commit()
+            deleted += result.rowcount
+            await self._pause()
+        return deleted
+
+    # ============ recently_viewed ============
+
+    async def trim_recently_viewed(self) -> Dict[str, int]:
+        """Keep the latest N views per user and drop views past the age cutoff"""
+        report = {"trimmed": 0, "expired": 0}
+        keep = self.policy.recently_viewed_per_user
+
+        if keep:
+            async with self.session_maker() as session:
+                result = await session.execute(
+                    text(
+                        "SELECT user_id FROM recently_viewed "
+                        "GROUP BY user_id HAVING COUNT(*) > :keep"
+                    ),
+                    {"keep": keep}
+                )
+                user_ids = [row.user_id for row in result.all()]
+
+            for user_id in user_ids:
+                async with self.session_maker() as session:
+                    # Everything past the newest `keep` rows (served by the user_id index)
+                    result = await session.execute(
+                        text(
+                            "SELECT id FROM recently_viewed WHERE user_id = :user_id "
+                            "ORDER BY viewed_at DESC LIMIT 18446744073709551615 OFFSET :keep"
+                        ),
+                        {"user_id": user_id, "keep": keep}
+                    )
+                    ids = [row.id for row in result.all()]
+                report["trimmed"] += await self._delete_ids("recently_viewed", ids)
+
+        if self.policy.recently_viewed_days:
+            cutoff = self._cutoff(self.policy.recently_viewed_days)
+            while True:
+                async with self.session_maker() as session:
+                    result = await session.execute(
+                        text("SELECT id FROM recently_viewed WHERE viewed_at < :cutoff LIMIT :limit"),
+                        {"cutoff": cutoff, "limit": self.policy.batch_size}
+                    )
+                    ids = [row.id for row in result.all()]
+                if not ids:
+                    break
+                report["expired"] += await self._delete_ids("recently_viewed", ids)
+
+        return report
+
+    # ============ order_tracking ============
+
+    async def archive_order_tracking(self) -> Dict[str, int]:
+        """Move old tracking rows into order_tracking_archive, compressed per order
+
+        The newest row of each order is never archived, so current status
+        lookups keep working without touching the archive.
+        """
+        report = {"archives": 0, "archived_rows": 0}
+        if not self.policy.order_tracking_days:
+            return report
+
+        cutoff = self._cutoff(self.policy.order_tracking_days)
+        # Keyset cursor (created_at, id): each batch resumes after the last candidate
+        after: Optional[tuple] = None
+
+        while True:
+            # Candidates: a plain read along idx_order_tracking_created. Rows with a
+            # newer row for the same order are old history; the newest row never is.
+            cursor_clause = ""
+            params: Dict[str, Any] = {"cutoff": cutoff, "limit": self.policy.batch_size}
+            if after:
+                cursor_clause = (
+                    "AND (t.created_at > :after_created "
+                    "OR (t.created_at = :after_created AND t.id > :after_id)) "
+                )
+                params.update(after_created=after[0], after_id=after[1])
+            async with self.session_maker() as session:
+                result = await session.execute(
+                    text(
+                        "SELECT t.id, t.created_at FROM order_tracking t "
+                        "WHERE t.created_at < :cutoff "
+                        + cursor_clause +
+                        "AND EXISTS ("
+                        "  SELECT 1 FROM order_tracking newer "
+                        "  WHERE newer.order_id = t.order_id AND newer.created_at > t.created_at"
+                        ") "
+                        "ORDER BY t.created_at, t.id LIMIT :limit"
+                    ),
+                    params
+                )
+                candidates = result.all()
+            if not candidates:
+                break
+            after = (candidates[-1].created_at, candidates[-1].id)
+
+            async with self.session_maker() as session:
+                # Lock the batch by primary key; rows another run archived meanwhile are gone
+                result = await session.execute(
+                    text(
+                        "SELECT id, order_id, status, description, location, created_at "
+                        "FROM order_tracking WHERE id IN :ids "
+                        "ORDER BY created_at, id FOR UPDATE"
+                    ).bindparams(bindparam("ids", expanding=True)),
+                    {"ids": [row.id for row in candidates]}
+                )
+                rows = result.all()
+                if not rows:
+                    continue
+
+                by_order: Dict[str, List[Dict[str, Any]]] = {}
+                for row in rows:
+                    by_order.setdefault(row.order_id, []).append({
+                        "id": row.id,
+                        "status": row.status,
+                        "description": row.description,
+                        "location": row.location,
+                        "created_at": row.created_at.isoformat() if row.created_at else None,
+                    })
+
+                archived_at = datetime.now(timezone.utc).replace(tzinfo=None)
+                await session.execute(
+                    text(
+                        "INSERT INTO order_tracking_archive "
+                        "(id, order_id, row_count, payload, archived_at) "
+                        "VALUES (:id, :order_id, :row_count, :payload, :archived_at)"
+                    ),
+                    [
+                        {
+                            "id": str(uuid.uuid4()),
+                            "order_id": order_id,
+                            "row_count": len(entries),
+                            "payload": zlib.compress(json.dumps(entries).encode()),
+                            "archived_at": archived_at,
+                        }
+                        for order_id, entries in by_order.items()
+                    ]
+                )
+                # Archive insert and delete commit together, so rows are never lost or duplicated
+                await session.execute(
+                    text("DELETE FROM order_tracking WHERE id IN :ids").bindparams(
+                        bindparam("ids", expanding=True)
+                    ),
+                    {"ids": [row.id for row in rows]}
+                )
+                await session.commit()
+
+            report["archives"] += len(by_order)
+            report["archived_rows"] += len(rows)
+            await self._pause()
+
+        return report
+
+    async def get_archived_tracking(self, order_id: str) -> List[Dict[str, Any]]:
+        """Decompress the archived tracking history of an order
+
+        Args:
+            order_id: Order ID
+
+        Returns:
+            Archived tracking rows, oldest first
+        """
+        async with self.session_maker() as session:
+            result = await session.execute(
+                text(
+                    "SELECT payload FROM order_tracking_archive "
+                    "WHERE order_id = :order_id ORDER BY archived_at"
+                ),
+                {"order_id": order_id}
+            )
+            payloads = [row.payload for row in result.all()]
+
+        entries = []
+        for payload in payloads:
+            entries.extend(json.loads(zlib.decompress(payload)))
+        return sorted(entries, key=lambda entry: entry["created_at"] or "")
+
+    # ============ Scheduling ============
+
+    async def run(self) -> Dict[str, Any]:
+        """Apply every retention rule once
+
+        Returns:
+            Report of rows trimmed, expired and archived
+
+        Raises:
+            MaintenanceBusyError: If a run is already in progress (any worker)
+        """
+        if self.running:
+            raise MaintenanceBusyError("Maintenance is already running")
+        self.running = True
+        try:
+            await self._acquire_run_lock()
+            started = time.perf_counter()
+            try:
+                report = {
+                    "policy": asdict(self.policy),
+                    "recently_viewed": await self.trim_recently_viewed(),
+                    "order_tracking": await self.archive_order_tracking(),
+                }
+            finally:
+                await self._release_run_lock()
+        finally:
+            self.running = False
+        report["seconds"] = round(time.perf_counter() - started, 3)
+        report["finished_at"] = datetime.now(timezone.utc).isoformat()
+        self.last_report = report
+        logger.info(f"Maintenance run finished: {report}")
+        return report
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the active policy and the last run's report"""
+        return {
+            "policy": asdict(self.policy),
+            "interval_seconds": self.interval_seconds,
+            "last_report": self.last_report,
+        }
+
+    async def _acquire_lock(self) -> bool:
+        """Make sure only one worker runs maintenance per interval"""
+        client = getattr(self.cache, "redis_client", None)
+        if client is None:
+            return True
+        try:
+            return bool(await client.set(
+                self.cache._key(self.LOCK_KEY), "1", nx=True, ex=max(60, self.interval_seconds - 60)
+            ))
+        except Exception as e:
+            logger.warning(f"Maintenance lock unavailable, skipping run: {e}")
+            return False
+
+    async def _acquire_run_lock(self):
+        """Take the run lock shared by scheduled and manual runs
+
+        Without Redis (or if it errors) the run goes ahead: archiving locks its
+        rows by primary key, so an overlapping run is slower but still correct.
+
+        Raises:
+            MaintenanceBusyError: If another run holds the lock
+        """
+        client = getattr(self.cache, "redis_client", None)
+        if client is None:
+            return
+        token = uuid.uuid4().hex
+        try:
+            acquired = await client.set(
+                self.cache._key(self.RUN_LOCK_KEY), token, nx=True, ex=self.run_lock_seconds
+            )
+        except Exception as e:
+            logger.warning(f"Maintenance run lock unavailable, running without it: {e}")
+            return
+        if not acquired:
+            raise MaintenanceBusyError("Maintenance is already running")
+        self._run_token = token
+
+    async def _renew_run_lock(self):
+        client = getattr(self.cache, "redis_client", None)
+        if client is None or self._run_token is None:
+            return
+        try:
+            renewed = await client.eval(
+                EXTEND_LOCK_SCRIPT, 1, self.cache._key(self.RUN_LOCK_KEY),
+                self._run_token, self.run_lock_seconds * 1000
+            )
+            if not renewed:
+                logger.warning("Maintenance run lock expired; another run may overlap this one")
+                self._run_token = None
+        except Exception as e:
+            logger.warning(f"Failed to renew maintenance run lock: {e}")
+
+    async def _release_run_lock(self):
+        client = getattr(self.cache, "redis_client", None)
+        if client is None or self._run_token is None:
+            return
+        try:
+            await client.eval(RELEASE_LOCK_SCRIPT, 1, self.cache._key(self.RUN_LOCK_KEY), self._run_token)
+        except Exception as e:
+            # The lock expires on its own
+            logger.warning(f"Failed to release maintenance run lock: {e}")
+        self._run_token = None
+
+    def start(self):
+        """Run maintenance every interval_seconds"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            # Let startup traffic settle before the first pass
+            await asyncio.sleep(min(self.interval_seconds, 300))
+            try:
+                if await self._acquire_lock():
+                    await self.run()
+            except asyncio.CancelledError:
+                raise
+            except MaintenanceBusyError:
+                logger.info("Maintenance skipped: a manual run is in progress")
+            except Exception as e:
+                logger.error(f"Maintenance run failed: {e}")
+            await asyncio.sleep(max(0, self.interval_seconds - 300))
+
+    async def stop(self):
+        """Stop the maintenance loop"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -1,11 +1,15 @@
 """
-Custom middleware for request tracking and error handling
+Custom middleware for request tracking, error handling and idempotency keys
 """
+import asyncio
+import hashlib
+import os
 import time
 import uuid
 import logging
-from typing import Callable
+from typing import Callable, Iterable, Optional
 from fastapi import Request, Response
+from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.types import ASGIApp
 
@@ -103,3 +107,130 @@ class ErrorHandlerMiddleware(BaseHTTPMiddleware):
                     'request_id': getattr(request.state, 'request_id', 'unknown'),
                 }
             )
+
+
+class IdempotencyMiddleware(BaseHTTPMiddleware):
+    """
+    Replays responses for repeated requests carrying the same Idempotency-Key
+
+    Covers POST requests to the given paths. The stored response is keyed per
+    user and tied to a hash of the request, so a key reused for a different
+    request is rejected. While the first request is in flight, duplicates
+    wait for its response instead of running the handler (and its gateway
+    calls) again. Only successful responses are stored; a failed request can
+    be retried with the same key.
+    """
+
+    HEADER = "Idempotency-Key"
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        payment_security,
+        paths: Iterable[str],
+        user_resolver: Callable[[Request], Optional[str]],
+        ttl_hours: int = 24,
+    ):
+        super().__init__(app)
+        self.payment_security = payment_security
+        self.paths = set(paths)
+        self.user_resolver = user_resolver
+        self.ttl_hours = ttl_hours
+        self.lock_seconds = int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', '60'))
+        self.wait_seconds = float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', '30'))
+        self.poll_interval = float(os.environ.get('IDEMPOTENCY_POLL_INTERVAL_SECONDS', '0.1'))
+
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        idempotency_key = request.headers.get(self.HEADER)
+        if request.method != "POST" or request.url.path not in self.paths or not idempotency_key:
+            return await call_next(request)
+
+        if len(idempotency_key) > 255:
+            return JSONResponse(status_code=400, content={'detail': f'{self.HEADER} is too long'})
+
+        # Unauthenticated requests are left to the route to reject
+        user_id = self.user_resolver(request)
+        if not user_id:
+            return await call_next(request)
+
+        body = await request.body()
+        fingerprint = hashlib.sha256(
+            b"\0".join([request.method.encode(), request.url.path.encode(), body])
+        ).hexdigest()
+
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            stored = await self.payment_security.check_idempotency_key(idempotency_key, user_id)
+            if stored:
+                return self._replay(stored, fingerprint)
+
+            token = await self.payment_security.acquire_idempotency_lock(
+                idempotency_key, user_id, ttl_seconds=self.lock_seconds
+            )
+            if token:
+                break
+
+            # A duplicate is in flight: wait for its response (or for it to fail).
+            # Every pass sleeps and checks the deadline, even if the lock check errors.
+            while True:
+                if time.monotonic() >= deadline:
+                    return JSONResponse(
+                        status_code=409,
+                        content={'detail': 'A request with this Idempotency-Key is still in progress'},
+                        headers={'Retry-After': '1'},
+                    )
+                await asyncio.sleep(self.poll_interval)
+                if not await self.payment_security.is_idempotency_locked(idempotency_key, user_id):
+                    break
+
+        # Keep the lock for as long as the handler runs
+        heartbeat = asyncio.create_task(self.payment_security.keep_idempotency_lock(
+            idempotency_key, user_id, token, ttl_seconds=self.lock_seconds
+        ))
+        try:
+            # The key may have been stored between our check and the lock
+            stored = await self.payment_security.check_idempotency_key(idempotency_key, user_id)
+            if stored:
+                return self._replay(stored, fingerprint)
+
+            response = await call_next(request)
+            if not 200 <= response.status_code < 300:
+                return response
+
+            content = b"".join([chunk async for chunk in response.body_iterator])
+            await self.payment_security.set_idempotency_response(
+                idempotency_key,
+                user_id,
+                {
+                    'fingerprint': fingerprint,
+                    'status_code': response.status_code,
+                    'media_type': response.headers.get('content-type'),
+                    'body': content.decode('utf-8', errors='replace'),
+                },
+                ttl_hours=self.ttl_hours,
+            )
+            return Response(
+                content=content,
+                status_code=response.status_code,
+                headers=dict(response.headers),
+            )
+        finally:
+            heartbeat.cancel()
+            try:
+                await heartbeat
+            except asyncio.CancelledError:
+                pass
+            await self.payment_security.release_idempotency_lock(idempotency_key, user_id, token)
+
+    def _replay(self, stored: dict, fingerprint: str) -> Response:
+        if stored.get('fingerprint') != fingerprint:
+            return JSONResponse(
+                status_code=422,
+                content={'detail': f'{self.HEADER} was already used for a different request'},
+            )
+        return Response(
+            content=stored['body'],
+            status_code=stored['status_code'],
+            media_type=stored.get('media_type'),
+            headers={'Idempotent-Replayed': 'true'},
+        )
@@ -0,0 +1,153 @@
+"""Versioned Schema Migrations
+
+This package replaces create_all at startup with explicit, ordered migrations:
+- Migrations live in migrations/versions/NNNN_description.py and run in order
+- Each module defines `revision`, `description` and an async `upgrade(conn, metadata)`
+- Applied revisions are recorded in the schema_migrations table
+- Workers only run check_revision() at boot: one query against schema_migrations
+- Pending migrations are applied by the one-shot command `python scripts/migrate.py`
+"""
+
+import importlib.util
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional, List, Callable, Awaitable
+
+from sqlalchemy import text, MetaData
+from sqlalchemy.exc import DBAPIError
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_DIR = Path(__file__).parent / "versions"
+
+# Serializes concurrent migrate runs (e.g. two deploy hooks)
+MIGRATION_LOCK = "schema_migrations"
+MIGRATION_LOCK_TIMEOUT = 300
+
+# MySQL error for a missing table
+ER_NO_SUCH_TABLE = 1146
+
+
+class SchemaRevisionError(RuntimeError):
+    """Raised when the database is not at the revision this code expects"""
+
+
+@dataclass
+class Migration:
+    revision: str
+    description: str
+    upgrade: Callable[..., Awaitable[None]]
+
+
+def load_migrations() -> List[Migration]:
+    """Load migration modules from versions/, ordered by revision"""
+    migrations = []
+    for path in sorted(VERSIONS_DIR.glob("[0-9]*.py")):
+        spec = importlib.util.spec_from_file_location(f"migrations.versions.{path.stem}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        migrations.append(Migration(module.revision, module.description, module.upgrade))
+
+    revisions = [migration.revision for migration in migrations]
+    if revisions != sorted(set(revisions)):
+        raise RuntimeError(f"Migration revisions must be unique and ordered: {revisions}")
+    return migrations
+
+
+MIGRATIONS = load_migrations()
+HEAD: Optional[str] = MIGRATIONS[-1].revision if MIGRATIONS else None
+
+
+async def current_revision(conn) -> Optional[str]:
+    """Latest applied revision, or None for a database that was never migrated"""
+    try:
+        result = await conn.execute(text("SELECT MAX(revision) FROM schema_migrations"))
+    except DBAPIError as e:
+        if getattr(e.orig, "args", (None,))[0] == ER_NO_SUCH_TABLE:
+            return None
+        raise
+    return result.scalar()
+
+
+async def check_revision(conn) -> str:
+    """Fail fast unless the database is at or past HEAD (a single query)
+
+    A database ahead of HEAD is accepted: during a rolling deploy the new
+    release migrates first while workers of the previous release still run,
+    so migrations must stay compatible with the code one release back.
+
+    Returns:
+        The current revision
+    """
+    revision = await current_revision(conn)
+    if HEAD is not None and (revision is None or revision < HEAD):
+        raise SchemaRevisionError(
+            f"Database schema is at revision {revision or 'none'}, this code expects {HEAD} or later. "
+            f"Run: python scripts/migrate.py"
+        )
+    if revision != HEAD:
+        logger.info(f"Database schema is at revision {revision}, ahead of this code's {HEAD}")
+    return revision
+
+
+async def upgrade(engine, metadata: MetaData, target: Optional[str] = None) -> List[str]:
+    """Apply pending migrations up to target (default: HEAD)
+
+    Each migration and its schema_migrations row commit together. MySQL
+    commits DDL implicitly, so migrations are written to be safe to re-run
+    if one is interrupted halfway.
+
+    Args:
+        engine: Async engine
+        metadata: Model metadata (for migrations that create declared tables/indexes)
+        target: Last revision to apply
+
+    Returns:
+        Revisions applied
+    """
+    applied = []
+    async with engine.connect() as lock_conn:
+        acquired = await lock_conn.scalar(
+            text("SELECT GET_LOCK(:name, :timeout)"),
+            {"name": MIGRATION_LOCK, "timeout": MIGRATION_LOCK_TIMEOUT}
+        )
+        if not acquired:
+            raise SchemaRevisionError("Another migration run holds the schema_migrations lock")
+
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(text(
+                    "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                    "revision VARCHAR(32) NOT NULL PRIMARY KEY, "
+                    "description VARCHAR(255) NOT NULL, "
+                    "applied_at DATETIME NOT NULL)"
+                ))
+                current = await current_revision(conn)
+
+            for migration in MIGRATIONS:
+                if current is not None and migration.revision <= current:
+                    continue
+                if target is not None and migration.revision > target:
+                    break
+
+                logger.info(f"[MIGRATION] Applying {migration.revision}: {migration.description}")
+                async with engine.begin() as conn:
+                    await migration.upgrade(conn, metadata)
+                    await conn.execute(
+                        text(
+                            "INSERT INTO schema_migrations (revision, description, applied_at) "
+                            "VALUES (:revision, :description, :applied_at)"
+                        ),
+                        {
+                            "revision": migration.revision,
+                            "description": migration.description,
+                            "applied_at": datetime.now(timezone.utc).replace(tzinfo=None),
+                        }
+                    )
+                applied.append(migration.revision)
+        finally:
+            await lock_conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": MIGRATION_LOCK})
+
+    return applied
@@ -0,0 +1,12 @@
+"""Baseline: create every table declared on the models
+
+Existing tables are left as they are (create_all only adds missing ones),
+so this is safe on databases created before migrations existed.
+"""
+
+revision = "0001"
+description = "baseline tables"
+
+
+async def upgrade(conn, metadata):
+    await conn.run_sync(metadata.create_all)
@@ -0,0 +1,30 @@
+"""One recently_viewed row per (user, product)
+
+Buffered views flush as upserts on this key. Older databases may hold
+duplicates, which are removed (keeping the newest view) first.
+"""
+
+from sqlalchemy import inspect, text
+
+from db_indexes import existing_index_columns
+
+revision = "0002"
+description = "unique (user_id, product_id) on recently_viewed"
+
+
+async def upgrade(conn, metadata):
+    indexes = await conn.run_sync(
+        lambda sync_conn: existing_index_columns(inspect(sync_conn), "recently_viewed")
+    )
+    if ("user_id", "product_id") in indexes:
+        return
+
+    await conn.execute(text(
+        "DELETE rv FROM recently_viewed rv "
+        "JOIN recently_viewed newer ON newer.user_id = rv.user_id "
+        "AND newer.product_id = rv.product_id "
+        "AND (newer.viewed_at > rv.viewed_at OR (newer.viewed_at = rv.viewed_at AND newer.id > rv.id))"
+    ))
+    await conn.execute(text(
+        "CREATE UNIQUE INDEX uq_recently_viewed_user_product ON recently_viewed (user_id, product_id)"
+    ))
@@ -0,0 +1,14 @@
+"""Composite indexes declared on the models
+
+Adds the hot-path indexes to tables created before they were declared.
+Equivalent idx_* keys from mysql_schema.sql are recognised by column list.
+"""
+
+from db_indexes import ensure_indexes
+
+revision = "0003"
+description = "hot-path composite indexes"
+
+
+async def upgrade(conn, metadata):
+    await ensure_indexes(conn, metadata)
@@ -0,0 +1,26 @@
+"""Backfill product_rating_summaries from existing reviews
+
+Later review writes keep the summaries current in the same transaction.
+"""
+
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+revision = "0004"
+description = "backfill product rating summaries"
+
+
+async def upgrade(conn, metadata):
+    # Start from scratch so a re-run after an interruption can't double count
+    await conn.execute(text("DELETE FROM product_rating_summaries"))
+    await conn.execute(
+        text(
+            "INSERT INTO product_rating_summaries "
+            "(product_id, rating_count, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5, updated_at) "
+            "SELECT product_id, COUNT(*), SUM(rating), "
+            "SUM(rating = 1), SUM(rating = 2), SUM(rating = 3), SUM(rating = 4), SUM(rating = 5), :now "
+            "FROM reviews GROUP BY product_id"
+        ),
+        {"now": datetime.now(timezone.utc).replace(tzinfo=None)}
+    )
@@ -0,0 +1,8 @@
+"""Durable queue for payment webhooks (see webhook_queue.py)"""
+
+revision = "0005"
+description = "webhook_events queue table"
+
+
+async def upgrade(conn, metadata):
+    await conn.run_sync(metadata.tables["webhook_events"].create, checkfirst=True)
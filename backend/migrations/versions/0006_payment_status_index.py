@@ -0,0 +1,20 @@
+"""Index for the payment reconciler's scan of unsettled sessions"""
+
+from sqlalchemy import inspect
+
+from db_indexes import existing_index_columns
+
+revision = "0006"
+description = "(payment_status, created_at) index on payment_transactions"
+
+
+async def upgrade(conn, metadata):
+    indexes = await conn.run_sync(
+        lambda sync_conn: existing_index_columns(inspect(sync_conn), "payment_transactions")
+    )
+    if ("payment_status", "created_at") not in indexes:
+        index = next(
+            ix for ix in metadata.tables["payment_transactions"].indexes
+            if ix.name == "idx_payment_transactions_status_created"
+        )
+        await conn.run_sync(index.create)
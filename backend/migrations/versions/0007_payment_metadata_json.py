@@ -0,0 +1,44 @@
+"""Native JSON payment metadata and an indexed gateway column
+
+payment_metadata was TEXT holding JSON, parsed per row on every admin list.
+The column becomes native JSON (rows that aren't valid JSON are cleared
+first, or the ALTER fails), the gateway is exposed as a virtual generated
+column, and the admin list's indexes are created.
+"""
+
+import logging
+
+from sqlalchemy import inspect, text, types
+from sqlalchemy.schema import CreateColumn
+
+from db_indexes import ensure_indexes
+
+logger = logging.getLogger(__name__)
+
+revision = "0007"
+description = "JSON payment metadata, generated gateway column, admin list indexes"
+
+
+async def upgrade(conn, metadata):
+    table = metadata.tables["payment_transactions"]
+    columns = await conn.run_sync(
+        lambda sync_conn: {
+            column["name"]: column["type"] for column in inspect(sync_conn).get_columns(table.name)
+        }
+    )
+
+    if not isinstance(columns["metadata"], types.JSON):
+        result = await conn.execute(text(
+            "UPDATE payment_transactions SET metadata = NULL "
+            "WHERE metadata IS NOT NULL AND JSON_VALID(metadata) = 0"
+        ))
+        if result.rowcount:
+            logger.warning(f"[MIGRATION] Cleared {result.rowcount} payment metadata values that were not valid JSON")
+        await conn.execute(text("ALTER TABLE payment_transactions MODIFY metadata JSON NULL"))
+
+    if "gateway" not in columns:
+        # Virtual: no table rebuild; InnoDB stores the value in the secondary index
+        column_ddl = CreateColumn(table.c.gateway).compile(dialect=conn.dialect)
+        await conn.execute(text(f"ALTER TABLE payment_transactions ADD COLUMN {column_ddl}"))
+
+    await ensure_indexes(conn, metadata)
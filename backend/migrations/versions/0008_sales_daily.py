@@ -0,0 +1,16 @@
+"""Per-day sales rollup table (see sales_rollup.py), backfilled from orders"""
+
+from datetime import datetime, timezone
+
+from sales_rollup import BACKFILL, CLEAR
+
+revision = "0008"
+description = "sales_daily rollup table"
+
+
+async def upgrade(conn, metadata):
+    await conn.run_sync(metadata.tables["sales_daily"].create, checkfirst=True)
+
+    # Rebuild rather than add, so a re-run doesn't double the totals
+    await conn.execute(CLEAR)
+    await conn.execute(BACKFILL, {"now": datetime.now(timezone.utc).replace(tzinfo=None)})
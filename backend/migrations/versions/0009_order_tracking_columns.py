@@ -0,0 +1,24 @@
+"""Tracking number and estimated delivery columns on orders
+
+Status updates accepted both but had nowhere to store them, so the
+shipping notification and tracking page never saw them.
+"""
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+
+revision = "0009"
+description = "orders.tracking_number and orders.estimated_delivery"
+
+
+async def upgrade(conn, metadata):
+    table = metadata.tables["orders"]
+    existing = await conn.run_sync(
+        lambda sync_conn: {column["name"] for column in inspect(sync_conn).get_columns(table.name)}
+    )
+
+    # Nullable columns: an instant ADD COLUMN on MySQL 8, no table rebuild
+    for name in ("tracking_number", "estimated_delivery"):
+        if name not in existing:
+            column_ddl = CreateColumn(table.c[name]).compile(dialect=conn.dialect)
+            await conn.execute(text(f"ALTER TABLE orders ADD COLUMN {column_ddl}"))
@@ -0,0 +1,25 @@
+"""Index for the retention job's scan of old order_tracking rows
+
+Archiving used to lock its candidates with SKIP LOCKED in (order_id,
+created_at) order, restarting from the first order on every batch. It now
+reads candidates oldest first along this index and resumes after the last one.
+"""
+
+from sqlalchemy import inspect
+
+from db_indexes import existing_index_columns
+
+revision = "0010"
+description = "(created_at) index on order_tracking"
+
+
+async def upgrade(conn, metadata):
+    indexes = await conn.run_sync(
+        lambda sync_conn: existing_index_columns(inspect(sync_conn), "order_tracking")
+    )
+    if ("created_at",) not in indexes:
+        index = next(
+            ix for ix in metadata.tables["order_tracking"].indexes
+            if ix.name == "idx_order_tracking_created"
+        )
+        await conn.run_sync(index.create)
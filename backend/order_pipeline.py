@@ -0,0 +1,357 @@
+"""Order Finalization Pipeline
+
+Every path that turns a cart into an order goes through OrderFinalizer:
+checkout without online payment (POST /orders), Stripe (webhook or
+reconciler) and Razorpay (client verification or webhook).
+- One transaction: cart, products (locked in id order), user and payment are
+  each read with a single query; order items are inserted in one statement
+  and stock is decremented set-based
+- The payment session is the idempotency key: its payment_transactions row
+  is locked, and if it already points at an order that order is returned
+  instead of creating a second one
+- Every order gets its initial tracking row and decrements stock
+- After the commit it publishes OrderCreated/PaymentCaptured and the stock
+  changes to the event buses; their subscribers (emails, caches, rollups,
+  alerts) run on background workers, so a slow mail server never holds a request
+"""
+
+import logging
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Tuple
+
+from sqlalchemy import select, insert, update, delete, MetaData
+
+from domain_events import DomainEventBus, OrderCreated, PaymentCaptured
+from inventory import apply_stock_levels
+from inventory_events import InventoryEvent, InventoryEventBus
+
+logger = logging.getLogger(__name__)
+
+# Initial tracking row per order status
+INITIAL_TRACKING = {
+    "processing": ("Order has been placed and is being processed", "Warehouse"),
+    "confirmed": ("Payment received, order confirmed", "Warehouse"),
+}
+
+
+class EmptyCartError(ValueError):
+    """Raised when there is nothing to order"""
+
+
+class InsufficientStockError(ValueError):
+    """Raised when an unpaid order asks for more than is in stock"""
+
+
+class PaymentNotFoundError(LookupError):
+    """Raised when the payment session does not exist (or belongs to another user)"""
+
+
+@dataclass
+class OrderRequest:
+    """What to finalize
+
+    Args:
+        user_id: Customer
+        payment_status: 'pending' (pay later) or 'paid'
+        order_status: 'processing' or 'confirmed'
+        shipping_address: Defaults to the address on the user's profile
+        payment_session_id: Gateway session; makes finalization idempotent
+        payment_method: 'stripe', 'razorpay' or None
+        check_stock: Reject the order when stock is short (never for paid orders)
+        clear_cart: Empty the cart in the same transaction
+    """
+    user_id: str
+    payment_status: str = "pending"
+    order_status: str = "processing"
+    shipping_address: Optional[str] = None
+    payment_session_id: Optional[str] = None
+    payment_method: Optional[str] = None
+    check_stock: bool = True
+    clear_cart: bool = True
+
+
+@dataclass
+class FinalizedOrder:
+    order_id: str
+    user_id: str
+    items: List[Dict[str, Any]]
+    total_amount: float
+    payment_status: str
+    order_status: str
+    shipping_address: str
+    created_at: datetime
+    payment_method: Optional[str] = None
+    payment_session_id: Optional[str] = None
+    # False when the payment session already had its order (idempotent replay)
+    created: bool = True
+    cart_cleared: bool = False
+    user: Dict[str, Any] = field(default_factory=dict)
+    stock_changes: List[Tuple[str, str, int, int]] = field(default_factory=list)  # id, name, old, new
+
+
+class OrderFinalizer:
+    """Transactional cart-to-order pipeline"""
+
+    def __init__(
+        self,
+        session_maker,
+        metadata: MetaData,
+        events: Optional[DomainEventBus] = None,
+        inventory: Optional[InventoryEventBus] = None
+    ):
+        """Initialize finalizer
+
+        Args:
+            session_maker: Async session factory
+            metadata: Model metadata (the pipeline works on the tables, not the ORM classes)
+            events: Bus for OrderCreated/PaymentCaptured
+            inventory: Bus for the stock changes
+        """
+        self.session_maker = session_maker
+        self.events = events
+        self.inventory = inventory
+        tables = metadata.tables
+        self.orders = tables["orders"]
+        self.order_items = tables["order_items"]
+        self.order_tracking = tables["order_tracking"]
+        self.cart = tables["cart"]
+        self.products = tables["products"]
+        self.users = tables["users"]
+        self.payments = tables["payment_transactions"]
+
+    # ============ Pipeline ============
+
+    async def finalize(self, session, request: OrderRequest) -> Optional[FinalizedOrder]:
+        """Build the order inside the caller's transaction (the caller commits)
+
+        Returns:
+            The order, or None when a paid session's cart is already empty
+
+        Raises:
+            EmptyCartError, InsufficientStockError, PaymentNotFoundError
+        """
+        now = datetime.now(timezone.utc)
+
+        payment = None
+        if request.payment_session_id:
+            payment = (await session.execute(
+                select(self.payments.c.id, self.payments.c.user_id, self.payments.c.order_id)
+                .where(self.payments.c.session_id == request.payment_session_id)
+                .with_for_update()
+            )).mappings().one_or_none()
+            if payment is None or payment["user_id"] != request.user_id:
+                raise PaymentNotFoundError(f"Payment {request.payment_session_id} not found")
+            if payment["order_id"]:
+                return await self._load(session, payment["order_id"], request)
+
+        cart = (await session.execute(
+            select(self.cart.c.product_id, self.cart.c.quantity)
+            .where(self.cart.c.user_id == request.user_id)
+            .order_by(self.cart.c.added_at)
+        )).all()
+        if not cart:
+            if payment is not None and request.payment_status == "paid":
+                return None
+            raise EmptyCartError("Cart is empty")
+
+        # One query for every product; locking in id order avoids deadlocks between orders
+        products = {
+            row["id"]: row for row in (await session.execute(
+                select(
+                    self.products.c.id, self.products.c.name, self.products.c.brand,
+                    self.products.c.price, self.products.c.stock
+                )
+                .where(self.products.c.id.in_(sorted({product_id for product_id, _ in cart})))
+                .order_by(self.products.c.id)
+                .with_for_update()
+            )).mappings()
+        }
+
+        items = []
+        remaining = {product_id: product["stock"] for product_id, product in products.items()}
+        for product_id, quantity in cart:
+            product = products.get(product_id)
+            if product is None:
+                continue
+            if remaining[product_id] < quantity:
+                if request.check_stock:
+                    raise InsufficientStockError(
+                        f"Insufficient stock for {product['name']}. Only {product['stock']} available"
+                    )
+                # Already paid: take the order and flag the oversell
+                logger.warning(
+                    f"[ORDERS] Paid order oversells {product_id}: {quantity} ordered, {remaining[product_id]} in stock"
+                )
+            remaining[product_id] = max(0, remaining[product_id] - quantity)
+            items.append({
+                "product_id": product_id,
+                "name": product["name"],
+                "brand": product["brand"],
+                "price": product["price"],
+                "quantity": quantity,
+            })
+
+        ordered = {item["product_id"] for item in items}
+        levels = {product_id: remaining[product_id] for product_id in ordered}
+        stock_changes = [
+            (product_id, products[product_id]["name"], products[product_id]["stock"], levels[product_id])
+            for product_id in sorted(ordered)
+        ]
+
+        user = (await session.execute(
+            select(
+                self.users.c.name, self.users.c.email, self.users.c.address,
+                self.users.c.email_order_confirmation, self.users.c.email_payment_receipt
+            ).where(self.users.c.id == request.user_id)
+        )).mappings().one_or_none()
+        user = dict(user) if user else {}
+
+        shipping_address = request.shipping_address or user.get("address") or 'No address provided'
+        total_amount = sum(item["price"] * item["quantity"] for item in items)
+        order_id = str(uuid.uuid4())
+
+        await session.execute(insert(self.orders).values(
+            id=order_id,
+            user_id=request.user_id,
+            total_amount=total_amount,
+            payment_status=request.payment_status,
+            order_status=request.order_status,
+            shipping_address=shipping_address,
+            created_at=now,
+            updated_at=now,
+        ))
+        if items:
+            await session.execute(insert(self.order_items), [
+                {
+                    "id": str(uuid.uuid4()),
+                    "order_id": order_id,
+                    "product_id": item["product_id"],
+                    "product_name": item["name"],
+                    "product_brand": item["brand"],
+                    "product_price": item["price"],
+                    "quantity": item["quantity"],
+                    "subtotal": item["price"] * item["quantity"],
+                }
+                for item in items
+            ])
+
+        description, location = INITIAL_TRACKING.get(
+            request.order_status, INITIAL_TRACKING["processing"]
+        )
+        await session.execute(insert(self.order_tracking).values(
+            id=str(uuid.uuid4()),
+            order_id=order_id,
+            status=request.order_status,
+            description=description,
+            location=location,
+            created_at=now,
+        ))
+
+        if levels:
+            await apply_stock_levels(session, levels)
+
+        if payment is not None:
+            await session.execute(
+                update(self.payments)
+                .where(self.payments.c.id == payment["id"])
+                .values(order_id=order_id, updated_at=now)
+            )
+
+        if request.clear_cart:
+            await session.execute(delete(self.cart).where(self.cart.c.user_id == request.user_id))
+
+        logger.info(f"[ORDERS] Order {order_id} finalized ({len(items)} items, {request.payment_status})")
+        return FinalizedOrder(
+            order_id=order_id,
+            user_id=request.user_id,
+            items=items,
+            total_amount=total_amount,
+            payment_status=request.payment_status,
+            order_status=request.order_status,
+            shipping_address=shipping_address,
+            created_at=now,
+            payment_method=request.payment_method,
+            payment_session_id=request.payment_session_id,
+            cart_cleared=request.clear_cart,
+            user=user,
+            stock_changes=stock_changes,
+        )
+
+    async def _load(self, session, order_id: str, request: OrderRequest) -> FinalizedOrder:
+        """The order a payment session already produced"""
+        order = (await session.execute(
+            select(self.orders).where(self.orders.c.id == order_id)
+        )).mappings().one()
+        items = (await session.execute(
+            select(
+                self.order_items.c.product_id, self.order_items.c.product_name,
+                self.order_items.c.product_brand, self.order_items.c.product_price,
+                self.order_items.c.quantity
+            ).where(self.order_items.c.order_id == order_id)
+        )).all()
+        return FinalizedOrder(
+            order_id=order_id,
+            user_id=order["user_id"],
+            items=[
+                {"product_id": product_id, "name": name, "brand": brand, "price": price, "quantity": quantity}
+                for product_id, name, brand, price, quantity in items
+            ],
+            total_amount=order["total_amount"],
+            payment_status=order["payment_status"],
+            order_status=order["order_status"],
+            shipping_address=order["shipping_address"],
+            created_at=order["created_at"],
+            payment_method=request.payment_method,
+            payment_session_id=request.payment_session_id,
+            created=False,
+        )
+
+    async def run(self, request: OrderRequest) -> Optional[FinalizedOrder]:
+        """Finalize in a transaction of its own, then dispatch side effects"""
+        async with self.session_maker() as session:
+            order = await self.finalize(session, request)
+            await session.commit()
+        self.dispatch(order)
+        return order
+
+    # ============ Side Effects ============
+
+    def dispatch(self, order: Optional[FinalizedOrder]):
+        """Publish the new order's events (call only after the commit)
+
+        Publishing never blocks; subscribers run on the buses' workers.
+        """
+        if order is None or not order.created:
+            return
+        if self.inventory is not None:
+            self.inventory.publish([
+                InventoryEvent(product_id, name, old, new, "order")
+                for product_id, name, old, new in order.stock_changes
+            ])
+        if self.events is None:
+            return
+        self.events.publish(OrderCreated(
+            order_id=order.order_id,
+            user_id=order.user_id,
+            total_amount=order.total_amount,
+            payment_status=order.payment_status,
+            order_status=order.order_status,
+            shipping_address=order.shipping_address,
+            items=order.items,
+            payment_method=order.payment_method,
+            cart_cleared=order.cart_cleared,
+            customer=order.user,
+            occurred_at=order.created_at
+        ))
+        if order.payment_status == "paid":
+            self.events.publish(PaymentCaptured(
+                order_id=order.order_id,
+                user_id=order.user_id,
+                amount=order.total_amount,
+                gateway=order.payment_method or "stripe",
+                session_id=order.payment_session_id,
+                customer=order.user,
+                occurred_at=order.created_at
+            ))
@@ -36,6 +36,23 @@ class WebhookResponse(BaseModel):
     session_id: str
     payment_status: str
     event_type: str
+    event_id: Optional[str] = None  # Provider event ID (deduplication key)
+
+# Checkout options shown to customers
+GATEWAY_INFO = {
+    'stripe': {
+        'id': 'stripe',
+        'name': 'Stripe',
+        'description': 'International payments (Cards, Apple Pay, Google Pay)',
+        'currencies': ['INR','USD', 'EUR', 'GBP']
+    },
+    'razorpay': {
+        'id': 'razorpay',
+        'name': 'Razorpay',
+        'description': 'India payments (UPI, Cards, Wallets, NetBanking)',
+        'currencies': ['INR']
+    }
+}
 
 # ============ Abstract Base Class ============
 
@@ -66,6 +83,14 @@ class PaymentGateway(ABC):
     async def verify_webhook(self, body: bytes, signature: str) -> WebhookResponse:
         """Verify and process webhook"""
         pass
+    
+    async def health_check(self) -> None:
+        """Raise if the gateway can't be reached with the current credentials"""
+        pass
+    
+    async def close(self):
+        """Release connections held by the gateway client"""
+        pass
 
 # ============ Stripe Gateway ============
 
@@ -138,7 +163,8 @@ class StripeGateway(PaymentGateway):
             return WebhookResponse(
                 session_id=webhook_response.session_id,
                 payment_status=webhook_response.payment_status,
-                event_type=webhook_response.status
+                event_type=webhook_response.event_type,
+                event_id=getattr(webhook_response, 'event_id', None)
             )
         except Exception as e:
             logger.error(f"Stripe webhook verification failed: {str(e)}")
@@ -149,15 +175,20 @@ class StripeGateway(PaymentGateway):
 class RazorpayGateway(PaymentGateway):
     """Razorpay payment gateway implementation"""
     
-    def __init__(self, key_id: str, key_secret: str):
+    def __init__(
+        self,
+        key_id: str,
+        key_secret: str,
+        webhook_secret: Optional[str] = None,
+        base_url: Optional[str] = None,
+        transport=None
+    ):
         super().__init__("razorpay")
-        try:
-            import razorpay
-            self.client = razorpay.Client(auth=(key_id, key_secret))
-            self.key_id = key_id
-            self.key_secret = key_secret
-        except ImportError:
-            raise ImportError("razorpay library not installed. Run: pip install razorpay")
+        from razorpay_client import AsyncRazorpayClient
+        self.client = AsyncRazorpayClient(key_id, key_secret, base_url=base_url, transport=transport)
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.webhook_secret = webhook_secret
     
     async def create_checkout_session(
         self,
@@ -173,7 +204,7 @@ class RazorpayGateway(PaymentGateway):
             amount_in_paise = int(amount * 100)
             
             # Create Razorpay order
-            order = self.client.order.create({
+            order = await self.client.create_order({
                 "amount": amount_in_paise,
                 "currency": currency.upper(),
                 "payment_capture": 1,
@@ -196,7 +227,7 @@ class RazorpayGateway(PaymentGateway):
         """Get Razorpay payment status"""
         try:
             # Fetch order details
-            order = self.client.order.fetch(session_id)
+            order = await self.client.fetch_order(session_id)
             
             # Map Razorpay status to our unified status
             status_map = {
@@ -226,13 +257,10 @@ class RazorpayGateway(PaymentGateway):
             # Parse webhook body
             webhook_data = json.loads(body.decode())
             
-            # Verify signature using Razorpay utility
-            webhook_secret = os.environ.get('RAZORPAY_WEBHOOK_SECRET', '')
-            self.client.utility.verify_webhook_signature(
-                body.decode(),
-                signature,
-                webhook_secret
-            )
+            # Verify signature (HMAC-SHA256 of the raw body)
+            webhook_secret = self.webhook_secret or os.environ.get('RAZORPAY_WEBHOOK_SECRET', '')
+            if not self.client.verify_webhook_signature(body.decode(), signature, webhook_secret):
+                raise ValueError("Invalid webhook signature")
             
             # Extract event details
             event = webhook_data.get('event', '')
@@ -263,16 +291,20 @@ class RazorpayGateway(PaymentGateway):
         razorpay_signature: str
     ) -> bool:
         """Verify payment signature (specific to Razorpay frontend flow)"""
-        try:
-            self.client.utility.verify_payment_signature({
-                'razorpay_order_id': razorpay_order_id,
-                'razorpay_payment_id': razorpay_payment_id,
-                'razorpay_signature': razorpay_signature
-            })
-            return True
-        except Exception as e:
-            logger.error(f"Razorpay signature verification failed: {str(e)}")
-            return False
+        verified = self.client.verify_payment_signature(
+            razorpay_order_id, razorpay_payment_id, razorpay_signature
+        )
+        if not verified:
+            logger.error(f"Razorpay signature verification failed for order {razorpay_order_id}")
+        return verified
+    
+    async def health_check(self) -> None:
+        """Authenticated request against the orders API"""
+        await self.client.ping()
+    
+    async def close(self):
+        """Close the pooled HTTP connections"""
+        await self.client.aclose()
 
 # ============ Payment Gateway Factory ============
 
@@ -305,11 +337,12 @@ class PaymentGatewayFactory:
         elif gateway_type.lower() == "razorpay":
             key_id = kwargs.get('key_id') or os.environ.get('RAZORPAY_KEY_ID')
             key_secret = kwargs.get('key_secret') or os.environ.get('RAZORPAY_KEY_SECRET')
+            webhook_secret = kwargs.get('webhook_secret') or os.environ.get('RAZORPAY_WEBHOOK_SECRET')
             
             if not key_id or not key_secret:
                 raise ValueError("Razorpay credentials not provided")
             
-            return RazorpayGateway(key_id=key_id, key_secret=key_secret)
+            return RazorpayGateway(key_id=key_id, key_secret=key_secret, webhook_secret=webhook_secret)
         
         else:
             raise ValueError(f"Unsupported gateway type: {gateway_type}. Supported: stripe, razorpay")
@@ -320,21 +353,9 @@ class PaymentGatewayFactory:
         gateways = []
         
         if os.environ.get('STRIPE_API_KEY'):
-            gateways.append({
-                'id': 'stripe',
-                'name': 'Stripe',
-                'description': 'International payments (Cards, Apple Pay, Google Pay)',
-                'currencies': ['INR','USD', 'EUR', 'GBP'],
-                'enabled': True
-            })
+            gateways.append({**GATEWAY_INFO['stripe'], 'enabled': True})
         
         if os.environ.get('RAZORPAY_KEY_ID') and os.environ.get('RAZORPAY_KEY_SECRET'):
-            gateways.append({
-                'id': 'razorpay',
-                'name': 'Razorpay',
-                'description': 'India payments (UPI, Cards, Wallets, NetBanking)',
-                'currencies': ['INR'],
-                'enabled': True
-            })
+            gateways.append({**GATEWAY_INFO['razorpay'], 'enabled': True})
         
         return gateways
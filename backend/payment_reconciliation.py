@@ -0,0 +1,382 @@
+"""Payment Reconciliation
+
+The payment success page used to call the gateway on every poll and build
+the order inside that request. Payment state now converges in the background:
+- Unsettled payment sessions are read from payment_transactions each round
+- Each session is re-checked on a schedule that backs off with its age;
+  sessions a customer is waiting on are checked on the next round
+- Checks are batched per gateway under a token-bucket rate limit, with
+  bounded concurrency; a throttled or failing gateway is paused with backoff
+- One worker reconciles at a time (Redis lock), so gateways see a single caller
+- Status changes are applied by a callback that creates the order exactly once
+- Waiting clients are woken through Redis pub/sub (local delivery without Redis)
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, Callable, Awaitable, List, Set
+
+from sqlalchemy import text
+
+from payment_security import EXTEND_LOCK_SCRIPT
+
+logger = logging.getLogger(__name__)
+
+# Payment statuses that can still change
+UNSETTLED_STATUSES = ("pending", "unpaid")
+# Gateway session statuses after which nothing changes
+FINAL_SESSION_STATUSES = {"complete", "expired", "paid"}
+
+PENDING_SESSIONS = text(
+    "SELECT session_id, status, gateway, created_at FROM payment_transactions "
+    "WHERE payment_status IN ('pending', 'unpaid') AND created_at >= :since "
+    "ORDER BY created_at DESC LIMIT :limit"
+)
+
+
+class TokenBucket:
+    """Requests-per-second budget for one gateway"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self, wanted: int) -> int:
+        """Take up to `wanted` tokens; returns how many were granted"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        granted = min(wanted, int(self.tokens))
+        self.tokens -= granted
+        return granted
+
+
+# on_status(session_id, gateway name, PaymentStatusResponse) -> None
+StatusCallback = Callable[[str, str, Any], Awaitable[None]]
+
+
+class PaymentReconciler:
+    """Background status checks for unsettled payment sessions"""
+
+    CHANNEL = "payments:status"
+    LOCK_KEY = "lock:payment_reconcile"
+    WATCH_KEY = "payments:watching"
+
+    def __init__(self, gateways, cache, session_maker):
+        """Initialize reconciler
+
+        Args:
+            gateways: PaymentGatewayRegistry
+            cache: CacheService (Redis client for the lock, watch list and pub/sub)
+            session_maker: Async session factory
+        """
+        self.gateways = gateways
+        self.cache = cache
+        self.session_maker = session_maker
+        self.on_status: Optional[StatusCallback] = None
+        self.interval = float(os.environ.get('PAYMENT_RECONCILE_INTERVAL_SECONDS', '2'))
+        self.scan_limit = int(os.environ.get('PAYMENT_RECONCILE_SCAN_LIMIT', '500'))
+        self.max_age = timedelta(hours=float(os.environ.get('PAYMENT_RECONCILE_MAX_AGE_HOURS', '24')))
+        self.max_delay = float(os.environ.get('PAYMENT_RECONCILE_MAX_DELAY_SECONDS', '300'))
+        self.concurrency = int(os.environ.get('PAYMENT_RECONCILE_CONCURRENCY', '5'))
+        self.buckets = {
+            "stripe": TokenBucket(float(os.environ.get('PAYMENT_RECONCILE_STRIPE_RATE', '20'))),
+            "razorpay": TokenBucket(float(os.environ.get('PAYMENT_RECONCILE_RAZORPAY_RATE', '10'))),
+        }
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._next_check: Dict[str, float] = {}
+        self._checks: Dict[str, int] = {}
+        self._paused_until: Dict[str, float] = {}
+        self._gateway_failures: Dict[str, int] = {}
+        self._local_watch: Dict[str, float] = {}
+        self._waiters: Dict[str, Set[asyncio.Event]] = {}
+        self._listening = False
+        # Set while the lock can't be checked; rounds run unlocked meanwhile
+        self._lock_degraded = False
+        self._tasks: List[asyncio.Task] = []
+        self.stats = {"rounds": 0, "checks": 0, "updates": 0, "errors": 0}
+
+    def set_status_handler(self, handler: StatusCallback):
+        """Set the callback that applies a changed status to the local payment"""
+        self.on_status = handler
+
+    @property
+    def _redis(self):
+        return getattr(self.cache, "redis_client", None)
+
+    # ============ Scheduling ============
+
+    def _delay_for(self, created_at: datetime, checks: int) -> float:
+        """Seconds until the next check: frequent while fresh, backing off with age"""
+        age = (datetime.now(timezone.utc).replace(tzinfo=None) - created_at).total_seconds()
+        if age < 120:
+            delay = 3.0
+        elif age < 600:
+            delay = 15.0
+        elif age < 3600:
+            delay = 60.0
+        else:
+            delay = self.max_delay
+        # Repeated misses on one session back off further
+        return min(self.max_delay, delay * (1 + checks // 10))
+
+    async def watch(self, session_id: str, seconds: float):
+        """A client is waiting: check this session on the next round"""
+        expires = time.time() + seconds
+        client = self._redis
+        if client is not None:
+            try:
+                await client.zadd(self.cache._key(self.WATCH_KEY), {session_id: expires})
+                return
+            except Exception as e:
+                logger.warning(f"Payment watch list unavailable: {e}")
+        self._local_watch[session_id] = expires
+
+    async def _watched(self) -> Set[str]:
+        now = time.time()
+        watched = {sid for sid, expires in self._local_watch.items() if expires > now}
+        self._local_watch = {sid: self._local_watch[sid] for sid in watched}
+        client = self._redis
+        if client is not None:
+            try:
+                key = self.cache._key(self.WATCH_KEY)
+                await client.zremrangebyscore(key, "-inf", now)
+                watched.update(await client.zrangebyscore(key, now, "+inf"))
+            except Exception as e:
+                logger.warning(f"Payment watch list unavailable: {e}")
+        return watched
+
+    # ============ Reconciliation ============
+
+    async def _due_sessions(self) -> Dict[str, List[Dict[str, Any]]]:
+        since = datetime.now(timezone.utc).replace(tzinfo=None) - self.max_age
+        async with self.session_maker() as session:
+            rows = (await session.execute(
+                PENDING_SESSIONS, {"since": since, "limit": self.scan_limit}
+            )).mappings().all()
+
+        now = time.monotonic()
+        watched = await self._watched()
+        live = set()
+        due: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            session_id = row["session_id"]
+            live.add(session_id)
+            if row["status"] in FINAL_SESSION_STATUSES:
+                continue
+            if session_id not in watched and self._next_check.get(session_id, 0) > now:
+                continue
+            due.setdefault(row["gateway"], []).append(
+                {**row, "watched": session_id in watched}
+            )
+
+        # Forget sessions that settled or aged out
+        for session_id in set(self._next_check) - live:
+            self._next_check.pop(session_id, None)
+            self._checks.pop(session_id, None)
+
+        # Waiting customers first, then oldest schedule
+        for sessions in due.values():
+            sessions.sort(key=lambda row: (not row["watched"], self._next_check.get(row["session_id"], 0)))
+        return due
+
+    async def _check(self, gateway_name: str, gateway, row: Dict[str, Any], semaphore: asyncio.Semaphore):
+        session_id = row["session_id"]
+        async with semaphore:
+            try:
+                result = await gateway.get_payment_status(session_id)
+            except Exception as e:
+                self.stats["errors"] += 1
+                self._gateway_failures[gateway_name] = self._gateway_failures.get(gateway_name, 0) + 1
+                return e
+
+        self.stats["checks"] += 1
+        self._gateway_failures[gateway_name] = 0
+        checks = self._checks.get(session_id, 0) + 1
+        self._checks[session_id] = checks
+        self._next_check[session_id] = time.monotonic() + self._delay_for(row["created_at"], checks)
+
+        if result.payment_status not in UNSETTLED_STATUSES or result.status != row["status"]:
+            try:
+                await self.on_status(session_id, gateway_name, result)
+            except Exception as e:
+                # Retried on the next round; not a gateway failure
+                logger.error(f"[PAYMENTS] Applying status of {session_id} failed: {e}")
+                self._next_check.pop(session_id, None)
+                return None
+            self.stats["updates"] += 1
+            await self.notify(session_id)
+        return None
+
+    async def reconcile_once(self) -> int:
+        """One round over every gateway
+
+        Returns:
+            Number of sessions checked
+        """
+        self.stats["rounds"] += 1
+        checked = 0
+        for gateway_name, sessions in (await self._due_sessions()).items():
+            if self._paused_until.get(gateway_name, 0) > time.monotonic():
+                continue
+            try:
+                gateway = self.gateways.get(gateway_name)
+            except LookupError:
+                continue
+
+            bucket = self.buckets.setdefault(gateway_name, TokenBucket(5.0))
+            batch = sessions[:bucket.take(len(sessions))]
+            if not batch:
+                continue
+
+            semaphore = asyncio.Semaphore(self.concurrency)
+            results = await asyncio.gather(
+                *[self._check(gateway_name, gateway, row, semaphore) for row in batch]
+            )
+            checked += len(batch)
+
+            errors = [result for result in results if isinstance(result, Exception)]
+            if errors:
+                # Throttled or down: pause this gateway, doubling per failing round
+                failures = self._gateway_failures.get(gateway_name, 1)
+                pause = min(self.max_delay, self.interval * 2 ** min(failures, 8))
+                self._paused_until[gateway_name] = time.monotonic() + pause
+                logger.warning(
+                    f"[PAYMENTS] {len(errors)}/{len(batch)} {gateway_name} status checks failed "
+                    f"({errors[0]}); pausing {pause:.0f}s"
+                )
+        return checked
+
+    # ============ Wakeups ============
+
+    @asynccontextmanager
+    async def waiter(self, session_id: str):
+        """Register for the session's next status change
+
+        Enter before reading the session's state, then wait on the yielded
+        event: a change that lands between the read and the wait still
+        sets it, so the wakeup can't be lost.
+        """
+        event = asyncio.Event()
+        self._waiters.setdefault(session_id, set()).add(event)
+        try:
+            yield event
+        finally:
+            waiters = self._waiters.get(session_id)
+            if waiters is not None:
+                waiters.discard(event)
+                if not waiters:
+                    self._waiters.pop(session_id, None)
+
+    async def notify(self, session_id: str):
+        """Wake clients waiting on a session, on every worker"""
+        client = self._redis
+        if client is not None and self._listening:
+            try:
+                await client.publish(self.cache._key(self.CHANNEL), session_id)
+                return
+            except Exception as e:
+                logger.warning(f"Payment status relay failed, waking locally: {e}")
+        self._wake(session_id)
+
+    def _wake(self, session_id: str):
+        for event in self._waiters.get(session_id, ()):
+            event.set()
+
+    async def _listen(self):
+        while self._redis is not None:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(self.cache._key(self.CHANNEL))
+                self._listening = True
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._wake(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Payment status relay disconnected: {e}")
+            finally:
+                self._listening = False
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(5)
+
+    # ============ Lifecycle ============
+
+    async def _acquire_lock(self) -> bool:
+        """Keep reconciliation on one worker (the lock is renewed while held)
+
+        Without a reachable Redis every worker reconciles, as when Redis is
+        not configured: order creation is idempotent per session, so the only
+        cost is extra gateway calls, while stopping would strand payments.
+        """
+        client = self._redis
+        if client is None:
+            return True
+        key = self.cache._key(self.LOCK_KEY)
+        ttl = max(10, int(self.interval * 5))
+        try:
+            # Renew only if this worker still holds it (compare-and-expire)
+            held = await client.eval(EXTEND_LOCK_SCRIPT, 1, key, self.worker_id, ttl * 1000)
+            if not held:
+                held = await client.set(key, self.worker_id, nx=True, ex=ttl)
+        except Exception as e:
+            if not self._lock_degraded:
+                logger.warning(f"Payment reconcile lock unavailable, reconciling without it: {e}")
+                self._lock_degraded = True
+            return True
+        if self._lock_degraded:
+            logger.info("Payment reconcile lock available again")
+            self._lock_degraded = False
+        return bool(held)
+
+    def start(self):
+        """Start reconciling and relaying status wakeups"""
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._run()), asyncio.create_task(self._listen())]
+        logger.info(f"[PAYMENTS] Reconciler started ({self.worker_id})")
+
+    async def _run(self):
+        while True:
+            try:
+                if await self._acquire_lock():
+                    await self.reconcile_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[PAYMENTS] Reconcile round failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def stop(self):
+        """Stop background tasks"""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "tracked_sessions": len(self._next_check),
+            "waiting_clients": sum(len(waiters) for waiters in self._waiters.values()),
+            "paused_gateways": [
+                name for name, until in self._paused_until.items() if until > time.monotonic()
+            ],
+            "redis_relay": self._listening,
+        }
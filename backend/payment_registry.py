@@ -0,0 +1,269 @@
+"""Payment Gateway Registry
+
+Payment handlers used to build a new gateway client (and connection pool,
+and TLS session) on every request. The registry owns them instead:
+- Builds each configured gateway once at startup and hands out the shared instance
+- Runs periodic health checks (authenticated ping) and reports them to admins
+- Hot-reloads credentials: when the credentials file changes, or on demand,
+  gateways whose credentials changed are rebuilt and swapped in; the old
+  instance is closed after a grace period so in-flight requests finish
+- A rebuild that fails keeps the previous gateway serving
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, Callable, Tuple
+
+from dotenv import dotenv_values
+
+from payment_gateway import PaymentGateway, PaymentGatewayFactory, GATEWAY_INFO
+
+logger = logging.getLogger(__name__)
+
+# Gateway -> (factory argument, credential setting) pairs, required ones first
+GATEWAY_CREDENTIALS: Dict[str, Tuple[Tuple[str, str], ...]] = {
+    "stripe": (
+        ("api_key", "STRIPE_API_KEY"),
+        # Optional; the factory derives it from REACT_APP_BACKEND_URL otherwise
+        ("webhook_url", "STRIPE_WEBHOOK_URL"),
+    ),
+    "razorpay": (
+        ("key_id", "RAZORPAY_KEY_ID"),
+        ("key_secret", "RAZORPAY_KEY_SECRET"),
+        ("webhook_secret", "RAZORPAY_WEBHOOK_SECRET"),
+    ),
+}
+REQUIRED_CREDENTIALS = {"stripe": 1, "razorpay": 2}  # webhook secret falls back to the env
+
+
+class GatewayUnavailableError(LookupError):
+    """Raised when a gateway is not configured"""
+
+
+class PaymentGatewayRegistry:
+    """Shared, health-checked payment gateway instances"""
+
+    def __init__(
+        self,
+        credentials_file: Optional[Path] = None,
+        defaults: Optional[Dict[str, str]] = None,
+        environment: Optional[Dict[str, str]] = None,
+        factory: Callable[..., PaymentGateway] = PaymentGatewayFactory.create_gateway
+    ):
+        """Initialize registry
+
+        Args:
+            credentials_file: .env-style file re-read on reload (values override the environment)
+            defaults: Fallback credential values
+            environment: Process environment as it was before the credentials file
+                was loaded into it (default: os.environ now)
+            factory: Gateway constructor (gateway name, **credentials)
+        """
+        self.credentials_file = credentials_file
+        self.defaults = defaults or {}
+        self.environment = dict(os.environ if environment is None else environment)
+        self.factory = factory
+        self.check_interval = int(os.environ.get('PAYMENT_GATEWAY_CHECK_INTERVAL_SECONDS', '60'))
+        self.close_grace = float(os.environ.get('PAYMENT_GATEWAY_CLOSE_GRACE_SECONDS', '30'))
+
+        self._gateways: Dict[str, PaymentGateway] = {}
+        self._fingerprints: Dict[str, str] = {}
+        self._health: Dict[str, Dict[str, Any]] = {}
+        self._file_mtime: Optional[float] = None
+        self._reload_lock = asyncio.Lock()
+        self._retired: Dict[asyncio.Task, PaymentGateway] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    # ============ Credentials ============
+
+    def _load_credentials(self) -> Dict[str, str]:
+        """Defaults, then the original environment, then the file
+        
+        The live os.environ is not used: it still holds whatever the file
+        contained at startup, so a key removed from the file would linger.
+        """
+        values = dict(self.defaults)
+        values.update({key: value for key, value in self.environment.items() if value})
+        if self.credentials_file and self.credentials_file.exists():
+            values.update({key: value for key, value in dotenv_values(self.credentials_file).items() if value})
+        return values
+
+    @staticmethod
+    def _gateway_kwargs(name: str, values: Dict[str, str]) -> Optional[Dict[str, str]]:
+        settings = GATEWAY_CREDENTIALS[name]
+        kwargs = {argument: values.get(setting) for argument, setting in settings}
+        required = [argument for argument, _ in settings[:REQUIRED_CREDENTIALS[name]]]
+        if not all(kwargs[argument] for argument in required):
+            return None
+        return kwargs
+
+    @staticmethod
+    def _fingerprint(kwargs: Dict[str, str]) -> str:
+        material = "\0".join(f"{key}={kwargs[key] or ''}" for key in sorted(kwargs))
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def _credentials_mtime(self) -> Optional[float]:
+        try:
+            return self.credentials_file.stat().st_mtime if self.credentials_file else None
+        except OSError:
+            return None
+
+    # ============ Gateways ============
+
+    def get(self, name: str) -> PaymentGateway:
+        """Shared gateway instance
+
+        Raises:
+            GatewayUnavailableError: If the gateway has no credentials configured
+        """
+        gateway = self._gateways.get(name)
+        if gateway is None:
+            raise GatewayUnavailableError(f"Payment gateway '{name}' is not configured")
+        return gateway
+
+    def is_available(self, name: str) -> bool:
+        return name in self._gateways and self._health.get(name, {}).get("healthy", True)
+
+    def available_gateways(self) -> list:
+        """Checkout options for gateways that are configured and passing health checks"""
+        return [{**GATEWAY_INFO[name], 'enabled': True} for name in GATEWAY_INFO if self.is_available(name)]
+
+    async def reload(self) -> Dict[str, str]:
+        """Re-read credentials and rebuild gateways whose credentials changed
+
+        Returns:
+            Gateway name -> action taken (added, updated, removed, failed)
+        """
+        async with self._reload_lock:
+            self._file_mtime = self._credentials_mtime()
+            values = self._load_credentials()
+            changes = {}
+
+            for name in GATEWAY_CREDENTIALS:
+                kwargs = self._gateway_kwargs(name, values)
+                current = self._gateways.get(name)
+
+                if kwargs is None:
+                    if current is not None:
+                        del self._gateways[name]
+                        self._fingerprints.pop(name, None)
+                        self._health.pop(name, None)
+                        self._retire(current)
+                        changes[name] = "removed"
+                    continue
+
+                fingerprint = self._fingerprint(kwargs)
+                if fingerprint == self._fingerprints.get(name):
+                    continue
+
+                try:
+                    gateway = self.factory(name, **kwargs)
+                except Exception as e:
+                    logger.error(f"[PAYMENTS] Could not build {name} gateway: {str(e)}")
+                    changes[name] = "failed"
+                    continue
+
+                self._gateways[name] = gateway
+                self._fingerprints[name] = fingerprint
+                changes[name] = "updated" if current is not None else "added"
+                if current is not None:
+                    self._retire(current)
+                await self._check(name, gateway)
+
+            if changes:
+                logger.info(f"[PAYMENTS] Gateway credentials reloaded: {changes}")
+            return changes
+
+    def _retire(self, gateway: PaymentGateway):
+        """Close a replaced gateway once in-flight requests had time to finish"""
+        async def close_later():
+            try:
+                await asyncio.sleep(self.close_grace)
+                await gateway.close()
+            except Exception as e:
+                logger.warning(f"[PAYMENTS] Error closing retired {gateway.gateway_name} gateway: {str(e)}")
+            finally:
+                self._retired.pop(task, None)
+
+        task = asyncio.create_task(close_later())
+        self._retired[task] = gateway
+
+    # ============ Health ============
+
+    async def _check(self, name: str, gateway: PaymentGateway):
+        started = time.perf_counter()
+        try:
+            await gateway.health_check()
+            healthy, error = True, None
+        except Exception as e:
+            healthy, error = False, str(e)
+            logger.warning(f"[PAYMENTS] Health check failed for {name}: {error}")
+
+        self._health[name] = {
+            "healthy": healthy,
+            "error": error,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            "checked_at": time.time(),
+        }
+
+    async def check_health(self) -> Dict[str, Dict[str, Any]]:
+        """Health check every registered gateway"""
+        gateways = list(self._gateways.items())
+        await asyncio.gather(*[self._check(name, gateway) for name, gateway in gateways])
+        return self.get_stats()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            name: {
+                **self._health.get(name, {}),
+                "credentials": self._fingerprints[name][:12],
+            }
+            for name in self._gateways
+        }
+
+    # ============ Lifecycle ============
+
+    async def start(self):
+        """Build configured gateways and start health checks/credential watching"""
+        await self.reload()
+        if self._task is None and self.check_interval > 0:
+            self._task = asyncio.create_task(self._run())
+        logger.info(f"[PAYMENTS] Gateways ready: {', '.join(self._gateways) or 'none'}")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.sleep(self.check_interval)
+                if self._credentials_mtime() != self._file_mtime:
+                    await self.reload()
+                await self.check_health()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"[PAYMENTS] Gateway check error: {str(e)}")
+
+    async def stop(self):
+        """Stop background checks and close every gateway"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        retired = list(self._retired.items())
+        self._retired.clear()
+        for task, _ in retired:
+            task.cancel()
+        for gateway in [gateway for _, gateway in retired] + list(self._gateways.values()):
+            try:
+                await gateway.close()
+            except Exception as e:
+                logger.warning(f"[PAYMENTS] Error closing {gateway.gateway_name} gateway: {str(e)}")
+        self._gateways.clear()
+        self._fingerprints.clear()
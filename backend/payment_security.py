@@ -8,9 +8,12 @@ This module provides security features for payment processing:
 - Transaction locking
 """
 
+import asyncio
 import redis.asyncio as redis
+from redis_pool import RedisPool, get_redis_pool
 import hashlib
 import json
+import secrets
 import time
 from typing import Optional, Dict, Any
 from datetime import timedelta
@@ -19,6 +22,161 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# GCRA (generic cell rate algorithm) in one atomic round trip.
+# The key holds the theoretical arrival time (TAT) in milliseconds; each
+# allowed request pushes it forward by one emission interval.
+# KEYS[1] = limiter key, ARGV[1] = max requests, ARGV[2] = window (ms)
+# Returns {allowed, remaining, reset_ms}
+RATE_LIMIT_SCRIPT = """
+redis.replicate_commands()
+local limit = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local emission = period / limit
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat or tat < now then
+    tat = now
+end
+
+local new_tat = tat + emission
+if new_tat - period > now then
+    return {0, 0, math.ceil(new_tat - period - now)}
+end
+
+redis.call('SET', KEYS[1], string.format('%.3f', new_tat), 'PX', math.ceil(new_tat - now))
+local remaining = math.floor((period - (new_tat - now)) / emission + 0.001)
+return {1, remaining, math.ceil(new_tat - now)}
+"""
+
+# Extend a lock only if this holder still owns it
+# KEYS[1] = lock key, ARGV[1] = holder token, ARGV[2] = ttl (ms)
+EXTEND_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Delete a lock only if this holder still owns it
+# KEYS[1] = lock key, ARGV[1] = holder token
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class PaymentLockError(RuntimeError):
+    """Raised when a payment lock can't be taken or was lost (fails closed)"""
+
+
+class PaymentLockBusyError(PaymentLockError):
+    """Raised when another request holds the payment lock"""
+
+
+class PaymentLock:
+    """Distributed lock with holder tokens and auto-renewal
+    
+    Each holder gets a random token; renewal and release only touch the lock
+    while it still holds that token, so a slow holder can't release a lock
+    that expired and was taken by someone else. A heartbeat renews the lock
+    every third of its TTL during long gateway calls.
+    
+    The lock is advisory: it keeps one user's checkouts from running side by
+    side. It does not fence the writes made under it (ensure_held() is a
+    last check, not a guarantee), so those writes must be safe on their own;
+    each one records a distinct gateway session.
+    """
+    
+    def __init__(self, manager: "PaymentSecurityManager", name: str, ttl_seconds: int, wait_seconds: float = 0):
+        self.manager = manager
+        self.key = manager._key(name)
+        self.ttl_ms = int(ttl_seconds * 1000)
+        self.wait_seconds = wait_seconds
+        self.token = secrets.token_hex(16)
+        self.held = False
+        self.lost = False
+        self._heartbeat: Optional[asyncio.Task] = None
+    
+    async def acquire(self):
+        """Take the lock (waiting up to wait_seconds) and start the heartbeat
+        
+        Raises:
+            PaymentLockBusyError: If another holder keeps the lock
+            PaymentLockError: If Redis is unavailable
+        """
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            try:
+                acquired = await self.manager.redis_client.set(self.key, self.token, nx=True, px=self.ttl_ms)
+            except Exception as e:
+                logger.error(f"Failed to acquire payment lock {self.key}: {e}")
+                raise PaymentLockError("Payment lock unavailable") from e
+            
+            if acquired:
+                self.held = True
+                self._heartbeat = asyncio.create_task(self._renew())
+                logger.info(f"Payment lock acquired: {self.key}")
+                return self
+            
+            if time.monotonic() >= deadline:
+                logger.warning(f"Payment lock already held: {self.key}")
+                raise PaymentLockBusyError("Another payment is already in progress")
+            await asyncio.sleep(0.1)
+    
+    async def _renew(self):
+        await self.manager.keep_lock(self.key, self.token, self.ttl_ms)
+        self.lost = True
+        logger.error(f"Payment lock lost: {self.key}")
+    
+    async def ensure_held(self):
+        """Check the lock is still ours before recording the payment
+        
+        Best effort: the lock can still expire between this check and the
+        write, so it only avoids writes by a holder already known to be stale.
+        
+        Raises:
+            PaymentLockError: If the lock expired or was taken over
+        """
+        if not self.held or self.lost:
+            raise PaymentLockError("Payment lock lost")
+        try:
+            owner = await self.manager.redis_client.get(self.key)
+        except Exception as e:
+            raise PaymentLockError("Payment lock unavailable") from e
+        if owner is None or (owner.decode() if isinstance(owner, bytes) else owner) != self.token:
+            self.lost = True
+            raise PaymentLockError("Payment lock lost")
+    
+    async def release(self):
+        """Stop renewing and delete the lock if it is still ours"""
+        if self._heartbeat:
+            self._heartbeat.cancel()
+            try:
+                await self._heartbeat
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat = None
+        if not self.held:
+            return
+        try:
+            await self.manager._release_lock_script(keys=[self.key], args=[self.token])
+            logger.info(f"Payment lock released: {self.key}")
+        except Exception as e:
+            # The lock expires on its own
+            logger.error(f"Failed to release payment lock {self.key}: {e}")
+        self.held = False
+    
+    async def __aenter__(self) -> "PaymentLock":
+        return await self.acquire()
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+
 class PaymentSecurityManager:
     """Manages payment security using Redis"""
     
@@ -29,16 +187,24 @@ class PaymentSecurityManager:
             redis_url: Redis connection URL (default: from environment or localhost)
         """
         self.redis_url = redis_url or os.environ.get('REDIS_URL', 'redis://localhost:6379')
+        # An explicit URL gets its own pool; otherwise use the shared one
+        self._own_pool = RedisPool(redis_url) if redis_url else None
         self.redis_client: Optional[redis.Redis] = None
+        self._rate_limit_script = None
+        self._extend_lock_script = None
+        self._release_lock_script = None
+        # Namespace for every payment key on the shared Redis pool
+        self.key_prefix = ""
         
     async def connect(self):
         """Establish Redis connection"""
+        pool = self._own_pool or get_redis_pool()
         try:
-            self.redis_client = await redis.from_url(
-                self.redis_url,
-                encoding="utf-8",
-                decode_responses=True
-            )
+            self.redis_client = pool.get_client()
+            self.key_prefix = pool.key_prefix_for("payment")
+            self._rate_limit_script = self.redis_client.register_script(RATE_LIMIT_SCRIPT)
+            self._extend_lock_script = self.redis_client.register_script(EXTEND_LOCK_SCRIPT)
+            self._release_lock_script = self.redis_client.register_script(RELEASE_LOCK_SCRIPT)
             await self.redis_client.ping()
             logger.info("Redis connection established for payment security")
         except Exception as e:
@@ -48,9 +214,16 @@ class PaymentSecurityManager:
     async def disconnect(self):
         """Close Redis connection"""
         if self.redis_client:
-            await self.redis_client.close()
+            # The shared pool is closed once at shutdown
+            if self._own_pool:
+                await self._own_pool.close()
+            self.redis_client = None
             logger.info("Redis connection closed")
     
+    def _key(self, key: str) -> str:
+        """Apply the payment namespace prefix to a key"""
+        return f"{self.key_prefix}{key}"
+    
     # ============ Rate Limiting ============
     
     async def check_rate_limit(
@@ -59,9 +232,13 @@ class PaymentSecurityManager:
         action: str = "payment",
         max_requests: int = 5,
         window_seconds: int = 60
-    ) -> tuple[bool, int]:
+    ) -> tuple[bool, int, float]:
         """Check if user has exceeded rate limit
         
+        Runs a GCRA limiter as a single Lua script, so the check and the
+        update happen atomically in one round trip. Requests are spread
+        evenly over the window with bursts of up to max_requests allowed.
+        
         Args:
             user_id: User identifier
             action: Action type (payment, checkout, etc.)
@@ -69,35 +246,27 @@ class PaymentSecurityManager:
             window_seconds: Time window in seconds
             
         Returns:
-            Tuple of (is_allowed, remaining_requests)
+            Tuple of (is_allowed, remaining_requests, reset_seconds).
+            reset_seconds is when the full quota is available again, or
+            when the next request is allowed if this one was rejected.
         """
-        key = f"rate_limit:{action}:{user_id}"
+        key = self._key(f"rate_limit:{action}:{user_id}")
         
         try:
-            # Get current count
-            current = await self.redis_client.get(key)
-            
-            if current is None:
-                # First request in window
-                await self.redis_client.setex(key, window_seconds, "1")
-                return True, max_requests - 1
-            
-            current_count = int(current)
+            allowed, remaining, reset_ms = await self._rate_limit_script(
+                keys=[key],
+                args=[max_requests, window_seconds * 1000]
+            )
             
-            if current_count >= max_requests:
-                # Rate limit exceeded
-                ttl = await self.redis_client.ttl(key)
+            if not allowed:
                 logger.warning(f"Rate limit exceeded for user {user_id}, action {action}")
-                return False, 0
             
-            # Increment counter
-            await self.redis_client.incr(key)
-            return True, max_requests - current_count - 1
+            return bool(allowed), int(remaining), int(reset_ms) / 1000
             
         except Exception as e:
             logger.error(f"Rate limit check failed: {e}")
             # Fail open - allow request if Redis is down
-            return True, max_requests
+            return True, max_requests, 0.0
     
     # ============ Idempotency Keys ============
     
@@ -117,7 +286,7 @@ class PaymentSecurityManager:
         Returns:
             Cached response if key exists, None otherwise
         """
-        key = f"idempotency:{user_id}:{idempotency_key}"
+        key = self._key(f"idempotency:{user_id}:{idempotency_key}")
         
         try:
             cached = await self.redis_client.get(key)
@@ -144,7 +313,7 @@ class PaymentSecurityManager:
             response: Response to cache
             ttl_hours: Time to live in hours
         """
-        key = f"idempotency:{user_id}:{idempotency_key}"
+        key = self._key(f"idempotency:{user_id}:{idempotency_key}")
         
         try:
             await self.redis_client.setex(
@@ -156,6 +325,62 @@ class PaymentSecurityManager:
         except Exception as e:
             logger.error(f"Failed to cache idempotency response: {e}")
     
+    async def acquire_idempotency_lock(
+        self,
+        idempotency_key: str,
+        user_id: str,
+        ttl_seconds: int = 60
+    ) -> Optional[str]:
+        """Mark a request as in flight so concurrent duplicates wait for it
+        
+        Args:
+            idempotency_key: Unique key for this request
+            user_id: User identifier
+            ttl_seconds: Lock expiry, in case the holder dies
+            
+        Returns:
+            Holder token, or None if another request holds the key.
+            Fails open (returns a token) if Redis is down.
+        """
+        key = self._key(f"idempotency_lock:{user_id}:{idempotency_key}")
+        token = secrets.token_hex(16)
+        
+        try:
+            acquired = await self.redis_client.set(key, token, nx=True, ex=ttl_seconds)
+            return token if acquired else None
+        except Exception as e:
+            logger.error(f"Failed to acquire idempotency lock: {e}")
+            return token
+    
+    async def keep_idempotency_lock(self, idempotency_key: str, user_id: str, token: str, ttl_seconds: int = 60):
+        """Renew the in-flight lock while its request runs (cancel when it finishes)
+        
+        Without this, a request slower than the lock TTL would let a
+        duplicate acquire the key and run the handler a second time.
+        """
+        key = self._key(f"idempotency_lock:{user_id}:{idempotency_key}")
+        await self.keep_lock(key, token, ttl_seconds * 1000)
+        logger.error(f"Idempotency lock lost while its request was running: {key}")
+    
+    async def is_idempotency_locked(self, idempotency_key: str, user_id: str) -> bool:
+        """Whether a request with this key is still in flight"""
+        key = self._key(f"idempotency_lock:{user_id}:{idempotency_key}")
+        
+        try:
+            return bool(await self.redis_client.exists(key))
+        except Exception as e:
+            logger.error(f"Idempotency lock check failed: {e}")
+            return False
+    
+    async def release_idempotency_lock(self, idempotency_key: str, user_id: str, token: str):
+        """Release the in-flight lock if this request still holds it"""
+        key = self._key(f"idempotency_lock:{user_id}:{idempotency_key}")
+        
+        try:
+            await self._release_lock_script(keys=[key], args=[token])
+        except Exception as e:
+            logger.error(f"Failed to release idempotency lock: {e}")
+    
     # ============ Session Validation ============
     
     async def create_payment_session(
@@ -180,7 +405,7 @@ class PaymentSecurityManager:
         Returns:
             Session token for validation
         """
-        key = f"payment_session:{session_id}"
+        key = self._key(f"payment_session:{session_id}")
         
         session_data = {
             "user_id": user_id,
@@ -224,7 +449,7 @@ class PaymentSecurityManager:
         Returns:
             Session data if valid, None otherwise
         """
-        key = f"payment_session:{session_id}"
+        key = self._key(f"payment_session:{session_id}")
         
         try:
             cached = await self.redis_client.get(key)
@@ -258,7 +483,7 @@ class PaymentSecurityManager:
             status: New status (pending, paid, failed, cancelled)
             additional_data: Additional data to merge
         """
-        key = f"payment_session:{session_id}"
+        key = self._key(f"payment_session:{session_id}")
         
         try:
             cached = await self.redis_client.get(key)
@@ -284,56 +509,53 @@ class PaymentSecurityManager:
     
     # ============ Transaction Locking ============
     
-    async def acquire_payment_lock(
-        self,
-        user_id: str,
-        timeout_seconds: int = 10
-    ) -> bool:
-        """Acquire lock for payment processing to prevent concurrent payments
+    async def keep_lock(self, key: str, token: str, ttl_ms: int):
+        """Renew a token lock every third of its TTL (the holder's heartbeat)
+        
+        Runs until cancelled, and returns once the lock is lost: taken over
+        by another holder, or not renewable for a whole TTL.
         
         Args:
-            user_id: User identifier
-            timeout_seconds: Lock timeout
-            
-        Returns:
-            True if lock acquired, False otherwise
+            key: Full (prefixed) lock key
+            token: Holder token stored in the lock
+            ttl_ms: Lock TTL in milliseconds
         """
-        key = f"payment_lock:{user_id}"
-        
-        try:
-            # Try to set lock with NX (only if not exists)
-            result = await self.redis_client.set(
-                key,
-                "locked",
-                nx=True,
-                ex=timeout_seconds
-            )
-            
-            if result:
-                logger.info(f"Payment lock acquired for user {user_id}")
-                return True
-            else:
-                logger.warning(f"Payment lock already held for user {user_id}")
-                return False
-                
-        except Exception as e:
-            logger.error(f"Failed to acquire payment lock: {e}")
-            # Fail open - allow payment if Redis is down
-            return True
+        interval = ttl_ms / 3000
+        last_renewed = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await self._extend_lock_script(keys=[key], args=[token, ttl_ms]):
+                    return
+                last_renewed = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to renew lock {key}: {e}")
+                # Past the TTL the lock may have been taken by someone else
+                if (time.monotonic() - last_renewed) * 1000 >= ttl_ms:
+                    return
     
-    async def release_payment_lock(self, user_id: str):
-        """Release payment lock
+    def payment_lock(
+        self,
+        user_id: str,
+        ttl_seconds: int = 10,
+        wait_seconds: float = 0
+    ) -> "PaymentLock":
+        """Lock for a user's payment session creation
+        
+        Usage:
+            async with payment_security.payment_lock(user_id) as lock:
+                ...  # gateway call
+                await lock.ensure_held()
+                ...  # record the payment
         
         Args:
-            user_id: User identifier
+            user_id: User identifier (only this user's payments are serialized)
+            ttl_seconds: Lock expiry; renewed while the holder runs
+            wait_seconds: How long to wait for a held lock (0 = fail at once)
         """
-        key = f"payment_lock:{user_id}"
-        
-        try:
-            await self.redis_client.delete(key)
-            logger.info(f"Payment lock released for user {user_id}")
-        except Exception as e:
-            logger.error(f"Failed to release payment lock: {e}")
+        return PaymentLock(self, f"payment_lock:{user_id}", ttl_seconds, wait_seconds)
     
     # ============ Payment Intent Caching ============
     
@@ -350,7 +572,7 @@ class PaymentSecurityManager:
             data: Intent data to cache
             ttl_minutes: Time to live in minutes
         """
-        key = f"payment_intent:{intent_id}"
+        key = self._key(f"payment_intent:{intent_id}")
         
         try:
             await self.redis_client.setex(
@@ -374,7 +596,7 @@ class PaymentSecurityManager:
         Returns:
             Cached intent data or None
         """
-        key = f"payment_intent:{intent_id}"
+        key = self._key(f"payment_intent:{intent_id}")
         
         try:
             cached = await self.redis_client.get(key)
@@ -402,7 +624,7 @@ class PaymentSecurityManager:
         Returns:
             True if already processed, False otherwise
         """
-        key = f"webhook_processed:{webhook_id}"
+        key = self._key(f"webhook_processed:{webhook_id}")
         
         try:
             exists = await self.redis_client.exists(key)
@@ -422,7 +644,7 @@ class PaymentSecurityManager:
             webhook_id: Unique webhook identifier
             ttl_days: Days to keep webhook record
         """
-        key = f"webhook_processed:{webhook_id}"
+        key = self._key(f"webhook_processed:{webhook_id}")
         
         try:
             await self.redis_client.setex(
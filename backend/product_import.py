@@ -0,0 +1,307 @@
+"""Bulk Product Import
+
+This module upserts large catalogs without one request per product:
+- Streams CSV or NDJSON input; rows are parsed as bytes arrive
+- Validates each row with the product schema, plus the table's enum and length limits
+- Upserts in chunks with INSERT ... ON DUPLICATE KEY UPDATE (one transaction per chunk)
+- Reports per-row errors instead of failing the whole import
+- Runs an after-batch hook once per committed chunk (cache invalidation,
+  stock events), with the stock each existing product had before the upsert
+"""
+
+import codecs
+import csv
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, AsyncIterator, Awaitable, Callable, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import Table, Enum, String, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+
+class ImportFormatError(ValueError):
+    """Raised when the input cannot be parsed at all (bad header, unknown format)"""
+
+
+# ============ Streaming Parsers ============
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream into text lines (line endings kept)"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.splitlines(keepends=True)
+        # The last piece may be an incomplete line
+        pending = lines.pop() if lines and not lines[-1].endswith(("\n", "\r")) else ""
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def iter_csv_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """Yield (row number, row dict) from a CSV stream with a header line"""
+    header: Optional[List[str]] = None
+    record = ""
+    row_number = 0
+
+    async for line in iter_lines(chunks):
+        record += line
+        # A quoted field may span lines; a record is complete once its quotes balance
+        if record.count('"') % 2:
+            continue
+        text, record = record, ""
+        if not text.strip():
+            continue
+
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in values]
+            if "name" not in header:
+                raise ImportFormatError("CSV header must name the product columns")
+            continue
+
+        row_number += 1
+        if len(values) != len(header):
+            yield row_number, {"__error__": f"expected {len(header)} columns, got {len(values)}"}
+            continue
+        yield row_number, dict(zip(header, values))
+
+    if record.strip():
+        yield row_number + 1, {"__error__": "unterminated quoted field"}
+
+
+async def iter_ndjson_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """Yield (row number, row dict) from a newline-delimited JSON stream"""
+    row_number = 0
+    async for line in iter_lines(chunks):
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield row_number, {"__error__": f"invalid JSON: {e.msg}"}
+            continue
+        if not isinstance(row, dict):
+            yield row_number, {"__error__": "expected a JSON object"}
+            continue
+        yield row_number, row
+
+
+def detect_format(content_type: Optional[str], filename: Optional[str] = None) -> str:
+    """Pick the import format from a content type or file name"""
+    content_type = (content_type or "").lower()
+    filename = (filename or "").lower()
+    if "csv" in content_type or filename.endswith(".csv"):
+        return "csv"
+    if "ndjson" in content_type or "jsonl" in content_type or filename.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    raise ImportFormatError("Unknown import format; use CSV or NDJSON")
+
+
+# ============ Importer ============
+
+class ProductImporter:
+    """Validates product rows and upserts them in chunks"""
+
+    def __init__(
+        self,
+        session_maker,
+        schema: Type[BaseModel],
+        table: Table,
+        batch_size: Optional[int] = None,
+        after_batch: Optional[Callable[[List[Dict[str, Any]], Dict[str, int]], Awaitable[None]]] = None,
+    ):
+        """Initialize importer
+
+        Args:
+            session_maker: Async session factory
+            schema: Pydantic model each row must satisfy (e.g. ProductCreate)
+            table: Products table
+            batch_size: Rows per upsert statement (default: PRODUCT_IMPORT_BATCH_SIZE)
+            after_batch: Awaited after each chunk with the committed rows and the
+                previous stock of those that already existed (id -> stock)
+        """
+        self.session_maker = session_maker
+        self.schema = schema
+        self.table = table
+        self.batch_size = batch_size or int(os.environ.get('PRODUCT_IMPORT_BATCH_SIZE', '1000'))
+        self.max_errors = int(os.environ.get('PRODUCT_IMPORT_MAX_ERRORS', '1000'))
+        self.after_batch = after_batch
+
+        # Constraints the schema doesn't know about but MySQL enforces
+        self._choices = {
+            column.name: set(column.type.enums)
+            for column in table.columns if isinstance(column.type, Enum)
+        }
+        self._lengths = {
+            column.name: column.type.length
+            for column in table.columns
+            if isinstance(column.type, String) and not isinstance(column.type, Enum) and column.type.length
+        }
+
+        # created_at is kept from the first import; everything else is replaced
+        statement = mysql_insert(table)
+        self._upsert = statement.on_duplicate_key_update({
+            name: statement.inserted[name]
+            for name in table.columns.keys() if name not in ("id", "created_at")
+        })
+
+    # ============ Validation ============
+
+    def validate(self, raw: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+        """Validate one input row
+
+        Returns:
+            (product row ready to insert, []) or (None, error messages)
+        """
+        if "__error__" in raw:
+            return None, [raw["__error__"]]
+
+        # Blank optional cells (typical in CSV) fall back to schema defaults
+        fields = self.schema.model_fields
+        data = {
+            key: value for key, value in raw.items()
+            if key in fields and not (value == "" and not fields[key].is_required())
+        }
+        try:
+            product = self.schema(**data).model_dump()
+        except ValidationError as e:
+            return None, [
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                for error in e.errors()
+            ]
+
+        errors = []
+        for name, choices in self._choices.items():
+            if name in product and product[name] not in choices:
+                errors.append(f"{name}: must be one of {', '.join(sorted(choices))}")
+        for name, length in self._lengths.items():
+            if isinstance(product.get(name), str) and len(product[name]) > length:
+                errors.append(f"{name}: longer than {length} characters")
+        if errors:
+            return None, errors
+
+        product_id = str(raw.get("id") or "").strip()
+        if len(product_id) > self._lengths.get("id", 36):
+            return None, ["id: longer than 36 characters"]
+        product["id"] = product_id or str(uuid.uuid4())
+        product["created_at"] = datetime.now(timezone.utc).replace(tzinfo=None)
+        return product, []
+
+    # ============ Upserting ============
+
+    async def _upsert_rows(self, rows: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Upsert rows in one transaction
+
+        Returns:
+            Stock of the rows that already existed, read under the same row locks
+        """
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(self.table.c.id, self.table.c.stock)
+                .where(self.table.c.id.in_([row["id"] for row in rows]))
+                .order_by(self.table.c.id)
+                .with_for_update()
+            )
+            previous_stock = {row.id: row.stock for row in result.all()}
+            await session.execute(self._upsert, rows)
+            await session.commit()
+        return previous_stock
+
+    async def _write_batch(self, batch: List[Tuple[int, Dict[str, Any]]], report: Dict[str, Any]):
+        rows = [product for _, product in batch]
+        try:
+            previous_stock = await self._upsert_rows(rows)
+            committed = rows
+        except Exception as e:
+            # Isolate the offending rows instead of failing the whole chunk
+            logger.warning(f"Product import batch failed, retrying row by row: {e}")
+            committed = []
+            previous_stock = {}
+            for row_number, product in batch:
+                try:
+                    previous_stock.update(await self._upsert_rows([product]))
+                    committed.append(product)
+                except Exception as row_error:
+                    self._add_error(report, row_number, [str(getattr(row_error, "orig", row_error))])
+
+        report["batches"] += 1
+        report["upserted"] += len(committed)
+        if committed and self.after_batch:
+            await self.after_batch(committed, previous_stock)
+
+    @staticmethod
+    def _dedupe(batch: List[Tuple[int, Dict[str, Any]]]) -> List[Tuple[int, Dict[str, Any]]]:
+        # The last row wins when one chunk repeats an ID (MySQL would apply both anyway)
+        by_id = {product["id"]: (row_number, product) for row_number, product in batch}
+        return list(by_id.values())
+
+    def _add_error(self, report: Dict[str, Any], row_number: int, messages: List[str]):
+        report["failed"] += 1
+        if len(report["errors"]) < self.max_errors:
+            report["errors"].append({"row": row_number, "errors": messages})
+        else:
+            report["errors_truncated"] = True
+
+    async def run(self, rows: AsyncIterator[Tuple[int, Dict[str, Any]]]) -> Dict[str, Any]:
+        """Validate and upsert a stream of rows
+
+        Args:
+            rows: (row number, raw row dict) pairs, e.g. from iter_csv_rows
+
+        Returns:
+            Import report with counts and per-row errors
+        """
+        started = time.perf_counter()
+        report: Dict[str, Any] = {
+            "received": 0,
+            "upserted": 0,
+            "failed": 0,
+            "batches": 0,
+            "errors": [],
+            "errors_truncated": False,
+        }
+        batch: List[Tuple[int, Dict[str, Any]]] = []
+
+        async for row_number, raw in rows:
+            report["received"] += 1
+            product, errors = self.validate(raw)
+            if errors:
+                self._add_error(report, row_number, errors)
+                continue
+            batch.append((row_number, product))
+            if len(batch) >= self.batch_size:
+                await self._write_batch(self._dedupe(batch), report)
+                batch = []
+
+        if batch:
+            await self._write_batch(self._dedupe(batch), report)
+
+        report["seconds"] = round(time.perf_counter() - started, 3)
+        logger.info(
+            f"Product import: {report['upserted']} upserted, {report['failed']} failed "
+            f"in {report['batches']} batches ({report['seconds']}s)"
+        )
+        return report
+
+
+def parse_rows(chunks: AsyncIterator[bytes], format: str) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """Get the row iterator for an import format"""
+    if format == "csv":
+        return iter_csv_rows(chunks)
+    if format == "ndjson":
+        return iter_ndjson_rows(chunks)
+    raise ImportFormatError(f"Unsupported import format '{format}'; use one of {', '.join(IMPORT_FORMATS)}")
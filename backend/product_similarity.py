@@ -0,0 +1,357 @@
+"""Attribute-Based Product Similarity
+
+This module ranks products by how many catalog attributes they share:
+- Categorical features: category, frame_type, frame_shape, color, brand, price bucket
+- Weighted cosine over one-hot features, vectorized with NumPy
+- Top-K neighbours cached per product
+- Incremental updates on product create/update/delete and stock changes
+"""
+
+import asyncio
+import bisect
+import logging
+import os
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Attribute weights; a product matching on a heavier attribute ranks higher
+FEATURE_WEIGHTS = {
+    "category": 3.0,
+    "frame_shape": 2.0,
+    "brand": 2.0,
+    "price_bucket": 2.0,
+    "frame_type": 1.0,
+    "color": 1.0,
+}
+
+# Upper bounds of the price buckets (the last bucket is open-ended)
+PRICE_BUCKETS = [50, 100, 150, 200, 300, 500]
+
+
+class ProductSimilarityIndex:
+    """In-memory feature matrix over the catalog with cached top-K neighbours
+
+    Each product has exactly one value per attribute, so the weighted
+    cosine between two one-hot vectors reduces to the summed squared
+    weights of the attributes they share, divided by the total. Products
+    are stored as a matrix of integer codes (one column per attribute),
+    which keeps 100k products in a few megabytes and scores a query
+    against the whole catalog in one vectorized comparison.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        """Initialize an empty index
+
+        Args:
+            capacity: Initial number of product rows to allocate
+        """
+        self.attributes = list(FEATURE_WEIGHTS)
+        weights = np.array([FEATURE_WEIGHTS[a] for a in self.attributes], dtype=np.float32)
+        # Squared weights normalized so that identical products score 1.0
+        self._match_weights = weights ** 2 / float((weights ** 2).sum())
+
+        self.top_k = int(os.environ.get('PRODUCT_SIMILARITY_TOP_K', '20'))
+        self.cache_size = int(os.environ.get('PRODUCT_SIMILARITY_CACHE_SIZE', '50000'))
+        self.refresh_seconds = int(os.environ.get('PRODUCT_SIMILARITY_REFRESH_SECONDS', '600'))
+
+        self._vocab: Dict[str, Dict[str, int]] = {a: {} for a in self.attributes}
+        self._codes = np.full((capacity, len(self.attributes)), -1, dtype=np.int32)
+        self._active = np.zeros(capacity, dtype=bool)
+        self._in_stock = np.zeros(capacity, dtype=bool)
+        # Tiny tie-breaker so newer products win between equal scores
+        self._recency = np.zeros(capacity, dtype=np.float64)
+        self._ids: List[Optional[str]] = [None] * capacity
+        self._rows: Dict[str, int] = {}
+        self._free_rows: List[int] = []
+        self._size = 0
+
+        # product ID -> (neighbour IDs, lowest neighbour score)
+        self._cache: Dict[str, Tuple[List[str], float]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    # ============ Feature Encoding ============
+
+    def _encode(self, product: Dict[str, Any]) -> np.ndarray:
+        codes = np.empty(len(self.attributes), dtype=np.int32)
+        for position, attribute in enumerate(self.attributes):
+            if attribute == "price_bucket":
+                value = str(bisect.bisect_left(PRICE_BUCKETS, float(product.get("price") or 0)))
+            else:
+                value = str(product.get(attribute) or "").strip().lower()
+            vocab = self._vocab[attribute]
+            codes[position] = vocab.setdefault(value, len(vocab))
+        return codes
+
+    @staticmethod
+    def _recency_of(product: Dict[str, Any]) -> float:
+        created_at = product.get("created_at")
+        if isinstance(created_at, datetime):
+            created_at = created_at.timestamp()
+        # Seconds since epoch scaled well below the smallest score step
+        return float(created_at or 0) * 1e-13
+
+    def _grow(self):
+        capacity = len(self._ids) * 2
+        self._codes = np.resize(self._codes, (capacity, len(self.attributes)))
+        self._active = np.concatenate([self._active, np.zeros(capacity - len(self._active), dtype=bool)])
+        self._in_stock = np.concatenate([self._in_stock, np.zeros(capacity - len(self._in_stock), dtype=bool)])
+        self._recency = np.concatenate([self._recency, np.zeros(capacity - len(self._recency))])
+        self._ids.extend([None] * (capacity - len(self._ids)))
+
+    # ============ Building ============
+
+    def build(self, products: List[Dict[str, Any]]):
+        """Replace the index with the given catalog
+
+        Args:
+            products: Product dicts (id, category, frame_type, frame_shape,
+                color, brand, price, stock, created_at)
+        """
+        self._adopt(self._build_fresh(products))
+
+    @staticmethod
+    def _build_fresh(products: List[Dict[str, Any]]) -> "ProductSimilarityIndex":
+        fresh = ProductSimilarityIndex(capacity=max(1024, len(products)))
+        for product in products:
+            fresh._insert(product)
+        return fresh
+
+    def _adopt(self, fresh: "ProductSimilarityIndex"):
+        """Swap in arrays from a freshly built index"""
+        self._vocab = fresh._vocab
+        self._codes = fresh._codes
+        self._active = fresh._active
+        self._in_stock = fresh._in_stock
+        self._recency = fresh._recency
+        self._ids = fresh._ids
+        self._rows = fresh._rows
+        self._free_rows = fresh._free_rows
+        self._size = fresh._size
+        self._cache = {}
+
+    def _insert(self, product: Dict[str, Any]) -> int:
+        row = self._rows.get(product["id"])
+        if row is None:
+            if self._free_rows:
+                row = self._free_rows.pop()
+            else:
+                if self._size == len(self._ids):
+                    self._grow()
+                row = self._size
+                self._size += 1
+            self._rows[product["id"]] = row
+            self._ids[row] = product["id"]
+
+        self._codes[row] = self._encode(product)
+        self._active[row] = True
+        self._in_stock[row] = (product.get("stock") or 0) > 0
+        self._recency[row] = self._recency_of(product)
+        return row
+
+    async def load(self, session_maker):
+        """Build the index from the products table
+
+        Args:
+            session_maker: Async session factory
+        """
+        async with session_maker() as session:
+            result = await session.execute(
+                text(
+                    "SELECT id, category, frame_type, frame_shape, color, brand, "
+                    "price, stock, created_at FROM products"
+                )
+            )
+            products = [dict(row._mapping) for row in result.all()]
+
+        # Encode off the event loop, then swap in one step on it
+        fresh = await asyncio.to_thread(self._build_fresh, products)
+        self._adopt(fresh)
+        logger.info(f"Product similarity index built: {len(products)} products")
+
+    # ============ Incremental Updates ============
+
+    def _invalidate(self, rows: List[int]):
+        """Drop cached neighbour lists that changes to rows could affect
+
+        A cached list is stale if it contains a changed product, or if a
+        changed product now scores at least as high as the list's weakest
+        entry. All changed rows are scored against all cached lists in one
+        vectorized pass.
+        """
+        changed_ids = {self._ids[row] for row in rows}
+        for product_id in changed_ids:
+            self._cache.pop(product_id, None)
+
+        cached_ids = [pid for pid in self._cache if pid in self._rows]
+        if not cached_ids:
+            return
+
+        stale = {pid for pid in cached_ids if not changed_ids.isdisjoint(self._cache[pid][0])}
+
+        eligible_rows = np.array(
+            [row for row in rows if self._active[row] and self._in_stock[row]], dtype=np.int64
+        )
+        if len(eligible_rows):
+            cached_rows = np.fromiter((self._rows[pid] for pid in cached_ids), dtype=np.int64)
+            weakest = np.fromiter((self._cache[pid][1] for pid in cached_ids), dtype=np.float64)
+            cached_codes = self._codes[cached_rows][:, None, :]
+            entering = np.zeros(len(cached_ids), dtype=bool)
+            # Chunk the changed rows to bound the (cached x changed x attributes) comparison
+            for chunk in np.array_split(eligible_rows, max(1, len(eligible_rows) // 256)):
+                scores = (cached_codes == self._codes[chunk][None, :, :]) @ self._match_weights
+                entering |= (scores >= weakest[:, None]).any(axis=1)
+            stale.update(pid for pid, hit in zip(cached_ids, entering) if hit)
+
+        for pid in stale:
+            del self._cache[pid]
+
+    def upsert(self, product: Dict[str, Any]):
+        """Add or update one product
+
+        Args:
+            product: Product dict (see build)
+        """
+        self._invalidate([self._insert(product)])
+
+    def upsert_many(self, products: List[Dict[str, Any]]):
+        """Add or update many products with a single cache invalidation pass
+
+        Args:
+            products: Product dicts (see build)
+        """
+        if products:
+            self._invalidate([self._insert(product) for product in products])
+
+    def update_stock(self, stock_by_id: Dict[str, int]):
+        """Apply stock changes; only crossing zero affects rankings
+
+        Args:
+            stock_by_id: Mapping of product ID to new stock level
+        """
+        changed = []
+        for product_id, stock in stock_by_id.items():
+            row = self._rows.get(product_id)
+            if row is None:
+                continue
+            in_stock = stock > 0
+            if in_stock != self._in_stock[row]:
+                self._in_stock[row] = in_stock
+                changed.append(row)
+        if changed:
+            self._invalidate(changed)
+
+    def remove(self, product_id: str):
+        """Remove a deleted product
+
+        Args:
+            product_id: Product ID
+        """
+        row = self._rows.get(product_id)
+        if row is None:
+            return
+        self._active[row] = False
+        self._invalidate([row])
+        del self._rows[product_id]
+        self._ids[row] = None
+        self._free_rows.append(row)
+
+    # ============ Serving ============
+
+    def _rank(self, row: int, k: int) -> Tuple[List[str], float]:
+        size = self._size
+        matches = (self._codes[:size] == self._codes[row]) @ self._match_weights
+        scores = matches + self._recency[:size]
+        scores[(matches == 0) | ~(self._active[:size] & self._in_stock[:size])] = -1.0
+        scores[row] = -1.0
+
+        k = min(k, size)
+        candidates = np.argpartition(-scores, k - 1)[:k] if k else np.empty(0, dtype=np.int64)
+        candidates = candidates[np.argsort(-scores[candidates])]
+        candidates = candidates[scores[candidates] > 0]
+
+        neighbors = [self._ids[c] for c in candidates]
+        weakest = float(scores[candidates[-1]]) if len(candidates) == self.top_k else 0.0
+        return neighbors, weakest
+
+    def related(self, product_id: str, limit: int) -> Optional[List[str]]:
+        """Get the most similar in-stock products
+
+        Args:
+            product_id: Product ID
+            limit: Maximum number of product IDs (at most top_k)
+
+        Returns:
+            Product IDs, best first, or None if the product is not indexed
+        """
+        row = self._rows.get(product_id)
+        if row is None:
+            return None
+
+        cached = self._cache.get(product_id)
+        if cached is None:
+            if len(self._cache) >= self.cache_size:
+                self._cache.pop(next(iter(self._cache)))
+            cached = self._cache[product_id] = self._rank(row, self.top_k)
+        return cached[0][:limit]
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self._rows
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get index size and cache usage"""
+        return {
+            "products": len(self._rows),
+            "cached_neighbor_lists": len(self._cache),
+            "features": {a: len(v) for a, v in self._vocab.items()},
+        }
+
+    # ============ Background Refresh ============
+
+    def start(self, session_maker):
+        """Load the index now and reload it every refresh_seconds
+
+        Periodic reloads pick up changes made by other worker processes.
+
+        Args:
+            session_maker: Async session factory
+        """
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run(session_maker))
+
+    async def _run(self, session_maker):
+        while True:
+            try:
+                await self.load(session_maker)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Product similarity index load failed: {e}")
+            await asyncio.sleep(self.refresh_seconds)
+
+    async def stop(self):
+        """Stop the background reload"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global index instance
+product_similarity: Optional[ProductSimilarityIndex] = None
+
+
+def get_product_similarity() -> ProductSimilarityIndex:
+    """Get product similarity index instance"""
+    global product_similarity
+    if product_similarity is None:
+        product_similarity = ProductSimilarityIndex()
+    return product_similarity
@@ -2,12 +2,19 @@
 API Rate Limiting using SlowAPI
 """
 import os
+import time
 import logging
-from typing import Optional
+import threading
+from collections import deque
+from typing import Optional, Dict, Any, Deque
+from limits import RateLimitItem
+from limits.strategies import RateLimiter, STRATEGIES
+from limits.util import WindowStats
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from fastapi import Request, HTTPException
+from redis_pool import get_redis_pool
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +49,177 @@ def get_user_id_or_ip(request: Request) -> str:
     return f"ip:{get_remote_address(request)}"
 
 
+class _LocalBucket:
+    """Tokens leased by this worker for one limit key and window"""
+    
+    __slots__ = ("tokens", "window_end", "exhausted", "hits")
+    
+    def __init__(self):
+        self.tokens = 0
+        self.window_end = 0.0
+        # Shared budget ran out for this window; deny without asking Redis
+        self.exhausted = False
+        # Timestamps of allowed hits in the trailing window (accuracy metrics)
+        self.hits: Deque[float] = deque()
+
+
+class LeasedTokenBucketRateLimiter(RateLimiter):
+    """
+    Hybrid limiter: a local token bucket per worker, leased from Redis
+    
+    The global budget per window lives in the shared storage as a plain
+    fixed-window counter. Instead of incrementing it once per request,
+    each worker leases a chunk of tokens with a single INCR and then
+    spends them in-process. The global limit is never exceeded within a
+    window; tokens a worker leased but did not spend are simply lost
+    when the window ends, so enforcement errs on the strict side.
+    
+    Small limits (auth, payment) lease one token at a time, which keeps
+    them exact.
+    """
+    
+    def __init__(self, storage):
+        super().__init__(storage)
+        # Fraction of a limit leased per round trip, capped at lease_max
+        self.lease_fraction = float(os.getenv('RATE_LIMIT_LEASE_FRACTION', '0.1'))
+        self.lease_max = int(os.getenv('RATE_LIMIT_LEASE_MAX', '50'))
+        self.max_keys = int(os.getenv('RATE_LIMIT_LOCAL_MAX_KEYS', '10000'))
+        self._buckets: Dict[str, _LocalBucket] = {}
+        self._lock = threading.Lock()
+        self._metrics = {
+            "hits": 0,
+            "local_decisions": 0,
+            "leases": 0,
+            "tokens_leased": 0,
+            "tokens_expired": 0,
+            "denied": 0,
+            "sliding_window_violations": 0,
+            "max_sliding_window_ratio": 0.0,
+        }
+    
+    def _lease_size(self, item: RateLimitItem) -> int:
+        return max(1, min(self.lease_max, int(item.amount * self.lease_fraction)))
+    
+    def _bucket(self, key: str, now: float) -> _LocalBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._evict(now)
+            bucket = self._buckets[key] = _LocalBucket()
+        elif bucket.window_end <= now:
+            self._metrics["tokens_expired"] += bucket.tokens
+            bucket.tokens = 0
+            bucket.exhausted = False
+        return bucket
+    
+    def _evict(self, now: float):
+        """Drop buckets whose window has ended (or all of them if none has)"""
+        expired = [key for key, bucket in self._buckets.items() if bucket.window_end <= now]
+        for key in expired or list(self._buckets):
+            self._metrics["tokens_expired"] += self._buckets.pop(key).tokens
+    
+    def _lease(self, item: RateLimitItem, key: str, bucket: _LocalBucket, cost: int, now: float):
+        """Lease a chunk of tokens (at least cost) from the shared budget"""
+        size = max(cost, self._lease_size(item))
+        count = self.storage.incr(key, item.get_expiry(), amount=size)
+        granted = max(0, min(size, item.amount - (count - size)))
+        
+        self._metrics["leases"] += 1
+        self._metrics["tokens_leased"] += granted
+        bucket.tokens += granted
+        bucket.exhausted = granted < size
+        if count == size:
+            # This lease opened the window
+            bucket.window_end = now + item.get_expiry()
+        else:
+            bucket.window_end = self.storage.get_expiry(key)
+    
+    def _record_hit(self, item: RateLimitItem, bucket: _LocalBucket, cost: int, now: float):
+        """Track how far this worker's allowed hits exceed a true sliding window"""
+        window = item.get_expiry()
+        hits = bucket.hits
+        while hits and hits[0] <= now - window:
+            hits.popleft()
+        hits.extend([now] * cost)
+        
+        ratio = len(hits) / item.amount
+        if ratio > 1:
+            self._metrics["sliding_window_violations"] += 1
+        if ratio > self._metrics["max_sliding_window_ratio"]:
+            self._metrics["max_sliding_window_ratio"] = round(ratio, 3)
+    
+    def hit(self, item: RateLimitItem, *identifiers: str, cost: int = 1) -> bool:
+        key = item.key_for(*identifiers)
+        now = time.time()
+        
+        with self._lock:
+            self._metrics["hits"] += 1
+            bucket = self._bucket(key, now)
+            
+            if bucket.tokens >= cost:
+                self._metrics["local_decisions"] += 1
+            elif bucket.exhausted:
+                self._metrics["local_decisions"] += 1
+                self._metrics["denied"] += 1
+                return False
+            else:
+                self._lease(item, key, bucket, cost - bucket.tokens, now)
+                if bucket.tokens < cost:
+                    self._metrics["denied"] += 1
+                    return False
+            
+            bucket.tokens -= cost
+            self._record_hit(item, bucket, cost, now)
+            return True
+    
+    def test(self, item: RateLimitItem, *identifiers: str, cost: int = 1) -> bool:
+        key = item.key_for(*identifiers)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket and bucket.window_end > time.time() and bucket.tokens >= cost:
+                return True
+        return self.storage.get(key) < item.amount - cost + 1
+    
+    def get_window_stats(self, item: RateLimitItem, *identifiers: str) -> WindowStats:
+        key = item.key_for(*identifiers)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket and bucket.window_end > time.time():
+                # Served locally so response headers don't cost a round trip;
+                # remaining is this worker's unspent share of the budget
+                return WindowStats(bucket.window_end, bucket.tokens)
+        remaining = max(0, item.amount - self.storage.get(key))
+        return WindowStats(self.storage.get_expiry(key), remaining)
+    
+    def clear(self, item: RateLimitItem, *identifiers: str) -> None:
+        key = item.key_for(*identifiers)
+        with self._lock:
+            self._buckets.pop(key, None)
+        self.storage.clear(key)
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get local-decision and sliding-window accuracy metrics for this worker"""
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics["tracked_keys"] = len(self._buckets)
+        hits = metrics["hits"]
+        metrics["local_decision_rate"] = round(metrics["local_decisions"] / hits, 3) if hits else 0.0
+        leased = metrics["tokens_leased"]
+        metrics["lease_waste_rate"] = round(metrics["tokens_expired"] / leased, 3) if leased else 0.0
+        return metrics
+
+
+STRATEGIES["leased-token-bucket"] = LeasedTokenBucketRateLimiter
+
+
+def get_limiter_metrics(limiter: Limiter) -> Dict[str, Any]:
+    """Get metrics from the limiter strategy, if it records any"""
+    strategy = limiter._limiter
+    if isinstance(strategy, LeasedTokenBucketRateLimiter):
+        return {"strategy": "leased-token-bucket", **strategy.get_metrics()}
+    return {"strategy": type(strategy).__name__}
+
+
 def create_limiter(
     default_limit: str = "100/minute",
     storage_uri: Optional[str] = None,
@@ -57,10 +235,20 @@ def create_limiter(
         Configured Limiter instance
     """
     # Use Redis if available, otherwise use in-memory storage
+    storage_options = {}
+    strategy = "fixed-window"
     if storage_uri is None:
         redis_url = os.getenv('REDIS_URL')
         if redis_url:
             storage_uri = redis_url.replace('redis://', 'redis://')
+            # Share the connection pool settings and namespace with the app
+            pool = get_redis_pool()
+            storage_options = {
+                "connection_pool": pool.get_sync_pool(),
+                "key_prefix": pool.key_prefix_for("ratelimit").rstrip(":"),
+            }
+            # Decide most requests in-process from tokens leased out of Redis
+            strategy = os.getenv('RATE_LIMIT_STRATEGY', 'leased-token-bucket')
             logger.info(f"Using Redis for rate limiting: {storage_uri}")
         else:
             logger.warning("Redis not configured. Using in-memory rate limiting.")
@@ -69,8 +257,11 @@ def create_limiter(
         key_func=get_user_id_or_ip,
         default_limits=[default_limit],
         storage_uri=storage_uri,
-        # Strategy: fixed-window, fixed-window-elastic-expiry, or moving-window
-        strategy="fixed-window",
+        storage_options=storage_options,
+        # Keep limiting in memory while Redis is unreachable
+        in_memory_fallback_enabled=bool(storage_options),
+        # Strategy: leased-token-bucket, fixed-window, sliding-window-counter or moving-window
+        strategy=strategy,
         # Headers to include in response
         headers_enabled=True,
         # Retry-After header
@@ -0,0 +1,195 @@
+"""Async Razorpay API Client
+
+This module talks to the Razorpay REST API without blocking the event loop:
+- One pooled httpx.AsyncClient per gateway (keep-alive, bounded connections)
+- Separate connect/read timeouts
+- Retries with exponential backoff and jitter for throttling and transient failures
+  (POSTs are retried only when the request provably never reached Razorpay)
+- Payment and webhook signature checks done locally with HMAC-SHA256
+"""
+
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import random
+from typing import Optional, Dict, Any
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+RAZORPAY_API_BASE = "https://api.razorpay.com/v1"
+
+# Responses worth retrying; 429 and 503 also mean the request was not processed
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+NOT_PROCESSED_STATUS = {429, 503}
+
+# Errors raised before the request could have been sent
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class RazorpayError(Exception):
+    """Razorpay API error
+
+    Args:
+        message: Error description from Razorpay (or the transport error)
+        status_code: HTTP status, or None when no response was received
+        code: Razorpay error code (e.g. BAD_REQUEST_ERROR)
+    """
+
+    def __init__(self, message: str, status_code: Optional[int] = None, code: Optional[str] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+
+
+class AsyncRazorpayClient:
+    """Pooled, retrying client for the Razorpay orders API"""
+
+    def __init__(
+        self,
+        key_id: str,
+        key_secret: str,
+        base_url: Optional[str] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        """Initialize client
+
+        Args:
+            key_id: Razorpay key ID
+            key_secret: Razorpay key secret
+            base_url: API base URL (default: RAZORPAY_API_BASE env or the live API)
+            transport: Custom httpx transport (tests)
+        """
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.max_retries = int(os.environ.get('RAZORPAY_MAX_RETRIES', '3'))
+        self.backoff_base = float(os.environ.get('RAZORPAY_RETRY_BACKOFF', '0.25'))
+        self.backoff_max = float(os.environ.get('RAZORPAY_RETRY_BACKOFF_MAX', '4.0'))
+
+        self._http = httpx.AsyncClient(
+            base_url=base_url or os.environ.get('RAZORPAY_API_BASE', RAZORPAY_API_BASE),
+            auth=(key_id, key_secret),
+            timeout=httpx.Timeout(
+                float(os.environ.get('RAZORPAY_READ_TIMEOUT', '10.0')),
+                connect=float(os.environ.get('RAZORPAY_CONNECT_TIMEOUT', '3.0')),
+                pool=float(os.environ.get('RAZORPAY_POOL_TIMEOUT', '5.0')),
+            ),
+            limits=httpx.Limits(
+                max_connections=int(os.environ.get('RAZORPAY_MAX_CONNECTIONS', '20')),
+                max_keepalive_connections=int(os.environ.get('RAZORPAY_MAX_KEEPALIVE', '10')),
+                keepalive_expiry=float(os.environ.get('RAZORPAY_KEEPALIVE_EXPIRY', '60')),
+            ),
+            headers={"Content-Type": "application/json"},
+            transport=transport,
+        )
+
+    # ============ HTTP ============
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        # Full jitter keeps retrying workers from stampeding together
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        json: Optional[Dict[str, Any]] = None,
+        params: Optional[Dict[str, Any]] = None,
+        max_retries: Optional[int] = None
+    ) -> Dict[str, Any]:
+        idempotent = method == "GET"
+        max_retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            try:
+                response = await self._http.request(method, path, json=json, params=params)
+            except httpx.TransportError as e:
+                retryable = idempotent or isinstance(e, NOT_SENT_ERRORS)
+                if not retryable or attempt >= max_retries:
+                    raise RazorpayError(f"Razorpay request failed: {e!r}") from e
+                delay = self._backoff(attempt)
+            else:
+                if response.status_code < 400:
+                    return response.json()
+
+                retryable = response.status_code in (
+                    RETRYABLE_STATUS if idempotent else NOT_PROCESSED_STATUS
+                )
+                if not retryable or attempt >= max_retries:
+                    raise self._error(response)
+                delay = self._backoff(attempt, response)
+
+            attempt += 1
+            logger.warning(f"Razorpay {method} {path} failed, retry {attempt} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _error(response: httpx.Response) -> RazorpayError:
+        try:
+            error = response.json().get("error", {})
+        except ValueError:
+            error = {}
+        return RazorpayError(
+            error.get("description") or f"Razorpay returned HTTP {response.status_code}",
+            status_code=response.status_code,
+            code=error.get("code"),
+        )
+
+    # ============ Orders ============
+
+    async def create_order(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create an order
+
+        Args:
+            data: Order payload (amount in paise, currency, notes, ...)
+
+        Returns:
+            Razorpay order entity
+        """
+        return await self._request("POST", "/orders", json=data)
+
+    async def fetch_order(self, order_id: str) -> Dict[str, Any]:
+        """Fetch an order
+
+        Args:
+            order_id: Razorpay order ID
+
+        Returns:
+            Razorpay order entity
+        """
+        return await self._request("GET", f"/orders/{order_id}")
+
+    async def ping(self) -> None:
+        """Cheapest authenticated call; raises RazorpayError on bad credentials or outage"""
+        await self._request("GET", "/orders", params={"count": 1}, max_retries=0)
+
+    # ============ Signatures ============
+
+    @staticmethod
+    def _hmac_matches(secret: str, message: str, signature: str) -> bool:
+        expected = hmac.new(secret.encode(), message.encode(), hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, signature or "")
+
+    def verify_payment_signature(self, order_id: str, payment_id: str, signature: str) -> bool:
+        """Check the signature Checkout returns for a completed payment"""
+        return self._hmac_matches(self.key_secret, f"{order_id}|{payment_id}", signature)
+
+    @classmethod
+    def verify_webhook_signature(cls, body: str, signature: str, secret: str) -> bool:
+        """Check the X-Razorpay-Signature header of a webhook"""
+        return bool(secret) and cls._hmac_matches(secret, body, signature)
+
+    # ============ Lifecycle ============
+
+    async def aclose(self):
+        """Close pooled connections"""
+        await self._http.aclose()
@@ -0,0 +1,198 @@
+"""Recently Viewed Tracking with Write-Behind Buffering
+
+This module keeps product view history off the request path:
+- Views go into a per-user Redis sorted set, capped at N products
+- Changed (user, product) pairs are coalesced in a pending hash
+- A background task flushes them to MySQL in batched upserts; views of
+  deleted users or products are dropped instead of failing the batch
+- Reads come from the sorted set, seeded from MySQL on first access
+- Falls back to direct single-statement upserts when Redis is unavailable
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Optional, List, Tuple
+
+from sqlalchemy import text
+
+from cache_service import CacheService
+
+logger = logging.getLogger(__name__)
+
+UPSERT_VIEW_SQL = text(
+    "INSERT INTO recently_viewed (id, user_id, product_id, viewed_at) "
+    "VALUES (:id, :user_id, :product_id, :viewed_at) "
+    "ON DUPLICATE KEY UPDATE viewed_at = GREATEST(viewed_at, VALUES(viewed_at))"
+)
+
+
+def _upsert_existing(count: int):
+    """Batch upsert that skips views of users or products that no longer exist
+
+    One stale view (deleted product or user) would otherwise fail the
+    foreign keys, and with them the whole batch, on every flush.
+    """
+    rows = ", ".join(f"ROW(:id_{i}, :user_id_{i}, :product_id_{i}, :viewed_at_{i})" for i in range(count))
+    return text(
+        "INSERT INTO recently_viewed (id, user_id, product_id, viewed_at) "
+        "SELECT staged.id, staged.user_id, staged.product_id, staged.viewed_at "
+        f"FROM (VALUES {rows}) AS staged (id, user_id, product_id, viewed_at) "
+        "WHERE EXISTS (SELECT 1 FROM users u WHERE u.id = staged.user_id) "
+        "AND EXISTS (SELECT 1 FROM products p WHERE p.id = staged.product_id) "
+        "ON DUPLICATE KEY UPDATE viewed_at = GREATEST(recently_viewed.viewed_at, staged.viewed_at)"
+    )
+
+
+class RecentlyViewedBuffer:
+    """Buffers product views in Redis and flushes them to MySQL"""
+
+    def __init__(self, cache: CacheService, session_maker):
+        """Initialize buffer
+
+        Args:
+            cache: Cache service holding the Redis buffer
+            session_maker: Async session factory
+        """
+        self.cache = cache
+        self.session_maker = session_maker
+        self.max_items = int(os.environ.get('RECENTLY_VIEWED_MAX_ITEMS', '50'))
+        self.flush_seconds = float(os.environ.get('RECENTLY_VIEWED_FLUSH_SECONDS', '5'))
+        self.batch_size = int(os.environ.get('RECENTLY_VIEWED_BATCH_SIZE', '500'))
+        self._task: Optional[asyncio.Task] = None
+
+    # ============ Writes ============
+
+    async def record(self, user_id: str, product_id: str):
+        """Record a product view
+
+        Args:
+            user_id: User ID
+            product_id: Viewed product ID
+        """
+        now = time.time()
+        if await self.cache.record_view(user_id, product_id, now, self.max_items):
+            return
+
+        # Redis unavailable: write through with one upsert
+        async with self.session_maker() as session:
+            await session.execute(UPSERT_VIEW_SQL, [self._row(user_id, product_id, now)])
+            await session.commit()
+
+    @staticmethod
+    def _row(user_id: str, product_id: str, viewed_at: float) -> dict:
+        return {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "product_id": product_id,
+            "viewed_at": datetime.fromtimestamp(viewed_at, tz=timezone.utc).replace(tzinfo=None),
+        }
+
+    # ============ Reads ============
+
+    async def get(self, user_id: str, limit: int) -> List[Tuple[str, datetime]]:
+        """Get the user's most recently viewed products
+
+        Args:
+            user_id: User ID
+            limit: Maximum number of products
+
+        Returns:
+            [(product_id, viewed_at)], newest first
+        """
+        limit = min(limit, self.max_items)
+        views = await self.cache.get_recent_views(user_id, limit)
+
+        if views is None:
+            # First read since the buffer expired (or Redis is down): seed from MySQL
+            async with self.session_maker() as session:
+                result = await session.execute(
+                    text(
+                        "SELECT product_id, viewed_at FROM recently_viewed "
+                        "WHERE user_id = :user_id ORDER BY viewed_at DESC LIMIT :limit"
+                    ),
+                    {"user_id": user_id, "limit": self.max_items}
+                )
+                rows = result.all()
+
+            db_views = [
+                (row.product_id, row.viewed_at.replace(tzinfo=timezone.utc).timestamp())
+                for row in rows
+            ]
+            await self.cache.seed_recent_views(user_id, db_views, self.max_items)
+
+            views = await self.cache.get_recent_views(user_id, limit)
+            if views is None:
+                views = db_views[:limit]
+
+        return [
+            (product_id, datetime.fromtimestamp(float(viewed_at), tz=timezone.utc))
+            for product_id, viewed_at in views
+        ]
+
+    # ============ Flushing ============
+
+    async def flush(self) -> int:
+        """Write pending views to MySQL
+
+        Returns:
+            Number of views written
+        """
+        pending = await self.cache.take_pending_views()
+        if not pending:
+            return 0
+
+        rows = []
+        for member, viewed_at in pending.items():
+            user_id, _, product_id = member.partition("|")
+            rows.append(self._row(user_id, product_id, float(viewed_at)))
+
+        try:
+            async with self.session_maker() as session:
+                for start in range(0, len(rows), self.batch_size):
+                    chunk = rows[start:start + self.batch_size]
+                    params = {}
+                    for i, row in enumerate(chunk):
+                        params.update({f"{column}_{i}": value for column, value in row.items()})
+                    await session.execute(_upsert_existing(len(chunk)), params)
+                await session.commit()
+        except Exception:
+            # Keep the views for the next flush
+            await self.cache.restore_pending_views(pending)
+            raise
+
+        logger.debug(f"Recently viewed flush: {len(rows)} views")
+        return len(rows)
+
+    def start(self):
+        """Flush pending views every flush_seconds"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Recently viewed flush failed: {e}")
+
+    async def stop(self):
+        """Stop the flusher after writing whatever is still pending"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Recently viewed final flush failed: {e}")
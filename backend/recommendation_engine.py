@@ -0,0 +1,267 @@
+"""Item-Item Recommendation Index
+
+This module precomputes product neighbours from user behaviour:
+- Co-view similarity from recently_viewed (products viewed by the same user)
+- Co-purchase similarity from order_items (products bought in the same order)
+- Cosine-normalized co-occurrence counts, built with NumPy
+- Top-K neighbours per product, served from memory in O(K)
+- Periodic background rebuild
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List, Iterable, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+
+class RecommendationEngine:
+    """Builds and serves an in-memory item-item similarity index"""
+
+    def __init__(self):
+        """Read index settings from the environment"""
+        self.top_k = int(os.environ.get('RECOMMENDATION_TOP_K', '20'))
+        self.lookback_days = int(os.environ.get('RECOMMENDATION_LOOKBACK_DAYS', '90'))
+        self.refresh_seconds = int(os.environ.get('RECOMMENDATION_REFRESH_SECONDS', '3600'))
+        # A purchase says more about two products than a view does
+        self.view_weight = float(os.environ.get('RECOMMENDATION_VIEW_WEIGHT', '1.0'))
+        self.purchase_weight = float(os.environ.get('RECOMMENDATION_PURCHASE_WEIGHT', '3.0'))
+        # Cap per basket so one heavy browser can't dominate (pairs grow quadratically)
+        self.max_basket = int(os.environ.get('RECOMMENDATION_MAX_BASKET', '50'))
+
+        self.neighbors: Dict[str, List[Tuple[str, float]]] = {}
+        self.built_at: Optional[datetime] = None
+        self.build_seconds = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    # ============ Index Building ============
+
+    def _cooccurrence(
+        self,
+        baskets: List[List[int]],
+        n_items: int,
+        weight: float
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Weighted co-occurrence counts for all item pairs in the baskets
+
+        Returns:
+            (pair_keys, pair_weights, item_weights) where pair_keys encode
+            (i, j) with i < j as i * n_items + j
+        """
+        item_weights = np.zeros(n_items, dtype=np.float64)
+        chunks = []
+
+        for basket in baskets:
+            items = np.unique(np.asarray(basket[-self.max_basket:], dtype=np.int64))
+            item_weights[items] += weight
+            if len(items) < 2:
+                continue
+            left, right = np.triu_indices(len(items), k=1)
+            chunks.append(items[left] * n_items + items[right])
+
+        if not chunks:
+            return np.empty(0, dtype=np.int64), np.empty(0), item_weights
+
+        keys, counts = np.unique(np.concatenate(chunks), return_counts=True)
+        return keys, counts * weight, item_weights
+
+    def build(
+        self,
+        views: Iterable[Tuple[str, str]],
+        purchases: Iterable[Tuple[str, str]]
+    ) -> Dict[str, List[Tuple[str, float]]]:
+        """Build top-K neighbours from interaction rows
+
+        Args:
+            views: (user_id, product_id) rows, oldest first
+            purchases: (order_id, product_id) rows
+
+        Returns:
+            Mapping of product ID to [(neighbour ID, score)], best first
+        """
+        index: Dict[str, int] = {}
+        view_baskets: Dict[str, List[int]] = defaultdict(list)
+        purchase_baskets: Dict[str, List[int]] = defaultdict(list)
+
+        for user_id, product_id in views:
+            view_baskets[user_id].append(index.setdefault(product_id, len(index)))
+        for order_id, product_id in purchases:
+            purchase_baskets[order_id].append(index.setdefault(product_id, len(index)))
+
+        n_items = len(index)
+        if n_items < 2:
+            return {}
+
+        view_keys, view_pairs, view_items = self._cooccurrence(
+            list(view_baskets.values()), n_items, self.view_weight
+        )
+        purchase_keys, purchase_pairs, purchase_items = self._cooccurrence(
+            list(purchase_baskets.values()), n_items, self.purchase_weight
+        )
+
+        # Merge both signals into one weighted pair list
+        keys, inverse = np.unique(np.concatenate([view_keys, purchase_keys]), return_inverse=True)
+        if not len(keys):
+            return {}
+        weights = np.bincount(inverse, weights=np.concatenate([view_pairs, purchase_pairs]))
+        item_weights = view_items + purchase_items
+
+        # Cosine normalization: co(i, j) / sqrt(w(i) * w(j))
+        left, right = np.divmod(keys, n_items)
+        scores = weights / np.sqrt(item_weights[left] * item_weights[right])
+
+        # Each pair is a neighbour in both directions
+        rows = np.concatenate([left, right])
+        cols = np.concatenate([right, left])
+        scores = np.concatenate([scores, scores])
+
+        # Sort by row, then by score descending, and keep the first K per row
+        order = np.lexsort((-scores, rows))
+        rows, cols, scores = rows[order], cols[order], scores[order]
+        starts = np.searchsorted(rows, np.arange(n_items))
+        rank = np.arange(len(rows)) - starts[rows]
+        keep = rank < self.top_k
+
+        ids = np.empty(n_items, dtype=object)
+        for product_id, position in index.items():
+            ids[position] = product_id
+
+        neighbors: Dict[str, List[Tuple[str, float]]] = defaultdict(list)
+        for row, col, score in zip(ids[rows[keep]], ids[cols[keep]], scores[keep]):
+            neighbors[row].append((col, round(float(score), 4)))
+        return dict(neighbors)
+
+    async def refresh(self, session_maker):
+        """Rebuild the index from recent interactions
+
+        Args:
+            session_maker: Async session factory
+        """
+        since = datetime.now(timezone.utc) - timedelta(days=self.lookback_days)
+
+        async with session_maker() as session:
+            views = await session.execute(
+                text(
+                    "SELECT user_id, product_id FROM recently_viewed "
+                    "WHERE viewed_at >= :since ORDER BY viewed_at"
+                ),
+                {"since": since}
+            )
+            purchases = await session.execute(
+                text(
+                    "SELECT oi.order_id, oi.product_id FROM order_items oi "
+                    "JOIN orders o ON o.id = oi.order_id "
+                    "WHERE o.created_at >= :since"
+                ),
+                {"since": since}
+            )
+            view_rows = views.all()
+            purchase_rows = purchases.all()
+
+        started = time.perf_counter()
+        # The NumPy work is CPU-bound; keep it off the event loop
+        neighbors = await asyncio.to_thread(self.build, view_rows, purchase_rows)
+        self.build_seconds = round(time.perf_counter() - started, 3)
+
+        self.neighbors = neighbors
+        self.built_at = datetime.now(timezone.utc)
+        logger.info(
+            f"Recommendation index rebuilt: {len(neighbors)} products, "
+            f"{len(view_rows)} views, {len(purchase_rows)} purchases ({self.build_seconds}s)"
+        )
+
+    # ============ Serving ============
+
+    def related(self, product_id: str, limit: int) -> List[str]:
+        """Get the closest neighbours of a product
+
+        Args:
+            product_id: Product ID
+            limit: Maximum number of product IDs
+
+        Returns:
+            Product IDs, best first (empty if the product has no history)
+        """
+        return [neighbor for neighbor, _ in self.neighbors.get(product_id, [])[:limit]]
+
+    def recommend(self, seed_ids: List[str], limit: int) -> List[str]:
+        """Get products closest to a set of seed products
+
+        Scores from each seed's neighbour list are summed, so products
+        related to several seeds rank first. Seeds themselves are excluded.
+
+        Args:
+            seed_ids: Product IDs the user interacted with
+            limit: Maximum number of product IDs
+
+        Returns:
+            Product IDs, best first
+        """
+        seeds = set(seed_ids)
+        totals: Dict[str, float] = defaultdict(float)
+        for seed in seed_ids:
+            for neighbor, score in self.neighbors.get(seed, []):
+                if neighbor not in seeds:
+                    totals[neighbor] += score
+        return sorted(totals, key=totals.get, reverse=True)[:limit]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get index size and freshness"""
+        return {
+            "products": len(self.neighbors),
+            "top_k": self.top_k,
+            "built_at": self.built_at.isoformat() if self.built_at else None,
+            "build_seconds": self.build_seconds,
+        }
+
+    # ============ Background Refresh ============
+
+    def start(self, session_maker):
+        """Build the index now and then every refresh_seconds
+
+        Args:
+            session_maker: Async session factory
+        """
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run(session_maker))
+
+    async def _run(self, session_maker):
+        while True:
+            try:
+                await self.refresh(session_maker)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Keep serving the previous index
+                logger.error(f"Recommendation index rebuild failed: {e}")
+            await asyncio.sleep(self.refresh_seconds)
+
+    async def stop(self):
+        """Stop the background refresh"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global engine instance
+recommendation_engine: Optional[RecommendationEngine] = None
+
+
+def get_recommendation_engine() -> RecommendationEngine:
+    """Get recommendation engine instance"""
+    global recommendation_engine
+    if recommendation_engine is None:
+        recommendation_engine = RecommendationEngine()
+    return recommendation_engine
@@ -0,0 +1,281 @@
+"""Shared Redis Connection Pool
+
+This module provides one Redis connection pool shared by every subsystem:
+- A single configurable async pool (max connections, socket timeouts, health checks)
+- A matching sync pool for slowapi, whose storage backend is synchronous
+- Per-subsystem key prefixes (cache, payment security, rate limiting)
+- Pool utilization metrics
+- A circuit breaker that fails fast while Redis is unreachable
+"""
+
+import redis.asyncio as redis
+import redis as redis_sync
+from redis.asyncio.client import Pipeline
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError, RedisError
+import logging
+import os
+import time
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RedisConnectionError):
+    """Raised instead of contacting Redis while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Tracks Redis connection failures and short-circuits calls while Redis is down
+
+    States:
+    - closed: calls go through; consecutive failures are counted
+    - open: calls fail immediately until reset_timeout has passed
+    - half_open: one trial call is let through; success closes, failure reopens
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        """Initialize circuit breaker
+
+        Args:
+            failure_threshold: Consecutive failures before the circuit opens
+            reset_timeout: Seconds to wait before letting a trial call through
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.short_circuited = 0
+        self.total_failures = 0
+        self._trial_in_flight = False
+
+    def allow_request(self) -> bool:
+        """Check whether a call may be sent to Redis"""
+        if self.state == "closed":
+            return True
+
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self._trial_in_flight = False
+
+        if self.state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+
+        self.short_circuited += 1
+        return False
+
+    def record_success(self):
+        """Record a successful call"""
+        if self.state != "closed":
+            logger.info("Redis circuit breaker closed")
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        """Record a connection failure or timeout"""
+        self.total_failures += 1
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning(
+                    f"Redis circuit breaker opened after {self.consecutive_failures} failures"
+                )
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """Let another trial call through (the trial ended without an answer, e.g. cancelled)"""
+        self._trial_in_flight = False
+
+    def record_outcome(self, error: Optional[BaseException]):
+        """Settle a call that was allowed through
+
+        Connection errors and timeouts count as failures. Any other Redis
+        error (ResponseError, NoScriptError, ...) means Redis answered, so it
+        counts as a success. Anything else (cancellation) only releases the
+        half-open trial, so the breaker can never stay half-open for good.
+        """
+        if error is None:
+            self.record_success()
+        elif isinstance(error, (RedisConnectionError, RedisTimeoutError)):
+            self.record_failure()
+        elif isinstance(error, RedisError):
+            self.record_success()
+        else:
+            self.release_trial()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get breaker state and counters"""
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "total_failures": self.total_failures,
+            "short_circuited": self.short_circuited,
+        }
+
+
+class GuardedPipeline(Pipeline):
+    """Pipeline that consults the circuit breaker before executing"""
+
+    breaker: CircuitBreaker
+
+    async def execute(self, raise_on_error: bool = True):
+        if not self.breaker.allow_request():
+            await self.reset()
+            raise CircuitOpenError("Redis circuit breaker is open")
+        error = None
+        try:
+            return await super().execute(raise_on_error)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.breaker.record_outcome(error)
+
+
+class GuardedRedis(redis.Redis):
+    """Async Redis client that consults the circuit breaker on every command"""
+
+    def __init__(self, *args, breaker: CircuitBreaker, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breaker = breaker
+
+    async def execute_command(self, *args, **options):
+        if not self.breaker.allow_request():
+            raise CircuitOpenError("Redis circuit breaker is open")
+        error = None
+        try:
+            return await super().execute_command(*args, **options)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.breaker.record_outcome(error)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> GuardedPipeline:
+        pipe = GuardedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+        pipe.breaker = self.breaker
+        return pipe
+
+
+class RedisPool:
+    """Owns the shared Redis connection pools and hands out clients"""
+
+    # Key prefixes per subsystem, appended to the global prefix
+    SUBSYSTEM_PREFIXES = {
+        "cache": "cache",
+        "payment": "paysec",
+        "ratelimit": "ratelimit",
+    }
+
+    def __init__(self, redis_url: str = None):
+        """Read pool configuration from the environment
+
+        Args:
+            redis_url: Redis connection URL (default: from environment or localhost)
+        """
+        self.redis_url = redis_url or os.environ.get('REDIS_URL', 'redis://localhost:6379')
+        self.max_connections = int(os.environ.get('REDIS_MAX_CONNECTIONS', '50'))
+        self.socket_timeout = float(os.environ.get('REDIS_SOCKET_TIMEOUT', '2.0'))
+        self.socket_connect_timeout = float(os.environ.get('REDIS_SOCKET_CONNECT_TIMEOUT', '1.0'))
+        self.health_check_interval = int(os.environ.get('REDIS_HEALTH_CHECK_INTERVAL', '30'))
+        self.key_prefix = os.environ.get('REDIS_KEY_PREFIX', 'specs')
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.environ.get('REDIS_BREAKER_FAILURE_THRESHOLD', '5')),
+            reset_timeout=float(os.environ.get('REDIS_BREAKER_RESET_TIMEOUT', '10')),
+        )
+        self._pool: Optional[redis.ConnectionPool] = None
+        self._sync_pool: Optional[redis_sync.ConnectionPool] = None
+        self._client: Optional[GuardedRedis] = None
+
+    def _pool_options(self) -> Dict[str, Any]:
+        return {
+            "max_connections": self.max_connections,
+            "socket_timeout": self.socket_timeout,
+            "socket_connect_timeout": self.socket_connect_timeout,
+            "health_check_interval": self.health_check_interval,
+            "retry_on_timeout": False,
+        }
+
+    def get_client(self) -> GuardedRedis:
+        """Get the shared async client (created lazily, no I/O)"""
+        if self._client is None:
+            self._pool = redis.ConnectionPool.from_url(
+                self.redis_url,
+                encoding="utf-8",
+                decode_responses=True,
+                **self._pool_options()
+            )
+            self._client = GuardedRedis(connection_pool=self._pool, breaker=self.breaker)
+            logger.info(
+                f"Shared Redis pool created (max_connections={self.max_connections}, "
+                f"socket_timeout={self.socket_timeout}s)"
+            )
+        return self._client
+
+    def get_sync_pool(self) -> redis_sync.ConnectionPool:
+        """Get the sync pool used by slowapi's storage backend"""
+        if self._sync_pool is None:
+            self._sync_pool = redis_sync.ConnectionPool.from_url(
+                self.redis_url,
+                **self._pool_options()
+            )
+        return self._sync_pool
+
+    def key_prefix_for(self, subsystem: str) -> str:
+        """Get the key prefix for a subsystem (e.g. 'specs:cache:')
+
+        Args:
+            subsystem: 'cache', 'payment' or 'ratelimit'
+        """
+        return f"{self.key_prefix}:{self.SUBSYSTEM_PREFIXES[subsystem]}:"
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get pool utilization and circuit breaker metrics"""
+        metrics: Dict[str, Any] = {
+            "max_connections": self.max_connections,
+            "circuit_breaker": self.breaker.get_stats(),
+        }
+
+        for name, pool in (("async_pool", self._pool), ("sync_pool", self._sync_pool)):
+            if pool is None:
+                continue
+            in_use = len(getattr(pool, "_in_use_connections", ()))
+            available = len(getattr(pool, "_available_connections", ()))
+            metrics[name] = {
+                "in_use": in_use,
+                "idle": available,
+                "created": in_use + available,
+                "utilization": round(in_use / self.max_connections, 3) if self.max_connections else 0,
+            }
+
+        return metrics
+
+    async def close(self):
+        """Close the shared pools"""
+        if self._pool is not None:
+            await self._pool.disconnect()
+            logger.info("Shared Redis pool closed")
+        if self._sync_pool is not None:
+            self._sync_pool.disconnect()
+        self._pool = None
+        self._sync_pool = None
+        self._client = None
+
+
+# Global pool instance
+redis_pool: Optional[RedisPool] = None
+
+
+def get_redis_pool() -> RedisPool:
+    """Get shared Redis pool instance"""
+    global redis_pool
+    if redis_pool is None:
+        redis_pool = RedisPool()
+    return redis_pool
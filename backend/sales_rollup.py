@@ -0,0 +1,168 @@
+"""Daily Sales Rollup
+
+The admin analytics endpoints load every order in the date range and
+aggregate in Python. The sales_daily table keeps per-day totals instead,
+maintained from domain events:
+- OrderCreated adds to the day's order count and revenue
+- PaymentCaptured adds to paid orders and paid revenue (bucketed by capture day)
+- PaymentReversed (a paid order marked unpaid again) subtracts them on the
+  day of the reversal, so toggling paid/pending never double counts
+- OrderDeleted subtracts everything the order still counted, on the day it
+  was created (the capture and cancellation days aren't kept per order)
+- OrderStatusChanged to 'cancelled' counts the cancellation (and away from
+  it takes the count back)
+- Each event is one upsert; concurrent workers add atomically
+- rebuild() (and migration 0008) recompute every day from the orders table
+
+Events bucket payments and cancellations by the day they happened, while a
+rebuild buckets everything by the order's creation day, so per-day paid and
+cancelled counts can shift after a rebuild; all-time totals match.
+Events are delivered at most once, so totals can drift below the orders
+table after a crash; rebuild() replaces them.
+"""
+
+import logging
+from datetime import date, datetime, timezone
+from typing import Optional, Dict, Any, List
+
+from sqlalchemy import text
+
+from domain_events import (
+    DomainEventBus, OrderCreated, OrderDeleted, OrderStatusChanged, PaymentCaptured, PaymentReversed
+)
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ("orders", "revenue", "paid_orders", "paid_revenue", "cancelled_orders")
+
+ADD_TO_DAY = text(
+    "INSERT INTO sales_daily (day, orders, revenue, paid_orders, paid_revenue, cancelled_orders, updated_at) "
+    "VALUES (:day, :orders, :revenue, :paid_orders, :paid_revenue, :cancelled_orders, :now) AS new "
+    "ON DUPLICATE KEY UPDATE "
+    "orders = sales_daily.orders + new.orders, "
+    "revenue = sales_daily.revenue + new.revenue, "
+    "paid_orders = sales_daily.paid_orders + new.paid_orders, "
+    "paid_revenue = sales_daily.paid_revenue + new.paid_revenue, "
+    "cancelled_orders = sales_daily.cancelled_orders + new.cancelled_orders, "
+    "updated_at = new.updated_at"
+)
+
+# Rebuild from orders: CLEAR then BACKFILL in one transaction
+CLEAR = text("DELETE FROM sales_daily")
+
+BACKFILL = text(
+    "INSERT INTO sales_daily (day, orders, revenue, paid_orders, paid_revenue, cancelled_orders, updated_at) "
+    "SELECT DATE(created_at), COUNT(*), COALESCE(SUM(total_amount), 0), "
+    "SUM(payment_status = 'paid'), COALESCE(SUM(CASE WHEN payment_status = 'paid' THEN total_amount END), 0), "
+    "SUM(order_status = 'cancelled'), :now "
+    "FROM orders WHERE created_at IS NOT NULL GROUP BY DATE(created_at)"
+)
+
+
+def _day(moment: datetime) -> date:
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.date()
+
+
+class SalesRollup:
+    """Per-day order and revenue totals maintained from domain events"""
+
+    def __init__(self, session_maker):
+        """Initialize rollup
+
+        Args:
+            session_maker: Async session factory
+        """
+        self.session_maker = session_maker
+
+    def subscribe(self, bus: DomainEventBus):
+        bus.subscribe(OrderCreated, self.on_order_created)
+        bus.subscribe(PaymentCaptured, self.on_payment_captured)
+        bus.subscribe(PaymentReversed, self.on_payment_reversed)
+        bus.subscribe(OrderStatusChanged, self.on_order_status_changed)
+        bus.subscribe(OrderDeleted, self.on_order_deleted)
+
+    async def add(self, day: date, **counts):
+        """Add to a day's counters"""
+        params = {counter: counts.get(counter, 0) for counter in COUNTERS}
+        async with self.session_maker() as session:
+            await session.execute(
+                ADD_TO_DAY,
+                {**params, "day": day, "now": datetime.now(timezone.utc).replace(tzinfo=None)}
+            )
+            await session.commit()
+
+    async def rebuild(self):
+        """Replace every day's totals with ones recomputed from orders
+        
+        The delete and insert share a transaction, so readers see either
+        the old totals or the new ones, never an empty table.
+        """
+        async with self.session_maker() as session:
+            await session.execute(CLEAR)
+            await session.execute(BACKFILL, {"now": datetime.now(timezone.utc).replace(tzinfo=None)})
+            await session.commit()
+
+    # ============ Subscribers ============
+
+    async def on_order_created(self, event: OrderCreated):
+        await self.add(_day(event.occurred_at), orders=1, revenue=float(event.total_amount))
+
+    async def on_payment_captured(self, event: PaymentCaptured):
+        await self.add(_day(event.occurred_at), paid_orders=1, paid_revenue=float(event.amount))
+
+    async def on_payment_reversed(self, event: PaymentReversed):
+        await self.add(_day(event.occurred_at), paid_orders=-1, paid_revenue=-float(event.amount))
+
+    async def on_order_status_changed(self, event: OrderStatusChanged):
+        if event.new_status == "cancelled" and event.old_status != "cancelled":
+            await self.add(_day(event.occurred_at), cancelled_orders=1)
+        elif event.old_status == "cancelled" and event.new_status != "cancelled":
+            await self.add(_day(event.occurred_at), cancelled_orders=-1)
+
+    async def on_order_deleted(self, event: OrderDeleted):
+        paid = event.payment_status == "paid"
+        await self.add(
+            _day(event.created_at or event.occurred_at),
+            orders=-1,
+            revenue=-float(event.total_amount),
+            paid_orders=-1 if paid else 0,
+            paid_revenue=-float(event.total_amount) if paid else 0,
+            cancelled_orders=-1 if event.order_status == "cancelled" else 0,
+        )
+
+    # ============ Queries ============
+
+    async def daily(self, start: Optional[date] = None, end: Optional[date] = None) -> List[Dict[str, Any]]:
+        """Day rows in [start, end], oldest first"""
+        conditions = []
+        params: Dict[str, Any] = {}
+        if start:
+            conditions.append("day >= :start")
+            params["start"] = start
+        if end:
+            conditions.append("day <= :end")
+            params["end"] = end
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+
+        async with self.session_maker() as session:
+            rows = (await session.execute(
+                text(
+                    "SELECT day, orders, revenue, paid_orders, paid_revenue, cancelled_orders "
+                    f"FROM sales_daily {where}ORDER BY day"
+                ),
+                params
+            )).mappings().all()
+
+        return [
+            {
+                "date": row["day"].isoformat(),
+                "orders": int(row["orders"]),
+                "revenue": round(float(row["revenue"]), 2),
+                "paid_orders": int(row["paid_orders"]),
+                "paid_revenue": round(float(row["paid_revenue"]), 2),
+                "cancelled_orders": int(row["cancelled_orders"]),
+            }
+            for row in rows
+        ]
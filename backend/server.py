@@ -1,29 +1,50 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Header, Depends
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import Column, String, Float, Integer, Text, DateTime, JSON, Enum, select, update, delete, func, or_
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, undefer
+from sqlalchemy import Column, String, Float, Integer, BigInteger, Text, DateTime, Date, JSON, Enum, Index, UniqueConstraint, LargeBinary, Computed, select, update, delete, func, or_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 import os
+import asyncio
 import logging
 import json
 from pathlib import Path
+from contextlib import asynccontextmanager
 from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Optional, Dict
 import uuid
-from datetime import datetime, timezone
+from datetime import date, datetime, timedelta, timezone
 from passlib.context import CryptContext
 import jwt
-from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
-from payment_gateway import PaymentGatewayFactory, RazorpayGateway
+from payment_registry import PaymentGatewayRegistry, GatewayUnavailableError
+from webhook_queue import WebhookQueue
+from payment_reconciliation import PaymentReconciler, UNSETTLED_STATUSES
 from email_service import email_service
 from logging_config import setup_logging, get_logger
 from error_tracking import initialize_sentry, capture_exception, set_user_context
-from rate_limiter import create_limiter, RateLimit, rate_limit_error_handler
-from middleware import RequestTrackerMiddleware, ErrorHandlerMiddleware
+from rate_limiter import create_limiter, RateLimit, rate_limit_error_handler, get_limiter_metrics
+from middleware import RequestTrackerMiddleware, ErrorHandlerMiddleware, IdempotencyMiddleware
+from cache_service import get_cache_service
+from payment_security import get_payment_security, PaymentLockError, PaymentLockBusyError
+from redis_pool import get_redis_pool
+from recommendation_engine import get_recommendation_engine
+from product_similarity import get_product_similarity
+from recently_viewed import RecentlyViewedBuffer
+from maintenance import MaintenanceService, MaintenanceBusyError
+from inventory import apply_stock_levels
+from order_pipeline import OrderFinalizer, OrderRequest, EmptyCartError, InsufficientStockError, PaymentNotFoundError
+from domain_events import DomainEventBus, OrderCreated, OrderDeleted, OrderStatusChanged, PaymentCaptured, PaymentReversed
+from sales_rollup import SalesRollup
+from inventory_events import InventoryEvent, InventoryEventBus, LowStockMonitor, GLOBAL_THRESHOLD_KEY
+from migrations import check_revision, upgrade as run_migrations
+from product_import import ProductImporter, ImportFormatError, detect_format, parse_rows
 from slowapi.errors import RateLimitExceeded
 
 ROOT_DIR = Path(__file__).parent
+# Environment before .env is applied (credential reloads layer the file over it)
+PROCESS_ENV = dict(os.environ)
 load_dotenv(ROOT_DIR / '.env')
 
 # MySQL connection
@@ -50,8 +71,8 @@ JWT_ALGORITHM = "HS256"
 ADMIN_EMAIL = "admin@lenskart.com"
 ADMIN_PASSWORD = "Admin@123"
 
-# Stripe setup
-STRIPE_API_KEY = os.environ.get('STRIPE_API_KEY', 'sk_test_emergent')
+# Stripe setup (placeholder key; the environment and .env are layered over it)
+STRIPE_API_KEY = 'sk_test_emergent'
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -63,6 +84,53 @@ api_router = APIRouter(prefix="/api")
 limiter = create_limiter(default_limit=os.getenv('DEFAULT_RATE_LIMIT', '100/minute'))
 app.state.limiter = limiter
 
+# Redis response cache (degrades to direct DB reads when Redis is unavailable)
+cache_service = get_cache_service()
+
+# Payment security (rate limits, sessions, locks) on the shared Redis pool
+payment_security = get_payment_security()
+
+# Item-item neighbours for related/recommended products (rebuilt in the background)
+recommendation_engine = get_recommendation_engine()
+
+# Attribute-similarity neighbours, updated in place on product writes
+product_similarity = get_product_similarity()
+
+# Product views are buffered in Redis and flushed to MySQL in batches
+recently_viewed = RecentlyViewedBuffer(cache_service, async_session_maker)
+
+# Retention: trims recently_viewed and archives old order_tracking rows
+maintenance = MaintenanceService(async_session_maker, cache_service)
+
+# Stock changes are published as events; crossing a low-stock threshold pushes an alert
+inventory_events = InventoryEventBus()
+low_stock_monitor = LowStockMonitor(async_session_maker, cache_service)
+inventory_events.subscribe(low_stock_monitor.handle)
+
+async def _update_similarity_stock(events: List[InventoryEvent]):
+    # Products that sell out (or come back) drop out of (or re-enter) related-product lists
+    product_similarity.update_stock({event.product_id: event.new_stock for event in events})
+
+inventory_events.subscribe(_update_similarity_stock)
+
+# Order/payment side effects (emails, caches, sales rollups) run off the response path
+domain_events = DomainEventBus()
+sales_rollup = SalesRollup(async_session_maker)
+sales_rollup.subscribe(domain_events)
+
+# Verified payment webhooks are queued in MySQL and processed by background workers
+webhook_queue = WebhookQueue(async_session_maker, payment_security)
+
+# Payment gateways are built once per worker; credentials reload when .env changes
+payment_gateways = PaymentGatewayRegistry(
+    credentials_file=ROOT_DIR / '.env',
+    defaults={'STRIPE_API_KEY': STRIPE_API_KEY},
+    environment=PROCESS_ENV
+)
+
+# Unsettled payments are checked in the background; the status endpoint reads local state
+payment_reconciler = PaymentReconciler(payment_gateways, cache_service, async_session_maker)
+
 # ============ SQLAlchemy Models ============
 
 class Base(DeclarativeBase):
@@ -87,6 +155,15 @@ class UserDB(Base):
 
 class ProductDB(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        # In-stock filtering by category or brand (listings, related/recommended)
+        Index("idx_products_category_stock", "category", "stock"),
+        Index("idx_products_brand_stock", "brand", "stock"),
+        # Low-stock alerts
+        Index("idx_stock", "stock"),
+        # Default "newest first" listing
+        Index("idx_products_created_at", "created_at"),
+    )
     
     id: Mapped[str] = mapped_column(String(36), primary_key=True)
     name: Mapped[str] = mapped_column(String(255))
@@ -103,6 +180,9 @@ class ProductDB(Base):
 
 class CartItemDB(Base):
     __tablename__ = "cart"
+    __table_args__ = (
+        Index("idx_cart_user_product", "user_id", "product_id"),
+    )
     
     id: Mapped[str] = mapped_column(String(36), primary_key=True)
     user_id: Mapped[str] = mapped_column(String(36), index=True)
@@ -112,6 +192,14 @@ class CartItemDB(Base):
 
 class OrderDB(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # Analytics date ranges
+        Index("idx_created_at", "created_at"),
+        # Order history, newest first
+        Index("idx_orders_user_created", "user_id", "created_at"),
+        # Revenue by payment status
+        Index("idx_orders_payment_created", "payment_status", "created_at"),
+    )
     
     id: Mapped[str] = mapped_column(String(36), primary_key=True)
     user_id: Mapped[str] = mapped_column(String(36), index=True)
@@ -119,11 +207,25 @@ class OrderDB(Base):
     payment_status: Mapped[str] = mapped_column(Enum('pending', 'paid', 'failed', 'refunded', name='payment_status_enum'), default="pending")
     order_status: Mapped[str] = mapped_column(Enum('processing', 'confirmed', 'shipped', 'delivered', 'cancelled', name='order_status_enum'), default="processing")
     shipping_address: Mapped[str] = mapped_column(Text)
+    # Set by admins when the order ships (migration 0009)
+    tracking_number: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+    estimated_delivery: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(timezone.utc))
 
+# Gateway of a payment; Stripe sessions predate the "gateway" metadata key
+PAYMENT_GATEWAY_EXPRESSION = "coalesce(json_unquote(json_extract(metadata, '$.gateway')), 'stripe')"
+
 class PaymentTransactionDB(Base):
     __tablename__ = "payment_transactions"
+    __table_args__ = (
+        # Reconciliation scans unsettled sessions, newest first
+        Index("idx_payment_transactions_status_created", "payment_status", "created_at"),
+        # Admin list: newest first, optionally filtered by gateway or user
+        Index("idx_payment_transactions_created", "created_at"),
+        Index("idx_payment_transactions_gateway_created", "gateway", "created_at"),
+        Index("idx_payment_transactions_user_created", "user_id", "created_at"),
+    )
     
     id: Mapped[str] = mapped_column(String(36), primary_key=True)
     session_id: Mapped[str] = mapped_column(String(255), unique=True, index=True)
@@ -133,10 +235,51 @@ class PaymentTransactionDB(Base):
     currency: Mapped[str] = mapped_column(String(10), default="inr")
     payment_status: Mapped[str] = mapped_column(String(50), default="pending")
     status: Mapped[str] = mapped_column(String(50), default="initiated")
-    payment_metadata: Mapped[Optional[str]] = mapped_column("metadata", Text, nullable=True)  # JSON string
+    # Only loaded where needed (undefer); lists use the generated gateway column
+    payment_metadata: Mapped[Optional[dict]] = mapped_column("metadata", JSON, nullable=True, deferred=True)
+    gateway: Mapped[str] = mapped_column(String(20), Computed(PAYMENT_GATEWAY_EXPRESSION, persisted=False))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(timezone.utc))
 
+class SalesDailyDB(Base):
+    """Per-day totals maintained by SalesRollup"""
+    __tablename__ = "sales_daily"
+    
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    orders: Mapped[int] = mapped_column(Integer, default=0)
+    revenue: Mapped[float] = mapped_column(Float, default=0)
+    paid_orders: Mapped[int] = mapped_column(Integer, default=0)
+    paid_revenue: Mapped[float] = mapped_column(Float, default=0)
+    cancelled_orders: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime)
+
+class WebhookEventDB(Base):
+    __tablename__ = "webhook_events"
+    __table_args__ = (
+        # Duplicate deliveries are dropped on insert
+        UniqueConstraint("gateway", "event_id", name="uq_webhook_events_gateway_event"),
+        # Claiming: ready events in arrival order
+        Index("idx_webhook_events_status_available", "status", "available_at"),
+        # Per-session ordering check
+        Index("idx_webhook_events_session", "session_id", "id"),
+    )
+    
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    gateway: Mapped[str] = mapped_column(String(20))
+    event_id: Mapped[str] = mapped_column(String(255))
+    session_id: Mapped[str] = mapped_column(String(255))
+    event_type: Mapped[str] = mapped_column(String(100))
+    payment_status: Mapped[str] = mapped_column(String(50))
+    payload: Mapped[str] = mapped_column(Text(length=2**24))  # Raw body as received
+    status: Mapped[str] = mapped_column(String(20), default="pending")  # pending, processing, done, failed
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    locked_by: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+    locked_until: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    available_at: Mapped[datetime] = mapped_column(DateTime)
+    received_at: Mapped[datetime] = mapped_column(DateTime)
+    processed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
 class AddressDB(Base):
     __tablename__ = "addresses"
     
@@ -153,6 +296,10 @@ class AddressDB(Base):
 
 class ReviewDB(Base):
     __tablename__ = "reviews"
+    __table_args__ = (
+        # Paginated review listing, newest first
+        Index("idx_reviews_product_created", "product_id", "created_at"),
+    )
     
     id: Mapped[str] = mapped_column(String(36), primary_key=True)
     product_id: Mapped[str] = mapped_column(String(36), index=True)
@@ -163,8 +310,25 @@ class ReviewDB(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
+class ProductRatingSummaryDB(Base):
+    __tablename__ = "product_rating_summaries"
+    
+    # Maintained incrementally in the same transaction as review writes
+    product_id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    rating_count: Mapped[int] = mapped_column(Integer, default=0)
+    rating_sum: Mapped[int] = mapped_column(Integer, default=0)
+    rating_1: Mapped[int] = mapped_column(Integer, default=0)
+    rating_2: Mapped[int] = mapped_column(Integer, default=0)
+    rating_3: Mapped[int] = mapped_column(Integer, default=0)
+    rating_4: Mapped[int] = mapped_column(Integer, default=0)
+    rating_5: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
 class WishlistDB(Base):
     __tablename__ = "wishlist"
+    __table_args__ = (
+        Index("idx_wishlist_user_product", "user_id", "product_id"),
+    )
     
     id: Mapped[str] = mapped_column(String(36), primary_key=True)
     user_id: Mapped[str] = mapped_column(String(36), index=True)
@@ -183,6 +347,12 @@ class ProductImageDB(Base):
 
 class OrderTrackingDB(Base):
     __tablename__ = "order_tracking"
+    __table_args__ = (
+        # Tracking history in order
+        Index("idx_order_tracking_order_created", "order_id", "created_at"),
+        # Retention scans old rows oldest first
+        Index("idx_order_tracking_created", "created_at"),
+    )
     
     id: Mapped[str] = mapped_column(String(36), primary_key=True)
     order_id: Mapped[str] = mapped_column(String(36), index=True)
@@ -191,14 +361,36 @@ class OrderTrackingDB(Base):
     location: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(timezone.utc))
 
+class OrderTrackingArchiveDB(Base):
+    __tablename__ = "order_tracking_archive"
+    
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    order_id: Mapped[str] = mapped_column(String(36), index=True)
+    row_count: Mapped[int] = mapped_column(Integer)
+    # zlib-compressed JSON list of archived order_tracking rows
+    payload: Mapped[bytes] = mapped_column(LargeBinary(length=2**24))
+    archived_at: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(timezone.utc))
+
 class RecentlyViewedDB(Base):
     __tablename__ = "recently_viewed"
+    __table_args__ = (
+        # One row per (user, product) so buffered views flush as upserts
+        Index("uq_recently_viewed_user_product", "user_id", "product_id", unique=True),
+    )
     
     id: Mapped[str] = mapped_column(String(36), primary_key=True)
     user_id: Mapped[str] = mapped_column(String(36), index=True)
     product_id: Mapped[str] = mapped_column(String(36), index=True)
     viewed_at: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(timezone.utc))
 
+class InventoryThresholdDB(Base):
+    __tablename__ = "inventory_thresholds"
+    
+    # Product ID, or GLOBAL_THRESHOLD_KEY for the store-wide default
+    product_id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    threshold: Mapped[int] = mapped_column(Integer)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(timezone.utc))
+
 class CouponDB(Base):
     __tablename__ = "coupons"
     
@@ -217,6 +409,9 @@ class CouponDB(Base):
 
 class SavedItemDB(Base):
     __tablename__ = "saved_items"
+    __table_args__ = (
+        Index("idx_saved_items_user_product", "user_id", "product_id"),
+    )
     
     id: Mapped[str] = mapped_column(String(36), primary_key=True)
     user_id: Mapped[str] = mapped_column(String(36), index=True)
@@ -522,6 +717,23 @@ def create_token(user_id: str, email: str, role: str):
     payload = {"user_id": user_id, "email": email, "role": role}
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+# Lifetime of stream tokens: only needed to open the EventSource connection
+STREAM_TOKEN_TTL = int(os.environ.get('STREAM_TOKEN_TTL_SECONDS', '60'))
+
+def create_stream_token(user: dict, scope: str) -> str:
+    """Short-lived token that only opens one kind of SSE stream
+    
+    EventSource can't send headers, so the token travels in the URL (and
+    access logs); it expires quickly and is rejected as an API bearer token.
+    """
+    payload = {
+        "user_id": user['user_id'],
+        "role": user['role'],
+        "scope": scope,
+        "exp": datetime.now(timezone.utc) + timedelta(seconds=STREAM_TOKEN_TTL)
+    }
+    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
 def verify_token(token: str):
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
@@ -534,7 +746,8 @@ async def get_current_user(authorization: str = Header(None)):
         raise HTTPException(status_code=401, detail="Unauthorized")
     token = authorization.split(" ")[1]
     payload = verify_token(token)
-    if not payload:
+    # Stream tokens only open their stream
+    if not payload or payload.get("scope"):
         raise HTTPException(status_code=401, detail="Invalid token")
     return payload
 
@@ -966,6 +1179,22 @@ async def delete_address(
 
 # ============ Product Routes ============
 
+async def get_stock_levels(product_ids: List[str]) -> Dict[str, int]:
+    """Current stock for many products (one primary-key IN query)
+    
+    Stock changes with every order, import and inventory update, so it is
+    never cached with the product payloads; reads overlay it instead.
+    """
+    product_ids = list(dict.fromkeys(product_ids))
+    if not product_ids:
+        return {}
+    
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(ProductDB.id, ProductDB.stock).where(ProductDB.id.in_(product_ids))
+        )
+        return {product_id: stock for product_id, stock in result.all()}
+
 @api_router.get("/products")
 async def get_products(
     category: Optional[str] = None, 
@@ -974,92 +1203,130 @@ async def get_products(
     max_price: Optional[float] = None,
     sort: Optional[str] = None
 ):
-    async with async_session_maker() as session:
-        query = select(ProductDB)
-        
-        # Category filter
-        if category:
-            query = query.where(ProductDB.category == category)
-        
-        # Search filter (name, brand, description)
-        if search:
-            search_pattern = f"%{search}%"
-            query = query.where(
-                (ProductDB.name.like(search_pattern)) | 
-                (ProductDB.brand.like(search_pattern)) |
-                (ProductDB.description.like(search_pattern))
-            )
-        
-        # Price range filter
-        if min_price is not None:
-            query = query.where(ProductDB.price >= min_price)
-        if max_price is not None:
-            query = query.where(ProductDB.price <= max_price)
-        
-        # Sorting
-        if sort:
-            if sort == "price_asc":
-                query = query.order_by(ProductDB.price.asc())
-            elif sort == "price_desc":
-                query = query.order_by(ProductDB.price.desc())
-            elif sort == "name_asc":
-                query = query.order_by(ProductDB.name.asc())
-            elif sort == "name_desc":
-                query = query.order_by(ProductDB.name.desc())
-            elif sort == "newest":
+    filters = {
+        "category": category,
+        "search": search,
+        "min_price": min_price,
+        "max_price": max_price,
+        "sort": sort
+    }
+    
+    async def load_products():
+        async with async_session_maker() as session:
+            query = select(ProductDB)
+            
+            # Category filter
+            if category:
+                query = query.where(ProductDB.category == category)
+            
+            # Search filter (name, brand, description)
+            if search:
+                search_pattern = f"%{search}%"
+                query = query.where(
+                    (ProductDB.name.like(search_pattern)) | 
+                    (ProductDB.brand.like(search_pattern)) |
+                    (ProductDB.description.like(search_pattern))
+                )
+            
+            # Price range filter
+            if min_price is not None:
+                query = query.where(ProductDB.price >= min_price)
+            if max_price is not None:
+                query = query.where(ProductDB.price <= max_price)
+            
+            # Sorting
+            if sort:
+                if sort == "price_asc":
+                    query = query.order_by(ProductDB.price.asc())
+                elif sort == "price_desc":
+                    query = query.order_by(ProductDB.price.desc())
+                elif sort == "name_asc":
+                    query = query.order_by(ProductDB.name.asc())
+                elif sort == "name_desc":
+                    query = query.order_by(ProductDB.name.desc())
+                elif sort == "newest":
+                    query = query.order_by(ProductDB.created_at.desc())
+            else:
+                # Default sorting by created_at descending
                 query = query.order_by(ProductDB.created_at.desc())
-        else:
-            # Default sorting by created_at descending
-            query = query.order_by(ProductDB.created_at.desc())
-        
-        result = await session.execute(query)
-        products = result.scalars().all()
-        
-        product_list = [
-            {
-                "id": p.id,
-                "name": p.name,
-                "brand": p.brand,
-                "price": p.price,
-                "description": p.description,
-                "category": p.category,
-                "frame_type": p.frame_type,
-                "frame_shape": p.frame_shape,
-                "color": p.color,
-                "image_url": p.image_url,
-                "stock": p.stock,
-                "created_at": p.created_at.isoformat() if p.created_at else None
-            }
-            for p in products
-        ]
-        
-        return product_list
+            
+            result = await session.execute(query)
+            products = result.scalars().all()
+            
+            return [
+                {
+                    "id": p.id,
+                    "name": p.name,
+                    "brand": p.brand,
+                    "price": p.price,
+                    "description": p.description,
+                    "category": p.category,
+                    "frame_type": p.frame_type,
+                    "frame_shape": p.frame_shape,
+                    "color": p.color,
+                    "image_url": p.image_url,
+                    "created_at": p.created_at.isoformat() if p.created_at else None
+                }
+                for p in products
+            ]
+    
+    # Stale lists are served immediately and rebuilt in the background
+    products = await cache_service.get_or_load_products(filters, load_products)
+    
+    # Ratings and stock are overlaid separately so review writes and orders
+    # don't invalidate every list
+    product_ids = [p["id"] for p in products]
+    ratings = await get_rating_summaries(product_ids)
+    stock = await get_stock_levels(product_ids)
+    return [
+        {**p, "stock": stock.get(p["id"], 0), "rating": ratings[p["id"]]}
+        for p in products
+    ]
+
+@api_router.get("/products/ratings")
+async def get_product_ratings(ids: str = ""):
+    """Get rating summaries for many products (comma-separated ids, max 200)"""
+    product_ids = [pid.strip() for pid in ids.split(",") if pid.strip()]
+    if len(product_ids) > 200:
+        raise HTTPException(status_code=400, detail="At most 200 product ids per request")
+    
+    return await get_rating_summaries(product_ids)
 
 @api_router.get("/products/{product_id}")
 async def get_product(product_id: str):
-    async with async_session_maker() as session:
-        result = await session.execute(select(ProductDB).where(ProductDB.id == product_id))
-        product = result.scalar_one_or_none()
-        
-        if not product:
-            raise HTTPException(status_code=404, detail="Product not found")
-        
-        product_data = {
-            "id": product.id,
-            "name": product.name,
-            "brand": product.brand,
-            "price": product.price,
-            "description": product.description,
-            "category": product.category,
-            "frame_type": product.frame_type,
-            "frame_shape": product.frame_shape,
-            "color": product.color,
-            "image_url": product.image_url,
-            "stock": product.stock,
-            "created_at": product.created_at.isoformat() if product.created_at else None
-        }
-        
-        return product_data
+    async def load_product():
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(ProductDB, ProductRatingSummaryDB)
+                .outerjoin(ProductRatingSummaryDB, ProductRatingSummaryDB.product_id == ProductDB.id)
+                .where(ProductDB.id == product_id)
+            )
+            row = result.first()
+            
+            if not row:
+                raise HTTPException(status_code=404, detail="Product not found")
+            product, summary = row
+            
+            return {
+                "id": product.id,
+                "name": product.name,
+                "brand": product.brand,
+                "price": product.price,
+                "description": product.description,
+                "category": product.category,
+                "frame_type": product.frame_type,
+                "frame_shape": product.frame_shape,
+                "color": product.color,
+                "image_url": product.image_url,
+                "created_at": product.created_at.isoformat() if product.created_at else None,
+                "rating": rating_summary_dict(summary)
+            }
+    
+    product = await cache_service.get_or_load_product(product_id, load_product)
+    
+    # Stock is read live, like in the product lists
+    stock = await get_stock_levels([product_id])
+    return {**product, "stock": stock.get(product_id, 0)}
 
 @api_router.get("/search/suggestions")
 async def get_search_suggestions(q: str = ""):
@@ -1073,53 +1340,54 @@ async def get_search_suggestions(q: str = ""):
     
     query = q.lower().strip()
     
-    async with async_session_maker() as session:
-        # Search products by name, brand, or description
-        product_result = await session.execute(
-            select(ProductDB)
-            .where(
-                or_(
-                    ProductDB.name.ilike(f"%{query}%"),
-                    ProductDB.brand.ilike(f"%{query}%"),
-                    ProductDB.description.ilike(f"%{query}%")
+    async def load_suggestions():
+        async with async_session_maker() as session:
+            # Search products by name, brand, or description
+            product_result = await session.execute(
+                select(ProductDB)
+                .where(
+                    or_(
+                        ProductDB.name.ilike(f"%{query}%"),
+                        ProductDB.brand.ilike(f"%{query}%"),
+                        ProductDB.description.ilike(f"%{query}%")
+                    )
                 )
+                .where(ProductDB.stock > 0)  # Only show in-stock products
+                .limit(8)  # Limit to 8 product suggestions
             )
-            .where(ProductDB.stock > 0)  # Only show in-stock products
-            .limit(8)  # Limit to 8 product suggestions
-        )
-        products = product_result.scalars().all()
-        
-        # Get unique brands that match
-        brand_result = await session.execute(
-            select(ProductDB.brand)
-            .where(ProductDB.brand.ilike(f"%{query}%"))
-            .where(ProductDB.stock > 0)
-            .distinct()
-            .limit(5)
-        )
-        brands = [brand for brand in brand_result.scalars().all()]
-        
-        # Get matching categories
-        all_categories = ['men', 'women', 'kids', 'sunglasses']
-        matching_categories = [cat for cat in all_categories if query in cat.lower()]
-        
-        suggestions = {
-            "products": [
-                {
-                    "id": p.id,
-                    "name": p.name,
-                    "brand": p.brand,
-                    "price": float(p.price),
-                    "image_url": p.image_url,
-                    "category": p.category
-                }
-                for p in products
-            ],
-            "brands": brands,
-            "categories": matching_categories
-        }
-        
-        return suggestions
+            products = product_result.scalars().all()
+            
+            # Get unique brands that match
+            brand_result = await session.execute(
+                select(ProductDB.brand)
+                .where(ProductDB.brand.ilike(f"%{query}%"))
+                .where(ProductDB.stock > 0)
+                .distinct()
+                .limit(5)
+            )
+            brands = [brand for brand in brand_result.scalars().all()]
+            
+            # Get matching categories
+            all_categories = ['men', 'women', 'kids', 'sunglasses']
+            matching_categories = [cat for cat in all_categories if query in cat.lower()]
+            
+            return {
+                "products": [
+                    {
+                        "id": p.id,
+                        "name": p.name,
+                        "brand": p.brand,
+                        "price": float(p.price),
+                        "image_url": p.image_url,
+                        "category": p.category
+                    }
+                    for p in products
+                ],
+                "brands": brands,
+                "categories": matching_categories
+            }
+    
+    return await cache_service.get_or_load_search_suggestions(query, load_suggestions)
 
 @api_router.post("/products")
 async def create_product(product_data: ProductCreate, authorization: str = Header(None)):
@@ -1148,8 +1416,58 @@ async def create_product(product_data: ProductCreate, authorization: str = Heade
         session.add(db_product)
         await session.commit()
         
+        await cache_service.invalidate_products()
+        product_similarity.upsert(product.model_dump())
+        
         return {"message": "Product created successfully", "product": product.model_dump()}
 
+async def after_product_import_batch(products: List[dict], previous_stock: Dict[str, int]):
+    """Invalidate caches and publish stock changes once per committed import batch"""
+    await cache_service.invalidate_products()
+    # The upsert replaced price, name and stock
+    await cache_service.delete_product_snapshots([p["id"] for p in products])
+    product_similarity.upsert_many(products)
+    # New products have no previous level to cross
+    inventory_events.publish([
+        InventoryEvent(p["id"], p["name"], previous_stock[p["id"]], p["stock"], "import")
+        for p in products if p["id"] in previous_stock
+    ])
+
+def get_product_importer(batch_size: Optional[int] = None) -> ProductImporter:
+    """Importer that validates with ProductCreate and upserts into products"""
+    return ProductImporter(
+        async_session_maker,
+        ProductCreate,
+        ProductDB.__table__,
+        batch_size=batch_size,
+        after_batch=after_product_import_batch
+    )
+
+@api_router.post("/admin/products/import")
+async def import_products(
+    request: Request,
+    format: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    authorization: str = Header(None)
+):
+    """Bulk upsert products from a streamed CSV or NDJSON body
+    
+    Rows with an existing id update that product; rows without one are created.
+    """
+    user = await get_current_user(authorization)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    if batch_size is not None and not 1 <= batch_size <= 10000:
+        raise HTTPException(status_code=400, detail="batch_size must be between 1 and 10000")
+    
+    try:
+        import_format = format or detect_format(request.headers.get("content-type"))
+        rows = parse_rows(request.stream(), import_format)
+        return await get_product_importer(batch_size).run(rows)
+    except ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @api_router.put("/products/{product_id}")
 async def update_product(product_id: str, product_data: ProductCreate, authorization: str = Header(None)):
     user = await get_current_user(authorization)
@@ -1169,6 +1487,10 @@ async def update_product(product_id: str, product_data: ProductCreate, authoriza
         
         await session.commit()
         
+        await cache_service.invalidate_product(product_id)
+        await cache_service.set_product_snapshots([product_snapshot(product)])
+        product_similarity.upsert({**product_snapshot(product), "created_at": product.created_at})
+        
         return {"message": "Product updated successfully"}
 
 @api_router.delete("/products/{product_id}")
@@ -1187,8 +1509,99 @@ async def delete_product(product_id: str, authorization: str = Header(None)):
         await session.delete(product)
         await session.commit()
         
+        await cache_service.invalidate_product(product_id)
+        await cache_service.delete_product_snapshots([product_id])
+        product_similarity.remove(product_id)
+        
         return {"message": "Product deleted successfully"}
 
+# ============ Cart State (Redis write-through) ============
+
+def product_snapshot(product: ProductDB) -> dict:
+    """Product fields embedded in cart responses"""
+    return {
+        "id": product.id,
+        "name": product.name,
+        "brand": product.brand,
+        "price": product.price,
+        "description": product.description,
+        "category": product.category,
+        "frame_type": product.frame_type,
+        "frame_shape": product.frame_shape,
+        "color": product.color,
+        "image_url": product.image_url,
+        "stock": product.stock
+    }
+
+def cart_item_state(item: CartItemDB) -> dict:
+    """Cart row as stored in the Redis cart hash"""
+    return {
+        "id": item.id,
+        "user_id": item.user_id,
+        "product_id": item.product_id,
+        "quantity": item.quantity,
+        "added_at": item.added_at.isoformat() if item.added_at else None
+    }
+
+async def load_cart_state(user_id: str) -> List[dict]:
+    """Get cart items with product details straight from MySQL (one JOIN)
+    
+    Refills the Redis cart unless a cart write raced the read. Checkout
+    uses this so gateway amounts never come from cached prices.
+    """
+    version = await cache_service.get_cart_version(user_id)
+    
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(CartItemDB, ProductDB)
+            .join(ProductDB, CartItemDB.product_id == ProductDB.id)
+            .where(CartItemDB.user_id == user_id)
+            .order_by(CartItemDB.added_at)
+        )
+        rows = result.all()
+    
+    items = [cart_item_state(cart_item) for cart_item, product in rows]
+    snapshots = [product_snapshot(product) for cart_item, product in rows]
+    await cache_service.set_cart(user_id, items, fill_version=version, fill=True)
+    await cache_service.set_product_snapshots(snapshots)
+    
+    return [{**item, "product": snapshot} for item, snapshot in zip(items, snapshots)]
+
+async def get_cart_state(user_id: str) -> List[dict]:
+    """Get cart items with product details, served from Redis when cached
+    
+    On a miss the cart is loaded with one JOIN and written back to Redis;
+    on a hit only product snapshots missing from Redis are read from MySQL.
+    """
+    items = await cache_service.get_cart(user_id)
+    
+    if items is None:
+        return await load_cart_state(user_id)
+    
+    product_ids = [item["product_id"] for item in items]
+    snapshots = await cache_service.get_product_snapshots(product_ids)
+    missing_ids = [product_id for product_id in product_ids if product_id not in snapshots]
+    
+    if missing_ids:
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(ProductDB).where(ProductDB.id.in_(missing_ids))
+            )
+            loaded = [product_snapshot(p) for p in result.scalars().all()]
+        snapshots.update({p["id"]: p for p in loaded})
+        await cache_service.set_product_snapshots(loaded)
+    
+    # Items whose product no longer exists are dropped, as before
+    return [
+        {**item, "product": snapshots[item["product_id"]]}
+        for item in items
+        if item["product_id"] in snapshots
+    ]
+
+def cart_total(cart_items: List[dict]) -> float:
+    """Sum of price x quantity over cart state items"""
+    return sum(item["product"]["price"] * item["quantity"] for item in cart_items)
+
 # ============ Cart Routes ============
 
 @api_router.get("/cart")
@@ -1196,46 +1609,23 @@ async def get_cart(authorization: str = Header(None)):
     user = await get_current_user(authorization)
     user_id = user['user_id']
     
-    log_db_operation("GET CART", "cart", f"User ID: {user_id}")
+    cart_with_products = await get_cart_state(user_id)
     
-    async with async_session_maker() as session:
-        result = await session.execute(select(CartItemDB).where(CartItemDB.user_id == user_id))
-        cart_items = result.scalars().all()
-        
-        print(f"📦 Found {len(cart_items)} items in cart")
-        
-        # Fetch product details for each cart item
-        cart_with_products = []
-        for item in cart_items:
-            product_result = await session.execute(select(ProductDB).where(ProductDB.id == item.product_id))
-            product = product_result.scalar_one_or_none()
-            
-            if product:
-                print(f"   ├─ {product.name} (Qty: {item.quantity})")
-            
-            if product:
-                cart_with_products.append({
-                    "id": item.id,
-                    "user_id": item.user_id,
-                    "product_id": item.product_id,
-                    "quantity": item.quantity,
-                    "added_at": item.added_at.isoformat() if item.added_at else None,
-                    "product": {
-                        "id": product.id,
-                        "name": product.name,
-                        "brand": product.brand,
-                        "price": product.price,
-                        "description": product.description,
-                        "category": product.category,
-                        "frame_type": product.frame_type,
-                        "frame_shape": product.frame_shape,
-                        "color": product.color,
-                        "image_url": product.image_url,
-                        "stock": product.stock
-                    }
-                })
-        
-        return cart_with_products
+    print(f"📦 Found {len(cart_with_products)} items in cart")
+    
+    return cart_with_products
+
+@api_router.get("/cart/count")
+async def get_cart_count(authorization: str = Header(None)):
+    """Total cart quantity for the header badge"""
+    user = await get_current_user(authorization)
+    
+    count = await cache_service.get_cart_count(user['user_id'])
+    if count is None:
+        cart_items = await get_cart_state(user['user_id'])
+        count = sum(item["quantity"] for item in cart_items)
+    
+    return {"count": count}
 
 @api_router.post("/cart")
 async def add_to_cart(cart_data: AddToCart, authorization: str = Header(None)):
@@ -1281,6 +1671,9 @@ async def add_to_cart(cart_data: AddToCart, authorization: str = Header(None)):
             existing.quantity = new_quantity
             await session.commit()
             
+            await cache_service.set_cart_item(user['user_id'], cart_item_state(existing))
+            await cache_service.set_product_snapshots([product_snapshot(product)])
+            
             return {"message": "Cart updated successfully"}
         
         # Check stock for new item
@@ -1304,6 +1697,9 @@ async def add_to_cart(cart_data: AddToCart, authorization: str = Header(None)):
         session.add(db_cart_item)
         await session.commit()
         
+        await cache_service.set_cart_item(user['user_id'], cart_item_state(db_cart_item))
+        await cache_service.set_product_snapshots([product_snapshot(product)])
+        
         return {"message": "Item added to cart"}
 
 @api_router.delete("/cart/{product_id}")
@@ -1323,6 +1719,8 @@ async def remove_from_cart(product_id: str, authorization: str = Header(None)):
             await session.delete(cart_item)
             await session.commit()
         
+        await cache_service.remove_cart_item(user['user_id'], product_id)
+        
         return {"message": "Item removed from cart"}
 
 @api_router.delete("/cart")
@@ -1335,6 +1733,8 @@ async def clear_cart(authorization: str = Header(None)):
         )
         await session.commit()
         
+        await cache_service.set_cart(user['user_id'], [])
+        
         return {"message": "Cart cleared"}
 
 @api_router.patch("/cart/{item_id}")
@@ -1376,6 +1776,9 @@ async def update_cart_quantity(item_id: str, quantity_data: UpdateCartQuantity,
         cart_item.quantity = quantity_data.quantity
         await session.commit()
         
+        await cache_service.set_cart_item(user['user_id'], cart_item_state(cart_item))
+        await cache_service.set_product_snapshots([product_snapshot(product)])
+        
         return {
             "message": "Cart quantity updated successfully",
             "quantity": cart_item.quantity
@@ -1383,154 +1786,127 @@ async def update_cart_quantity(item_id: str, quantity_data: UpdateCartQuantity,
 
 # ============ Order Routes ============
 
+# Every cart-to-order path (POST /orders, Stripe, Razorpay) runs through one pipeline;
+# after the commit it publishes the order's domain and inventory events
+order_finalizer = OrderFinalizer(
+    async_session_maker, Base.metadata, events=domain_events, inventory=inventory_events
+)
+
+async def _customer(user_id: str, customer: Optional[Dict] = None) -> Dict:
+    """Name, email and email preferences (from the event when the publisher had them)"""
+    if customer:
+        return customer
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(
+                UserDB.name, UserDB.email, UserDB.email_order_confirmation,
+                UserDB.email_payment_receipt, UserDB.email_shipping_notification
+            ).where(UserDB.id == user_id)
+        )
+        row = result.mappings().one_or_none()
+    return dict(row) if row else {}
+
+@domain_events.subscribe(OrderCreated)
+async def _refresh_order_caches(event: OrderCreated):
+    """Cached cart, stock-carrying product snapshots and order list are stale"""
+    if event.cart_cleared:
+        await cache_service.set_cart(event.user_id, [])
+    await cache_service.delete_product_snapshots([item['product_id'] for item in event.items])
+    await cache_service.invalidate_orders(event.user_id)
+
+@domain_events.subscribe(OrderStatusChanged)
+@domain_events.subscribe(PaymentCaptured)
+@domain_events.subscribe(PaymentReversed)
+@domain_events.subscribe(OrderDeleted)
+async def _invalidate_order_list(event):
+    await cache_service.invalidate_orders(event.user_id)
+
+@domain_events.subscribe(OrderCreated)
+async def _send_order_confirmation(event: OrderCreated):
+    customer = await _customer(event.user_id, event.customer)
+    if not customer.get('email') or not customer.get('email_order_confirmation'):
+        return
+    email_items = [
+        {
+            'name': item['name'],
+            'brand': item.get('brand') or 'LensKart',
+            'quantity': item['quantity'],
+            'price': item['price']
+        }
+        for item in event.items
+    ]
+    # The email client is blocking; keep it off the event loop
+    await asyncio.to_thread(
+        email_service.send_order_confirmation_email,
+        customer['name'], customer['email'], event.order_id, email_items,
+        event.total_amount, event.shipping_address
+    )
+
+@domain_events.subscribe(PaymentCaptured)
+async def _send_payment_receipt(event: PaymentCaptured):
+    # Admin status corrections don't email the customer
+    if event.gateway == "manual":
+        return
+    customer = await _customer(event.user_id, event.customer)
+    if not customer.get('email') or not customer.get('email_payment_receipt'):
+        return
+    await asyncio.to_thread(
+        email_service.send_payment_receipt_email,
+        customer['name'], customer['email'], event.order_id, event.amount, event.gateway.capitalize()
+    )
+
+@domain_events.subscribe(OrderStatusChanged)
+async def _send_shipping_notification(event: OrderStatusChanged):
+    if event.new_status != "shipped":
+        return
+    customer = await _customer(event.user_id)
+    if not customer.get('email') or not customer.get('email_shipping_notification'):
+        return
+    await asyncio.to_thread(
+        email_service.send_shipping_notification_email,
+        customer['name'], customer['email'], event.order_id, event.tracking_number,
+        event.estimated_delivery.strftime('%B %d, %Y') if event.estimated_delivery else None
+    )
+
 @api_router.post("/orders")
 async def create_order(order_data: CreateOrder, authorization: str = Header(None)):
     user = await get_current_user(authorization)
     
+    try:
+        # Pay-later order; the cart is kept, as before
+        order = await order_finalizer.run(OrderRequest(
+            user_id=user['user_id'],
+            shipping_address=order_data.shipping_address,
+            clear_cart=False
+        ))
+    except (EmptyCartError, InsufficientStockError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "message": "Order created successfully",
+        "order": {
+            "id": order.order_id,
+            "user_id": order.user_id,
+            "items": order.items,
+            "total_amount": order.total_amount,
+            "payment_status": order.payment_status,
+            "order_status": order.order_status,
+            "shipping_address": order.shipping_address,
+            "created_at": order.created_at.isoformat()
+        }
+    }
+
+@api_router.get("/orders")
+async def get_orders(authorization: str = Header(None)):
+    user = await get_current_user(authorization)
+    
     async with async_session_maker() as session:
-        # Get cart items
-        result = await session.execute(select(CartItemDB).where(CartItemDB.user_id == user['user_id']))
-        cart_items = result.scalars().all()
+        if user['role'] == 'admin':
+            result = await session.execute(select(OrderDB))
+        else:
+            result = await session.execute(select(OrderDB).where(OrderDB.user_id == user['user_id']))
         
-        if not cart_items:
-            raise HTTPException(status_code=400, detail="Cart is empty")
-        
-        # Calculate total and prepare items
-        total_amount = 0
-        items = []
-        for cart_item in cart_items:
-            product_result = await session.execute(select(ProductDB).where(ProductDB.id == cart_item.product_id))
-            product = product_result.scalar_one_or_none()
-            
-            if product:
-                # Check stock availability
-                if product.stock < cart_item.quantity:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"Insufficient stock for {product.name}. Only {product.stock} available"
-                    )
-                
-                items.append({
-                    "product_id": product.id,
-                    "name": product.name,
-                    "brand": product.brand,
-                    "price": product.price,
-                    "quantity": cart_item.quantity
-                })
-                total_amount += product.price * cart_item.quantity
-        
-        # Create order ID
-        order_id = str(uuid.uuid4())
-        
-        # Create order
-        db_order = OrderDB(
-            id=order_id,
-            user_id=user['user_id'],
-            total_amount=total_amount,
-            payment_status="pending",
-            order_status="processing",
-            shipping_address=order_data.shipping_address,
-            created_at=datetime.now(timezone.utc),
-            updated_at=datetime.now(timezone.utc)
-        )
-        
-        session.add(db_order)
-        
-        # Create order items
-        for item in items:
-            subtotal = item['price'] * item['quantity']
-            db_order_item = OrderItemDB(
-                id=str(uuid.uuid4()),
-                order_id=order_id,
-                product_id=item['product_id'],
-                product_name=item['name'],
-                product_brand=item['brand'],
-                product_price=item['price'],
-                quantity=item['quantity'],
-                subtotal=subtotal
-            )
-            session.add(db_order_item)
-        
-        # Create initial tracking entry
-        initial_tracking = OrderTracking(
-            order_id=order_id,
-            status="processing",
-            description="Order has been placed and is being processed",
-            location="Warehouse"
-        )
-        
-        db_tracking = OrderTrackingDB(
-            id=initial_tracking.id,
-            order_id=initial_tracking.order_id,
-            status=initial_tracking.status,
-            description=initial_tracking.description,
-            location=initial_tracking.location,
-            created_at=initial_tracking.created_at
-        )
-        
-        session.add(db_tracking)
-        
-        # Reduce stock for each product in the order
-        for cart_item in cart_items:
-            product_result = await session.execute(select(ProductDB).where(ProductDB.id == cart_item.product_id))
-            product = product_result.scalar_one_or_none()
-            if product:
-                product.stock -= cart_item.quantity
-        
-        await session.commit()
-        
-        # Get user details for email
-        user_result = await session.execute(select(UserDB).where(UserDB.id == user['user_id']))
-        user_db = user_result.scalar_one_or_none()
-        
-        # Send order confirmation email
-        if user_db and user_db.email_order_confirmation:
-            try:
-                # Prepare items for email with brand info
-                email_items = []
-                for item in items:
-                    email_items.append({
-                        'name': item['name'],
-                        'brand': 'LensKart',  # or get from product if available
-                        'quantity': item['quantity'],
-                        'price': item['price']
-                    })
-                email_service.send_order_confirmation_email(
-                    user_db.name,
-                    user_db.email,
-                    order_id,
-                    email_items,
-                    total_amount,
-                    order_data.shipping_address
-                )
-            except Exception as e:
-                logging.error(f"Failed to send order confirmation email: {str(e)}")
-        
-        return {
-            "message": "Order created successfully",
-            "order": {
-                "id": order_id,
-                "user_id": user['user_id'],
-                "items": items,
-                "total_amount": total_amount,
-                "payment_status": "pending",
-                "order_status": "processing",
-                "shipping_address": order_data.shipping_address,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
-        }
-
-@api_router.get("/orders")
-async def get_orders(authorization: str = Header(None)):
-    user = await get_current_user(authorization)
-    
-    async with async_session_maker() as session:
-        if user['role'] == 'admin':
-            result = await session.execute(select(OrderDB))
-        else:
-            result = await session.execute(select(OrderDB).where(OrderDB.user_id == user['user_id']))
-        
-        orders = result.scalars().all()
+        orders = result.scalars().all()
         
         # Get order items for all orders
         order_ids = [o.id for o in orders]
@@ -1563,8 +1939,8 @@ async def get_orders(authorization: str = Header(None)):
                 "payment_status": o.payment_status,
                 "order_status": o.order_status,
                 "shipping_address": o.shipping_address,
-                "tracking_number": None,
-                "estimated_delivery": None,
+                "tracking_number": o.tracking_number,
+                "estimated_delivery": o.estimated_delivery.isoformat() if o.estimated_delivery else None,
                 "created_at": o.created_at.isoformat() if o.created_at else None,
                 "updated_at": o.updated_at.isoformat() if o.updated_at else None
             }
@@ -1629,14 +2005,14 @@ async def get_order(order_id: str, authorization: str = Header(None)):
             "payment_status": order.payment_status,
             "order_status": order.order_status,
             "shipping_address": order.shipping_address,
-            "tracking_number": None,
-            "estimated_delivery": None,
+            "tracking_number": order.tracking_number,
+            "estimated_delivery": order.estimated_delivery.isoformat() if order.estimated_delivery else None,
             "created_at": order.created_at.isoformat() if order.created_at else None,
             "updated_at": order.updated_at.isoformat() if order.updated_at else None
         }
 
 @api_router.get("/orders/{order_id}/tracking")
-async def get_order_tracking(order_id: str, authorization: str = Header(None)):
+async def get_order_tracking(order_id: str, include_archived: bool = False, authorization: str = Header(None)):
     user = await get_current_user(authorization)
     
     async with async_session_maker() as session:
@@ -1656,26 +2032,33 @@ async def get_order_tracking(order_id: str, authorization: str = Header(None)):
             .where(OrderTrackingDB.order_id == order_id)
             .order_by(OrderTrackingDB.created_at.asc())
         )
-        tracking_history = tracking_result.scalars().all()
-        
-        return {
-            "order_id": order.id,
-            "current_status": order.order_status,
-            "tracking_number": order.tracking_number,
-            "estimated_delivery": order.estimated_delivery.isoformat() if order.estimated_delivery else None,
-            "created_at": order.created_at.isoformat() if order.created_at else None,
-            "updated_at": order.updated_at.isoformat() if order.updated_at else None,
-            "tracking_history": [
-                {
-                    "id": t.id,
-                    "status": t.status,
-                    "description": t.description,
-                    "location": t.location,
-                    "created_at": t.created_at.isoformat() if t.created_at else None
-                }
-                for t in tracking_history
-            ]
-        }
+        tracking_history = [
+            {
+                "id": t.id,
+                "status": t.status,
+                "description": t.description,
+                "location": t.location,
+                "created_at": t.created_at.isoformat() if t.created_at else None
+            }
+            for t in tracking_result.scalars().all()
+        ]
+    
+    if include_archived:
+        # Older entries moved out by the retention job (skipping any archived
+        # after the read above)
+        live_ids = {t["id"] for t in tracking_history}
+        archived = await maintenance.get_archived_tracking(order_id)
+        tracking_history = [t for t in archived if t["id"] not in live_ids] + tracking_history
+    
+    return {
+        "order_id": order.id,
+        "current_status": order.order_status,
+        "tracking_number": order.tracking_number,
+        "estimated_delivery": order.estimated_delivery.isoformat() if order.estimated_delivery else None,
+        "created_at": order.created_at.isoformat() if order.created_at else None,
+        "updated_at": order.updated_at.isoformat() if order.updated_at else None,
+        "tracking_history": tracking_history
+    }
 
 @api_router.put("/orders/{order_id}/status")
 async def update_order_status(order_id: str, status_data: UpdateOrderStatus, authorization: str = Header(None)):
@@ -1694,6 +2077,7 @@ async def update_order_status(order_id: str, status_data: UpdateOrderStatus, aut
             raise HTTPException(status_code=404, detail="Order not found")
         
         # Update order status and tracking info
+        old_status = order.order_status
         order.order_status = status_data.order_status
         if status_data.tracking_number:
             order.tracking_number = status_data.tracking_number
@@ -1721,6 +2105,16 @@ async def update_order_status(order_id: str, status_data: UpdateOrderStatus, aut
         session.add(db_tracking)
         await session.commit()
         
+        if old_status != order.order_status:
+            domain_events.publish(OrderStatusChanged(
+                order_id=order.id,
+                user_id=order.user_id,
+                old_status=old_status,
+                new_status=order.order_status,
+                tracking_number=order.tracking_number,
+                estimated_delivery=order.estimated_delivery
+            ))
+        
         return {
             "message": "Order status updated successfully",
             "order": {
@@ -1767,6 +2161,22 @@ async def update_order_payment_status(
         
         await session.commit()
         
+        if payment_status == "paid" and old_status != "paid":
+            domain_events.publish(PaymentCaptured(
+                order_id=order.id,
+                user_id=order.user_id,
+                amount=order.total_amount,
+                gateway="manual"
+            ))
+        elif old_status == "paid" and payment_status != "paid":
+            # Undo the capture in the sales rollup
+            domain_events.publish(PaymentReversed(
+                order_id=order.id,
+                user_id=order.user_id,
+                amount=order.total_amount,
+                new_status=payment_status
+            ))
+        
         return {
             "message": "Payment status updated successfully",
             "order": {
@@ -1797,17 +2207,118 @@ async def delete_order(order_id: str, authorization: str = Header(None)):
         await session.delete(order)
         await session.commit()
         
+        # Take the order back out of the sales rollup
+        domain_events.publish(OrderDeleted(
+            order_id=order.id,
+            user_id=order.user_id,
+            total_amount=order.total_amount,
+            payment_status=order.payment_status,
+            order_status=order.order_status,
+            created_at=order.created_at
+        ))
+        
         return {"message": "Order deleted successfully", "order_id": order_id}
 
+# ============ Rating Summaries ============
+
+def rating_summary_dict(summary: Optional[ProductRatingSummaryDB]) -> dict:
+    """Serialize a rating summary row (None means no reviews yet)"""
+    if summary is None or not summary.rating_count:
+        return {
+            "count": 0,
+            "average": None,
+            "histogram": {str(star): 0 for star in range(1, 6)}
+        }
+    
+    return {
+        "count": summary.rating_count,
+        "average": round(summary.rating_sum / summary.rating_count, 2),
+        "histogram": {
+            str(star): getattr(summary, f"rating_{star}") for star in range(1, 6)
+        }
+    }
+
+async def apply_rating_change(
+    session: AsyncSession,
+    product_id: str,
+    added: Optional[int] = None,
+    removed: Optional[int] = None
+):
+    """Adjust a product's rating summary for one review write
+    
+    Runs inside the caller's transaction so the summary commits (or rolls
+    back) together with the review. Counters never drop below zero, which
+    keeps summaries sane if they were created after some reviews existed.
+    """
+    deltas = {"rating_count": 0, "rating_sum": 0}
+    for star in range(1, 6):
+        deltas[f"rating_{star}"] = 0
+    
+    if added is not None:
+        deltas["rating_count"] += 1
+        deltas["rating_sum"] += added
+        deltas[f"rating_{added}"] += 1
+    if removed is not None:
+        deltas["rating_count"] -= 1
+        deltas["rating_sum"] -= removed
+        deltas[f"rating_{removed}"] -= 1
+    
+    stmt = mysql_insert(ProductRatingSummaryDB).values(
+        product_id=product_id,
+        updated_at=datetime.now(timezone.utc),
+        **{column: max(delta, 0) for column, delta in deltas.items()}
+    )
+    stmt = stmt.on_duplicate_key_update(
+        updated_at=stmt.inserted.updated_at,
+        **{
+            column: func.greatest(getattr(ProductRatingSummaryDB, column) + delta, 0)
+            for column, delta in deltas.items()
+            if delta
+        }
+    )
+    await session.execute(stmt)
+
+async def get_rating_summaries(product_ids: List[str]) -> Dict[str, dict]:
+    """Get rating summaries for many products
+    
+    One cache MGET, then a single primary-key IN query for the misses.
+    Products without reviews get an empty summary.
+    """
+    product_ids = list(dict.fromkeys(product_ids))
+    if not product_ids:
+        return {}
+    
+    summaries = await cache_service.get_rating_summaries(product_ids)
+    missing = [pid for pid in product_ids if pid not in summaries]
+    
+    if missing:
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(ProductRatingSummaryDB).where(ProductRatingSummaryDB.product_id.in_(missing))
+            )
+            rows = {summary.product_id: summary for summary in result.scalars().all()}
+        
+        loaded = {pid: rating_summary_dict(rows.get(pid)) for pid in missing}
+        await cache_service.set_rating_summaries(loaded)
+        summaries.update(loaded)
+    
+    return summaries
+
 # ============ Review Routes ============
 
 @api_router.get("/products/{product_id}/reviews")
-async def get_product_reviews(product_id: str):
+async def get_product_reviews(product_id: str, limit: int = 20, offset: int = 0):
+    """List reviews for a product, newest first (counts come from the product's rating summary)"""
+    limit = max(1, min(limit, 100))
+    offset = max(0, offset)
+    
     async with async_session_maker() as session:
         result = await session.execute(
             select(ReviewDB)
             .where(ReviewDB.product_id == product_id)
             .order_by(ReviewDB.created_at.desc())
+            .limit(limit)
+            .offset(offset)
         )
         reviews = result.scalars().all()
         
@@ -1825,6 +2336,36 @@ async def get_product_reviews(product_id: str):
             for r in reviews
         ]
 
+@api_router.get("/products/{product_id}/reviews/mine")
+async def get_my_review(product_id: str, authorization: str = Header(None)):
+    """The current user's review of a product, if any (one indexed lookup)"""
+    user = await get_current_user(authorization)
+    
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(ReviewDB).where(
+                (ReviewDB.product_id == product_id) & 
+                (ReviewDB.user_id == user['user_id'])
+            )
+        )
+        r = result.scalar_one_or_none()
+    
+    if not r:
+        return {"review": None}
+    
+    return {
+        "review": {
+            "id": r.id,
+            "product_id": r.product_id,
+            "user_id": r.user_id,
+            "user_name": r.user_name,
+            "rating": r.rating,
+            "comment": r.comment,
+            "created_at": r.created_at.isoformat() if r.created_at else None,
+            "updated_at": r.updated_at.isoformat() if r.updated_at else None
+        }
+    }
+
 @api_router.post("/products/{product_id}/reviews")
 async def create_review(product_id: str, review_data: CreateReview, authorization: str = Header(None)):
     user = await get_current_user(authorization)
@@ -1872,8 +2413,11 @@ async def create_review(product_id: str, review_data: CreateReview, authorizatio
         )
         
         session.add(db_review)
+        await apply_rating_change(session, product_id, added=review.rating)
         await session.commit()
         
+        await cache_service.invalidate_product_rating(product_id)
+        
         return {
             "message": "Review created successfully",
             "review": {
@@ -1897,19 +2441,26 @@ async def update_review(review_id: str, review_data: UpdateReview, authorization
             select(ReviewDB).where(
                 (ReviewDB.id == review_id) & 
                 (ReviewDB.user_id == user['user_id'])
-            )
+            ).with_for_update()
         )
         review = result.scalar_one_or_none()
         
         if not review:
             raise HTTPException(status_code=404, detail="Review not found or you don't have permission")
         
+        if review.rating != review_data.rating:
+            await apply_rating_change(
+                session, review.product_id, added=review_data.rating, removed=review.rating
+            )
+        
         review.rating = review_data.rating
         review.comment = review_data.comment
         review.updated_at = datetime.now(timezone.utc)
         
         await session.commit()
         
+        await cache_service.invalidate_product_rating(review.product_id)
+        
         return {
             "message": "Review updated successfully",
             "review": {
@@ -1929,7 +2480,7 @@ async def delete_review(review_id: str, authorization: str = Header(None)):
             select(ReviewDB).where(
                 (ReviewDB.id == review_id) & 
                 (ReviewDB.user_id == user['user_id'])
-            )
+            ).with_for_update()
         )
         review = result.scalar_one_or_none()
         
@@ -1937,8 +2488,11 @@ async def delete_review(review_id: str, authorization: str = Header(None)):
             raise HTTPException(status_code=404, detail="Review not found or you don't have permission")
         
         await session.execute(delete(ReviewDB).where(ReviewDB.id == review_id))
+        await apply_rating_change(session, review.product_id, removed=review.rating)
         await session.commit()
         
+        await cache_service.invalidate_product_rating(review.product_id)
+        
         return {"message": "Review deleted successfully"}
 
 @api_router.delete("/admin/reviews/{review_id}")
@@ -1951,7 +2505,7 @@ async def admin_delete_review(review_id: str, authorization: str = Header(None))
     
     async with async_session_maker() as session:
         result = await session.execute(
-            select(ReviewDB).where(ReviewDB.id == review_id)
+            select(ReviewDB).where(ReviewDB.id == review_id).with_for_update()
         )
         review = result.scalar_one_or_none()
         
@@ -1959,8 +2513,11 @@ async def admin_delete_review(review_id: str, authorization: str = Header(None))
             raise HTTPException(status_code=404, detail="Review not found")
         
         await session.delete(review)
+        await apply_rating_change(session, review.product_id, removed=review.rating)
         await session.commit()
         
+        await cache_service.invalidate_product_rating(review.product_id)
+        
         return {
             "message": "Review deleted successfully by admin",
             "review_id": review_id
@@ -2227,28 +2784,51 @@ async def delete_product_image(product_id: str, image_id: str, authorization: st
 
 # ============ Payment Routes ============
 
+def get_gateway(name: str):
+    """Shared gateway from the registry (503 when it isn't configured)"""
+    try:
+        return payment_gateways.get(name)
+    except GatewayUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+PAYMENT_LOCK_TTL = int(os.environ.get('PAYMENT_LOCK_TTL_SECONDS', '15'))
+
+@asynccontextmanager
+async def user_payment_lock(user_id: str):
+    """One payment session creation per user at a time (other users never wait)
+    
+    409 if the user already has one in progress, 503 if the lock can't be
+    taken or was lost before the payment was recorded.
+    """
+    lock = payment_security.payment_lock(user_id, ttl_seconds=PAYMENT_LOCK_TTL)
+    try:
+        await lock.acquire()
+    except PaymentLockBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except PaymentLockError:
+        raise HTTPException(status_code=503, detail="Payments are temporarily unavailable, please retry")
+    
+    try:
+        yield lock
+    except PaymentLockError:
+        raise HTTPException(status_code=503, detail="Payment could not be confirmed, please retry")
+    finally:
+        await lock.release()
+
 @api_router.post("/payment/checkout")
 @limiter.limit(RateLimit['checkout'])
 async def create_checkout(request: Request, response: Response, authorization: str = Header(None)):
     user = await get_current_user(authorization)
     
-    async with async_session_maker() as session:
-        # Get cart items
-        result = await session.execute(select(CartItemDB).where(CartItemDB.user_id == user['user_id']))
-        cart_items = result.scalars().all()
-        
-        if not cart_items:
-            raise HTTPException(status_code=400, detail="Cart is empty")
-        
-        # Calculate total
-        total_amount = 0.0
-        for cart_item in cart_items:
-            product_result = await session.execute(select(ProductDB).where(ProductDB.id == cart_item.product_id))
-            product = product_result.scalar_one_or_none()
-            
-            if product:
-                total_amount += product.price * cart_item.quantity
-        
+    # The amount charged is priced from MySQL, never from cached snapshots
+    cart_items = await load_cart_state(user['user_id'])
+    
+    if not cart_items:
+        raise HTTPException(status_code=400, detail="Cart is empty")
+    
+    total_amount = cart_total(cart_items)
+    
+    async with user_payment_lock(user['user_id']) as lock, async_session_maker() as session:
         # Get origin from request
         body = await request.json()
         origin_url = body.get('origin_url', '')
@@ -2260,10 +2840,8 @@ async def create_checkout(request: Request, response: Response, authorization: s
         discount_amount = body.get('discount_amount', 0)
         final_amount = max(total_amount - discount_amount, 0)
         
-        # Initialize Stripe
         host_url = origin_url
-        webhook_url = f"{str(request.base_url).rstrip('/')}/api/webhook/stripe"
-        stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
+        gateway = get_gateway("stripe")
         
         # Create checkout session
         success_url = f"{host_url}/payment-success?session_id={{{{CHECKOUT_SESSION_ID}}}}"
@@ -2275,7 +2853,7 @@ async def create_checkout(request: Request, response: Response, authorization: s
             metadata['coupon_code'] = coupon_code
             metadata['discount_amount'] = str(discount_amount)
         
-        checkout_request = CheckoutSessionRequest(
+        session_response = await gateway.create_checkout_session(
             amount=final_amount,
             currency="inr",
             success_url=success_url,
@@ -2283,7 +2861,8 @@ async def create_checkout(request: Request, response: Response, authorization: s
             metadata=metadata
         )
         
-        session_response = await stripe_checkout.create_checkout_session(checkout_request)
+        # Only record the session if no other request took over the lock meanwhile
+        await lock.ensure_held()
         
         # Create payment transaction with final amount (after discount)
         payment = PaymentTransaction(
@@ -2305,7 +2884,7 @@ async def create_checkout(request: Request, response: Response, authorization: s
             currency=payment.currency,
             payment_status=payment.payment_status,
             status=payment.status,
-            payment_metadata=json.dumps(payment.metadata) if payment.metadata else None,
+            payment_metadata=payment.metadata or None,
             created_at=payment.created_at,
             updated_at=payment.updated_at
         )
@@ -2315,316 +2894,242 @@ async def create_checkout(request: Request, response: Response, authorization: s
         
         return {"url": session_response.url, "session_id": session_response.session_id}
 
-@api_router.get("/payment/status/{session_id}")
-async def get_payment_status(session_id: str, authorization: str = Header(None)):
-    user = await get_current_user(authorization)
-    
-    # Initialize Stripe
-    webhook_url = f"{os.environ.get('REACT_APP_BACKEND_URL', 'http://localhost:8001')}/api/webhook/stripe"
-    stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
-    
-    # Get fresh checkout status from Stripe
-    checkout_status = await stripe_checkout.get_checkout_status(session_id)
-    
+PAYMENT_STATUS_MAX_WAIT = int(os.environ.get('PAYMENT_STATUS_MAX_WAIT_SECONDS', '25'))
+
+async def _payment_status_response(session_id: str, user_id: str) -> Optional[Dict]:
+    """Local payment state (and order, once created) for the success page"""
     async with async_session_maker() as session:
-        # Get existing payment
         result = await session.execute(
-            select(PaymentTransactionDB).where(PaymentTransactionDB.session_id == session_id)
+            select(PaymentTransactionDB).where(
+                PaymentTransactionDB.session_id == session_id,
+                PaymentTransactionDB.user_id == user_id
+            )
         )
-        existing_payment = result.scalar_one_or_none()
+        payment = result.scalar_one_or_none()
+        if not payment:
+            return None
         
-        if existing_payment:
-            # Update payment transaction with fresh data from Stripe
-            existing_payment.status = checkout_status.status
-            existing_payment.payment_status = checkout_status.payment_status
-            existing_payment.updated_at = datetime.now(timezone.utc)
-            
-            # If payment successful and order not yet created
-            if checkout_status.payment_status == "paid" and existing_payment.order_id is None:
-                # Create order from cart
-                cart_result = await session.execute(
-                    select(CartItemDB).where(CartItemDB.user_id == user['user_id'])
-                )
-                cart_items = cart_result.scalars().all()
-                
-                items = []
-                total_amount = 0.0
-                for cart_item in cart_items:
-                    product_result = await session.execute(
-                        select(ProductDB).where(ProductDB.id == cart_item.product_id)
-                    )
-                    product = product_result.scalar_one_or_none()
-                    
-                    if product:
-                        items.append({
-                            "product_id": product.id,
-                            "name": product.name,
-                            "brand": product.brand,
-                            "price": product.price,
-                            "quantity": cart_item.quantity
-                        })
-                        total_amount += product.price * cart_item.quantity
-                
-                # Get user info for address
-                user_result = await session.execute(select(UserDB).where(UserDB.id == user['user_id']))
-                user_info = user_result.scalar_one_or_none()
-                
-                # Create order ID
-                order_id = str(uuid.uuid4())
-                
-                db_order = OrderDB(
-                    id=order_id,
-                    user_id=user['user_id'],
-                    total_amount=total_amount,
-                    payment_status="paid",
-                    order_status="confirmed",
-                    shipping_address=user_info.address if user_info and user_info.address else 'No address provided',
-                    created_at=datetime.now(timezone.utc),
-                    updated_at=datetime.now(timezone.utc)
-                )
-                
-                session.add(db_order)
-                
-                # Create order items
-                for item in items:
-                    subtotal = item['price'] * item['quantity']
-                    db_order_item = OrderItemDB(
-                        id=str(uuid.uuid4()),
-                        order_id=order_id,
-                        product_id=item['product_id'],
-                        product_name=item['name'],
-                        product_brand=item['brand'],
-                        product_price=item['price'],
-                        quantity=item['quantity'],
-                        subtotal=subtotal
-                    )
-                    session.add(db_order_item)
-                
-                # Update payment with order_id
-                existing_payment.order_id = order_id
-                
-                # Clear cart
-                await session.execute(
-                    delete(CartItemDB).where(CartItemDB.user_id == user['user_id'])
-                )
-                
-                # Send payment receipt and order confirmation emails
-                if user_info:
-                    try:
-                        # Send payment receipt email
-                        if user_info.email_payment_receipt:
-                            email_service.send_payment_receipt_email(
-                                user_info.name,
-                                user_info.email,
-                                order_id,
-                                total_amount,
-                                "Stripe"
-                            )
-                        
-                        # Send order confirmation email
-                        if user_info.email_order_confirmation:
-                            email_items = []
-                            for item in items:
-                                email_items.append({
-                                    'name': item['name'],
-                                    'brand': item.get('brand', 'LensKart'),
-                                    'quantity': item['quantity'],
-                                    'price': item['price']
-                                })
-                            email_service.send_order_confirmation_email(
-                                user_info.name,
-                                user_info.email,
-                                order_id,
-                                email_items,
-                                total_amount,
-                                user_info.address if user_info.address else 'No address provided'
-                            )
-                    except Exception as e:
-                        logging.error(f"Failed to send payment/order emails: {str(e)}")
-            
-            await session.commit()
+        response = {
+            "status": payment.status,
+            "payment_status": payment.payment_status,
+            "amount_total": int(round(payment.amount * 100)),
+            "currency": payment.currency
+        }
+        
+        if payment.order_id:
+            order_result = await session.execute(
+                select(OrderDB).where(OrderDB.id == payment.order_id)
+            )
+            order = order_result.scalar_one_or_none()
             
-            # Return order details if order was created
-            if existing_payment.order_id:
-                order_result = await session.execute(
-                    select(OrderDB).where(OrderDB.id == existing_payment.order_id)
+            if order:
+                # Get order items for analytics
+                items_result = await session.execute(
+                    select(OrderItemDB).where(OrderItemDB.order_id == order.id)
                 )
-                order = order_result.scalar_one_or_none()
+                order_items = items_result.scalars().all()
                 
-                if order:
-                    # Get order items for analytics
-                    items_result = await session.execute(
-                        select(OrderItemDB).where(OrderItemDB.order_id == order.id)
-                    )
-                    order_items = items_result.scalars().all()
-                    
-                    return {
-                        "status": checkout_status.status,
-                        "payment_status": checkout_status.payment_status,
-                        "amount_total": checkout_status.amount_total,
-                        "currency": checkout_status.currency,
-                        "order": {
-                            "id": order.id,
-                            "total_amount": float(order.total_amount),
-                            "payment_method": "stripe",
-                            "items": [
-                                {
-                                    "name": item.product_name,
-                                    "brand": item.product_brand,
-                                    "price": float(item.product_price),
-                                    "quantity": item.quantity
-                                }
-                                for item in order_items
-                            ]
+                response["order"] = {
+                    "id": order.id,
+                    "total_amount": float(order.total_amount),
+                    "payment_method": payment.gateway,
+                    "items": [
+                        {
+                            "name": item.product_name,
+                            "brand": item.product_brand,
+                            "price": float(item.product_price),
+                            "quantity": item.quantity
                         }
-                    }
+                        for item in order_items
+                    ]
+                }
+        return response
+
+@api_router.get("/payment/status/{session_id}")
+async def get_payment_status(session_id: str, wait: int = 0, authorization: str = Header(None)):
+    """Payment state from the database
     
-    return {
-        "status": checkout_status.status,
-        "payment_status": checkout_status.payment_status,
-        "amount_total": checkout_status.amount_total,
-        "currency": checkout_status.currency
-    }
+    The gateway is polled by the background reconciler, not per request.
+    With ?wait=N the request is held (up to PAYMENT_STATUS_MAX_WAIT seconds)
+    until the payment settles.
+    """
+    user = await get_current_user(authorization)
+    wait = max(0, min(wait, PAYMENT_STATUS_MAX_WAIT))
+    
+    # Registered before the read, so a change committed right after it still wakes us
+    async with payment_reconciler.waiter(session_id) as changed:
+        response = await _payment_status_response(session_id, user['user_id'])
+        if response is None:
+            raise HTTPException(status_code=404, detail="Payment not found")
+        
+        settled = response["payment_status"] not in UNSETTLED_STATUSES or response["status"] == "expired"
+        if wait and not settled:
+            await payment_reconciler.watch(session_id, wait)
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+            # Re-read either way: a missed or cross-worker wakeup costs one query, not a stale answer
+            response = await _payment_status_response(session_id, user['user_id']) or response
+    
+    return response
 
 @api_router.post("/webhook/stripe")
 async def stripe_webhook(request: Request):
+    """Verify and queue a Stripe webhook; processed by webhook_queue workers"""
     body = await request.body()
     signature = request.headers.get("Stripe-Signature", "")
     
-    webhook_url = f"{os.environ.get('REACT_APP_BACKEND_URL', 'http://localhost:8001')}/api/webhook/stripe"
-    stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
-    
+    gateway = get_gateway("stripe")
     try:
-        webhook_response = await stripe_checkout.handle_webhook(body, signature)
-        
-        async with async_session_maker() as session:
-            # Update payment transaction
-            result = await session.execute(
-                select(PaymentTransactionDB).where(PaymentTransactionDB.session_id == webhook_response.session_id)
-            )
-            payment = result.scalar_one_or_none()
-            
-            if payment:
-                # Update payment status
-                payment.payment_status = webhook_response.payment_status
-                payment.status = webhook_response.event_type
-                payment.updated_at = datetime.now(timezone.utc)
-                
-                # Create order if payment successful and order doesn't exist
-                # This is a backup mechanism in case user doesn't return to success page
-                if webhook_response.payment_status == "paid" and payment.order_id is None:
-                    try:
-                        # Get cart items for this user
-                        cart_result = await session.execute(
-                            select(CartItemDB).where(CartItemDB.user_id == payment.user_id)
-                        )
-                        cart_items = cart_result.scalars().all()
-                        
-                        if cart_items:
-                            items = []
-                            total_amount = 0.0
-                            for cart_item in cart_items:
-                                product_result = await session.execute(
-                                    select(ProductDB).where(ProductDB.id == cart_item.product_id)
-                                )
-                                product = product_result.scalar_one_or_none()
-                                
-                                if product:
-                                    items.append({
-                                        "product_id": product.id,
-                                        "name": product.name,
-                                        "brand": product.brand,
-                                        "price": product.price,
-                                        "quantity": cart_item.quantity
-                                    })
-                                    total_amount += product.price * cart_item.quantity
-                            
-                            # Get user info for address
-                            user_result = await session.execute(select(UserDB).where(UserDB.id == payment.user_id))
-                            user_info = user_result.scalar_one_or_none()
-                            
-                            # Create order
-                            order_id = str(uuid.uuid4())
-                            
-                            db_order = OrderDB(
-                                id=order_id,
-                                user_id=payment.user_id,
-                                total_amount=total_amount,
-                                payment_status="paid",
-                                order_status="confirmed",
-                                shipping_address=user_info.address if user_info and user_info.address else 'No address provided',
-                                created_at=datetime.now(timezone.utc),
-                                updated_at=datetime.now(timezone.utc)
-                            )
-                            
-                            session.add(db_order)
-                            
-                            # Create order items
-                            for item in items:
-                                subtotal = item['price'] * item['quantity']
-                                db_order_item = OrderItemDB(
-                                    id=str(uuid.uuid4()),
-                                    order_id=order_id,
-                                    product_id=item['product_id'],
-                                    product_name=item['name'],
-                                    product_brand=item['brand'],
-                                    product_price=item['price'],
-                                    quantity=item['quantity'],
-                                    subtotal=subtotal
-                                )
-                                session.add(db_order_item)
-                            
-                            # Update payment with order_id
-                            payment.order_id = order_id
-                            
-                            # Clear cart
-                            await session.execute(
-                                delete(CartItemDB).where(CartItemDB.user_id == payment.user_id)
-                            )
-                            
-                            logging.info(f"Order {order_id} created via webhook for payment {payment.session_id}")
-                    except Exception as order_error:
-                        logging.error(f"Failed to create order in webhook: {str(order_error)}")
-                
-                await session.commit()
-        
-        return {"status": "success"}
+        webhook_response = await gateway.verify_webhook(body, signature)
     except Exception as e:
         logging.error(f"Webhook error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
+    
+    await webhook_queue.enqueue(
+        "stripe",
+        body,
+        session_id=webhook_response.session_id,
+        event_type=webhook_response.event_type,
+        payment_status=webhook_response.payment_status,
+        event_id=webhook_response.event_id
+    )
+    return {"status": "success"}
+
+async def _lock_payment(session, session_id: str):
+    """Payment transaction row, locked until the webhook's transaction commits"""
+    result = await session.execute(
+        select(PaymentTransactionDB)
+        .where(PaymentTransactionDB.session_id == session_id)
+        .with_for_update()
+    )
+    return result.scalar_one_or_none()
+
+async def create_order_for_payment(session, payment, payment_method: str):
+    """Create the order for a paid payment transaction, exactly once
+    
+    The caller holds the payment row lock (_lock_payment) and commits. Runs
+    for whichever of the webhook worker, the reconciler and Razorpay
+    verification sees the payment settle first; the others get the existing
+    order back from the pipeline.
+    
+    Returns:
+        Callback for after the commit (order side effects), or None
+    """
+    order = await order_finalizer.finalize(session, OrderRequest(
+        user_id=payment.user_id,
+        payment_status="paid",
+        order_status="confirmed",
+        payment_session_id=payment.session_id,
+        payment_method=payment_method,
+        check_stock=False
+    ))
+    if order is None or not order.created:
+        return None
+    
+    # Keep the ORM row in step with the pipeline's update so a flush can't undo it
+    payment.order_id = order.order_id
+    
+    async def after_commit():
+        order_finalizer.dispatch(order)
+    
+    return after_commit
+
+async def apply_payment_status(session_id: str, gateway_name: str, status):
+    """Reconciler callback: store a changed gateway status, creating the order once paid"""
+    async with async_session_maker() as session:
+        payment = await _lock_payment(session, session_id)
+        if not payment or (payment.payment_status == "paid" and status.payment_status != "paid"):
+            return
+        
+        payment.status = status.status
+        payment.payment_status = status.payment_status
+        payment.updated_at = datetime.now(timezone.utc)
+        
+        after_commit = None
+        if status.payment_status == "paid":
+            after_commit = await create_order_for_payment(session, payment, gateway_name)
+        await session.commit()
+    
+    if after_commit:
+        await after_commit()
+
+payment_reconciler.set_status_handler(apply_payment_status)
+
+def _settled(session_id: str, after_commit=None):
+    """Post-commit step for a payment update: side effects, then wake waiting clients"""
+    async def run():
+        if after_commit:
+            await after_commit()
+        await payment_reconciler.notify(session_id)
+    return run
+
+async def handle_stripe_webhook(session, event):
+    """Apply a queued Stripe event (runs in the webhook worker's transaction)"""
+    payment = await _lock_payment(session, event.session_id)
+    if not payment:
+        logging.warning(f"Stripe webhook {event.event_id} for unknown session {event.session_id}")
+        return None
+    
+    # A late or replayed event never moves a paid transaction back
+    if payment.payment_status == "paid" and event.payment_status != "paid":
+        return None
+    
+    payment.payment_status = event.payment_status
+    payment.status = event.event_type
+    payment.updated_at = datetime.now(timezone.utc)
+    
+    # Create order if payment successful and order doesn't exist
+    # This is a backup mechanism in case user doesn't return to success page
+    after_commit = None
+    if event.payment_status == "paid":
+        after_commit = await create_order_for_payment(session, payment, "stripe")
+    return _settled(event.session_id, after_commit)
+
+async def handle_razorpay_webhook(session, event):
+    """Apply a queued Razorpay event (runs in the webhook worker's transaction)"""
+    payment = await _lock_payment(session, event.session_id)
+    if not payment:
+        logging.warning(f"Razorpay webhook {event.event_id} for unknown order {event.session_id}")
+        return None
+    
+    if payment.payment_status == "paid" and event.payment_status != "paid":
+        return None
+    
+    payment.payment_status = event.payment_status
+    payment.updated_at = datetime.now(timezone.utc)
+    
+    # Backup for clients that never call /payment/razorpay/verify
+    after_commit = None
+    if event.payment_status == "paid":
+        after_commit = await create_order_for_payment(session, payment, "razorpay")
+    return _settled(event.session_id, after_commit)
+
+webhook_queue.register("stripe", handle_stripe_webhook)
+webhook_queue.register("razorpay", handle_razorpay_webhook)
 
 # ============ Unified Payment Gateway Endpoints ============
 
 @api_router.get("/payment/gateways")
 async def get_available_gateways():
     """Get list of available payment gateways"""
-    return PaymentGatewayFactory.get_available_gateways()
+    return payment_gateways.available_gateways()
 
 @api_router.post("/payment/razorpay/create-order")
 async def create_razorpay_order(request: Request, authorization: str = Header(None)):
     """Create Razorpay order"""
     user = await get_current_user(authorization)
     
-    async with async_session_maker() as session:
-        # Get cart items
-        result = await session.execute(
-            select(CartItemDB).where(CartItemDB.user_id == user['user_id'])
-        )
-        cart_items = result.scalars().all()
-        
-        if not cart_items:
-            raise HTTPException(status_code=400, detail="Cart is empty")
-        
-        # Calculate total amount
-        total_amount = 0.0
-        for cart_item in cart_items:
-            product_result = await session.execute(
-                select(ProductDB).where(ProductDB.id == cart_item.product_id)
-            )
-            product = product_result.scalar_one_or_none()
-            if product:
-                total_amount += product.price * cart_item.quantity
-        
+    # The amount charged is priced from MySQL, never from cached snapshots
+    cart_items = await load_cart_state(user['user_id'])
+    
+    if not cart_items:
+        raise HTTPException(status_code=400, detail="Cart is empty")
+    
+    total_amount = cart_total(cart_items)
+    
+    async with user_payment_lock(user['user_id']) as lock, async_session_maker() as session:
         # Get origin URL for callbacks
         body = await request.json()
         origin_url = body.get('origin_url', '')
@@ -2632,8 +3137,7 @@ async def create_razorpay_order(request: Request, authorization: str = Header(No
         if not origin_url:
             raise HTTPException(status_code=400, detail="Origin URL is required")
         
-        # Create payment gateway
-        gateway = PaymentGatewayFactory.create_gateway("razorpay")
+        gateway = get_gateway("razorpay")
         
         # Create checkout session
         success_url = f"{origin_url}/payment-success?session_id={{{{SESSION_ID}}}}&gateway=razorpay"
@@ -2647,6 +3151,8 @@ async def create_razorpay_order(request: Request, authorization: str = Header(No
             metadata={"user_id": user['user_id']}
         )
         
+        await lock.ensure_held()
+        
         # Create payment transaction
         payment = PaymentTransaction(
             session_id=checkout_response.session_id,
@@ -2667,7 +3173,7 @@ async def create_razorpay_order(request: Request, authorization: str = Header(No
             currency=payment.currency,
             payment_status=payment.payment_status,
             status=payment.status,
-            payment_metadata=json.dumps(payment.metadata) if payment.metadata else None,
+            payment_metadata=payment.metadata or None,
             created_at=payment.created_at,
             updated_at=payment.updated_at
         )
@@ -2700,10 +3206,7 @@ async def verify_razorpay_payment(
         raise HTTPException(status_code=400, detail="Missing payment verification data")
     
     # Verify signature
-    gateway = PaymentGatewayFactory.create_gateway("razorpay")
-    if not isinstance(gateway, RazorpayGateway):
-        raise HTTPException(status_code=500, detail="Invalid gateway type")
-    
+    gateway = get_gateway("razorpay")
     is_valid = gateway.verify_payment_signature(
         razorpay_order_id,
         razorpay_payment_id,
@@ -2714,161 +3217,148 @@ async def verify_razorpay_payment(
         raise HTTPException(status_code=400, detail="Payment verification failed")
     
     async with async_session_maker() as session:
-        # Get cart items
-        result = await session.execute(
-            select(CartItemDB).where(CartItemDB.user_id == user['user_id'])
-        )
-        cart_items = result.scalars().all()
-        
-        if not cart_items:
-            raise HTTPException(status_code=400, detail="Cart is empty")
+        payment = await _lock_payment(session, razorpay_order_id)
+        if not payment or payment.user_id != user['user_id']:
+            raise HTTPException(status_code=404, detail="Payment not found")
         
-        # Create order
-        items = []
-        total_amount = 0.0
-        for cart_item in cart_items:
-            product_result = await session.execute(
-                select(ProductDB).where(ProductDB.id == cart_item.product_id)
-            )
-            product = product_result.scalar_one_or_none()
-            
-            if product:
-                items.append({
-                    "product_id": product.id,
-                    "name": product.name,
-                    "brand": product.brand,
-                    "price": product.price,
-                    "quantity": cart_item.quantity
-                })
-                total_amount += product.price * cart_item.quantity
-        
-        # Get user info for address
-        user_result = await session.execute(select(UserDB).where(UserDB.id == user['user_id']))
-        user_info = user_result.scalar_one_or_none()
-        
-        # Create order ID
-        order_id = str(uuid.uuid4())
-        
-        db_order = OrderDB(
-            id=order_id,
-            user_id=user['user_id'],
-            total_amount=total_amount,
-            payment_status="paid",
-            order_status="confirmed",
-            shipping_address=user_info.address if user_info and user_info.address else 'No address provided',
-            created_at=datetime.now(timezone.utc),
-            updated_at=datetime.now(timezone.utc)
-        )
-        
-        session.add(db_order)
-        
-        # Create order items
-        for item in items:
-            subtotal = item['price'] * item['quantity']
-            db_order_item = OrderItemDB(
-                id=str(uuid.uuid4()),
-                order_id=order_id,
-                product_id=item['product_id'],
-                product_name=item['name'],
-                product_brand=item['brand'],
-                product_price=item['price'],
-                quantity=item['quantity'],
-                subtotal=subtotal
-            )
-            session.add(db_order_item)
-        
-        # Update payment transaction
-        payment_result = await session.execute(
-            select(PaymentTransactionDB).where(PaymentTransactionDB.session_id == razorpay_order_id)
-        )
-        existing_payment = payment_result.scalar_one_or_none()
-        
-        if existing_payment:
-            existing_payment.payment_status = "completed"
-            existing_payment.status = "completed"
-            existing_payment.order_id = order_id
-            existing_payment.updated_at = datetime.now(timezone.utc)
+        payment.payment_status = "paid"
+        payment.status = "paid"
+        payment.updated_at = datetime.now(timezone.utc)
         
-        # Clear cart
-        await session.execute(
-            delete(CartItemDB).where(CartItemDB.user_id == user['user_id'])
-        )
+        try:
+            order = await order_finalizer.finalize(session, OrderRequest(
+                user_id=user['user_id'],
+                payment_status="paid",
+                order_status="confirmed",
+                payment_session_id=razorpay_order_id,
+                payment_method="razorpay",
+                check_stock=False
+            ))
+        except PaymentNotFoundError:
+            raise HTTPException(status_code=404, detail="Payment not found")
+        if order is None:
+            raise HTTPException(status_code=400, detail="Cart is empty")
         
+        payment.order_id = order.order_id
         await session.commit()
-        
-        # Return order details for analytics
-        return {
-            "status": "success",
-            "payment_status": "paid",
-            "order_id": order_id,
-            "message": "Payment verified and order created successfully",
-            "order": {
-                "id": order_id,
-                "total_amount": float(total_amount),
-                "payment_method": "razorpay",
-                "items": [
-                    {
-                        "name": item['name'],
-                        "brand": item['brand'],
-                        "price": float(item['price']),
-                        "quantity": item['quantity']
-                    }
-                    for item in items
-                ]
-            }
+    
+    order_finalizer.dispatch(order)
+    await payment_reconciler.notify(razorpay_order_id)
+    
+    # Return order details for analytics
+    return {
+        "status": "success",
+        "payment_status": "paid",
+        "order_id": order.order_id,
+        "message": "Payment verified and order created successfully",
+        "order": {
+            "id": order.order_id,
+            "total_amount": float(order.total_amount),
+            "payment_method": "razorpay",
+            "items": [
+                {
+                    "name": item['name'],
+                    "brand": item['brand'],
+                    "price": float(item['price']),
+                    "quantity": item['quantity']
+                }
+                for item in order.items
+            ]
         }
+    }
 
 @api_router.post("/webhook/razorpay")
 async def razorpay_webhook(request: Request):
-    """Handle Razorpay webhook events"""
+    """Verify and queue a Razorpay webhook; processed by webhook_queue workers"""
     body = await request.body()
     signature = request.headers.get("X-Razorpay-Signature", "")
     
     if not signature:
         raise HTTPException(status_code=400, detail="Missing signature")
     
+    gateway = get_gateway("razorpay")
     try:
-        # Create gateway and verify webhook
-        gateway = PaymentGatewayFactory.create_gateway("razorpay")
         webhook_response = await gateway.verify_webhook(body, signature)
-        
-        async with async_session_maker() as session:
-            # Update payment transaction
-            result = await session.execute(
-                select(PaymentTransactionDB).where(
-                    PaymentTransactionDB.session_id == webhook_response.session_id
-                )
-            )
-            payment = result.scalar_one_or_none()
-            
-            if payment:
-                payment.payment_status = webhook_response.payment_status
-                payment.updated_at = datetime.now(timezone.utc)
-                await session.commit()
-        
-        return {"status": "success"}
     except Exception as e:
         logging.error(f"Razorpay webhook error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
+    
+    await webhook_queue.enqueue(
+        "razorpay",
+        body,
+        session_id=webhook_response.session_id,
+        event_type=webhook_response.event_type,
+        payment_status=webhook_response.payment_status,
+        event_id=request.headers.get("X-Razorpay-Event-Id")
+    )
+    return {"status": "success"}
 
 # ============ Admin Payment Transaction Management ============
 
+@api_router.get("/admin/webhooks")
+async def get_webhook_queue_stats(authorization: str = Header(None)):
+    """Webhook queue depth by status and this worker's counters"""
+    user = await get_current_user(authorization)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return await webhook_queue.get_stats()
+
+@api_router.post("/admin/webhooks/{event_id}/retry")
+async def retry_webhook_event(event_id: int, authorization: str = Header(None)):
+    """Requeue a webhook event that exhausted its retries"""
+    user = await get_current_user(authorization)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    if not await webhook_queue.retry(event_id):
+        raise HTTPException(status_code=404, detail="Failed webhook event not found")
+    return {"message": "Webhook event requeued"}
+
 @api_router.get("/admin/payments")
 async def get_all_payment_transactions(
     limit: int = 100,
     offset: int = 0,
+    payment_status: Optional[str] = None,
+    gateway: Optional[str] = None,
+    user_id: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    include_metadata: bool = False,
     authorization: str = Header(None)
 ):
-    """Admin endpoint to view all payment transactions"""
+    """Admin endpoint to view payment transactions, newest first
+    
+    Filters map onto indexes: (payment_status, created_at), (gateway,
+    created_at) and (user_id, created_at), with created_from/created_to
+    as a range on the second column. Metadata is only read when
+    include_metadata is set.
+    """
     user = await get_current_user(authorization)
     
     if user.get('role') != 'admin':
         raise HTTPException(status_code=403, detail="Admin access required")
     
+    limit = max(1, min(limit, 500))
+    
+    query = select(PaymentTransactionDB)
+    if payment_status:
+        query = query.where(PaymentTransactionDB.payment_status == payment_status)
+    if gateway:
+        query = query.where(PaymentTransactionDB.gateway == gateway)
+    if user_id:
+        query = query.where(PaymentTransactionDB.user_id == user_id)
+    if created_from:
+        query = query.where(PaymentTransactionDB.created_at >= created_from)
+    if created_to:
+        query = query.where(PaymentTransactionDB.created_at < created_to)
+    if include_metadata:
+        query = query.options(undefer(PaymentTransactionDB.payment_metadata))
+    
     async with async_session_maker() as session:
         result = await session.execute(
-            select(PaymentTransactionDB)
-            .order_by(PaymentTransactionDB.created_at.desc())
+            query
+            .order_by(PaymentTransactionDB.created_at.desc(), PaymentTransactionDB.id.desc())
             .limit(limit)
             .offset(offset)
         )
@@ -2884,7 +3374,8 @@ async def get_all_payment_transactions(
                 "currency": p.currency,
                 "payment_status": p.payment_status,
                 "status": p.status,
-                "metadata": json.loads(p.payment_metadata) if p.payment_metadata else None,
+                "gateway": p.gateway,
+                **({"metadata": p.payment_metadata} if include_metadata else {}),
                 "created_at": p.created_at.isoformat() if p.created_at else None,
                 "updated_at": p.updated_at.isoformat() if p.updated_at else None
             }
@@ -2901,7 +3392,9 @@ async def get_payment_transaction(session_id: str, authorization: str = Header(N
     
     async with async_session_maker() as session:
         result = await session.execute(
-            select(PaymentTransactionDB).where(PaymentTransactionDB.session_id == session_id)
+            select(PaymentTransactionDB)
+            .where(PaymentTransactionDB.session_id == session_id)
+            .options(undefer(PaymentTransactionDB.payment_metadata))
         )
         payment = result.scalar_one_or_none()
         
@@ -2935,7 +3428,8 @@ async def get_payment_transaction(session_id: str, authorization: str = Header(N
             "currency": payment.currency,
             "payment_status": payment.payment_status,
             "status": payment.status,
-            "metadata": json.loads(payment.payment_metadata) if payment.payment_metadata else None,
+            "gateway": payment.gateway,
+            "metadata": payment.payment_metadata,
             "created_at": payment.created_at.isoformat() if payment.created_at else None,
             "updated_at": payment.updated_at.isoformat() if payment.updated_at else None
         }
@@ -3020,6 +3514,29 @@ async def delete_payment_transaction(session_id: str, authorization: str = Heade
 
 # ============ Recently Viewed & Recommendations ============
 
+async def fetch_products_in_order(session: AsyncSession, product_ids: List[str], limit: int) -> List[ProductDB]:
+    """Load in-stock products by ID, keeping the given ranking"""
+    if not product_ids:
+        return []
+    
+    result = await session.execute(
+        select(ProductDB).where(ProductDB.id.in_(product_ids), ProductDB.stock > 0)
+    )
+    by_id = {p.id: p for p in result.scalars().all()}
+    return [by_id[pid] for pid in product_ids if pid in by_id][:limit]
+
+@api_router.get("/admin/recommendations/stats")
+async def get_recommendation_stats(authorization: str = Header(None)):
+    """Size and freshness of the item-item recommendation index"""
+    user = await get_current_user(authorization)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return {
+        "co_occurrence": recommendation_engine.get_stats(),
+        "attribute_similarity": product_similarity.get_stats()
+    }
+
 @api_router.get("/user/recently-viewed")
 async def get_recently_viewed(
     limit: int = 10,
@@ -3028,34 +3545,35 @@ async def get_recently_viewed(
     """Get user's recently viewed products"""
     user = await get_current_user(authorization)
     
+    # Newest views come from the Redis buffer, not MySQL
+    views = await recently_viewed.get(user['user_id'], limit)
+    if not views:
+        return []
+    
     async with async_session_maker() as session:
-        # Get recently viewed products with product details
         result = await session.execute(
-            select(RecentlyViewedDB, ProductDB)
-            .join(ProductDB, RecentlyViewedDB.product_id == ProductDB.id)
-            .where(RecentlyViewedDB.user_id == user['user_id'])
-            .order_by(RecentlyViewedDB.viewed_at.desc())
-            .limit(limit)
+            select(ProductDB).where(ProductDB.id.in_([product_id for product_id, _ in views]))
         )
-        rows = result.all()
-        
-        return [
-            {
-                "id": row[1].id,
-                "name": row[1].name,
-                "brand": row[1].brand,
-                "price": float(row[1].price),
-                "description": row[1].description,
-                "category": row[1].category,
-                "frame_type": row[1].frame_type,
-                "frame_shape": row[1].frame_shape,
-                "color": row[1].color,
-                "image_url": row[1].image_url,
-                "stock": row[1].stock,
-                "viewed_at": row[0].viewed_at.isoformat() if row[0].viewed_at else None
-            }
-            for row in rows
-        ]
+        products = {p.id: p for p in result.scalars().all()}
+    
+    return [
+        {
+            "id": product.id,
+            "name": product.name,
+            "brand": product.brand,
+            "price": float(product.price),
+            "description": product.description,
+            "category": product.category,
+            "frame_type": product.frame_type,
+            "frame_shape": product.frame_shape,
+            "color": product.color,
+            "image_url": product.image_url,
+            "stock": product.stock,
+            "viewed_at": viewed_at.isoformat()
+        }
+        for product_id, viewed_at in views
+        if (product := products.get(product_id))
+    ]
 
 @api_router.post("/user/recently-viewed/{product_id}")
 async def add_recently_viewed(
@@ -3065,39 +3583,16 @@ async def add_recently_viewed(
     """Track product view"""
     user = await get_current_user(authorization)
     
-    async with async_session_maker() as session:
-        # Check if product exists
-        result = await session.execute(select(ProductDB).where(ProductDB.id == product_id))
-        product = result.scalar_one_or_none()
-        
-        if not product:
+    # The similarity index knows every product; only unknown IDs hit MySQL
+    if product_id not in product_similarity:
+        async with async_session_maker() as session:
+            exists = await session.scalar(select(ProductDB.id).where(ProductDB.id == product_id))
+        if not exists:
             raise HTTPException(status_code=404, detail="Product not found")
-        
-        # Check if already viewed recently
-        result = await session.execute(
-            select(RecentlyViewedDB).where(
-                RecentlyViewedDB.user_id == user['user_id'],
-                RecentlyViewedDB.product_id == product_id
-            )
-        )
-        existing = result.scalar_one_or_none()
-        
-        if existing:
-            # Update viewed_at timestamp
-            existing.viewed_at = datetime.now(timezone.utc)
-        else:
-            # Add new entry
-            new_view = RecentlyViewedDB(
-                id=str(uuid.uuid4()),
-                user_id=user['user_id'],
-                product_id=product_id,
-                viewed_at=datetime.now(timezone.utc)
-            )
-            session.add(new_view)
-        
-        await session.commit()
-        
-        return {"message": "Product view tracked"}
+    
+    await recently_viewed.record(user['user_id'], product_id)
+    
+    return {"message": "Product view tracked"}
 
 @api_router.get("/products/recommended")
 async def get_recommended_products(
@@ -3107,18 +3602,12 @@ async def get_recommended_products(
     """Get recommended products based on user's recently viewed items"""
     user = await get_current_user(authorization)
     
+    # Get user's recently viewed products to understand preferences
+    views = await recently_viewed.get(user['user_id'], 5)
+    viewed_ids = [product_id for product_id, _ in views]
+    
     async with async_session_maker() as session:
-        # Get user's recently viewed products to understand preferences
-        result = await session.execute(
-            select(RecentlyViewedDB, ProductDB)
-            .join(ProductDB, RecentlyViewedDB.product_id == ProductDB.id)
-            .where(RecentlyViewedDB.user_id == user['user_id'])
-            .order_by(RecentlyViewedDB.viewed_at.desc())
-            .limit(5)
-        )
-        recently_viewed = result.all()
-        
-        if not recently_viewed:
+        if not viewed_ids:
             # No viewing history, return popular products (highest stock or newest)
             result = await session.execute(
                 select(ProductDB)
@@ -3128,95 +3617,117 @@ async def get_recommended_products(
             )
             products = result.scalars().all()
         else:
-            # Get categories and brands from recently viewed
-            categories = set()
-            brands = set()
-            viewed_ids = set()
-            
-            for view, product in recently_viewed:
-                categories.add(product.category)
-                brands.add(product.brand)
-                viewed_ids.add(product.id)
+            # Neighbours of the viewed products from the co-view/co-purchase index
+            products = await fetch_products_in_order(
+                session,
+                recommendation_engine.recommend(viewed_ids, recommendation_engine.top_k),
+                limit
+            )
             
-            # Find products with matching category or brand (excluding already viewed)
-            result = await session.execute(
-                select(ProductDB)
-                .where(
-                    ProductDB.stock > 0,
-                    ProductDB.id.notin_(viewed_ids),
-                    or_(
-                        ProductDB.category.in_(categories),
-                        ProductDB.brand.in_(brands)
+            if len(products) < limit:
+                # Not enough history in the index: fill by category or brand
+                result = await session.execute(
+                    select(ProductDB.category, ProductDB.brand).where(ProductDB.id.in_(viewed_ids))
+                )
+                viewed = result.all()
+                categories = {row.category for row in viewed}
+                brands = {row.brand for row in viewed}
+                exclude_ids = set(viewed_ids) | {p.id for p in products}
+                
+                result = await session.execute(
+                    select(ProductDB)
+                    .where(
+                        ProductDB.stock > 0,
+                        ProductDB.id.notin_(exclude_ids),
+                        or_(
+                            ProductDB.category.in_(categories),
+                            ProductDB.brand.in_(brands)
+                        )
                     )
+                    .order_by(ProductDB.created_at.desc())
+                    .limit(limit - len(products))
                 )
-                .order_by(ProductDB.created_at.desc())
-                .limit(limit)
-            )
-            products = result.scalars().all()
-        
-        return [
-            {
-                "id": p.id,
-                "name": p.name,
-                "brand": p.brand,
-                "price": float(p.price),
-                "description": p.description,
-                "category": p.category,
-                "frame_type": p.frame_type,
-                "frame_shape": p.frame_shape,
-                "color": p.color,
-                "image_url": p.image_url,
-                "stock": p.stock
-            }
-            for p in products
-        ]
+                products = products + list(result.scalars().all())
+    
+    ratings = await get_rating_summaries([p.id for p in products])
+    
+    return [
+        {
+            "id": p.id,
+            "name": p.name,
+            "brand": p.brand,
+            "price": float(p.price),
+            "description": p.description,
+            "category": p.category,
+            "frame_type": p.frame_type,
+            "frame_shape": p.frame_shape,
+            "color": p.color,
+            "image_url": p.image_url,
+            "stock": p.stock,
+            "rating": ratings[p.id]
+        }
+        for p in products
+    ]
 
 @api_router.get("/products/{product_id}/related")
 async def get_related_products(
     product_id: str,
     limit: int = 4
 ):
-    """Get related products based on category and brand"""
+    """Get related products (co-viewed/co-purchased first, then by attribute similarity)"""
     async with async_session_maker() as session:
-        # Get the current product
-        result = await session.execute(select(ProductDB).where(ProductDB.id == product_id))
-        current_product = result.scalar_one_or_none()
-        
-        if not current_product:
-            raise HTTPException(status_code=404, detail="Product not found")
-        
-        # Find related products (same category or brand, excluding current product)
-        result = await session.execute(
-            select(ProductDB)
-            .where(
-                ProductDB.stock > 0,
-                ProductDB.id != product_id,
-                or_(
-                    ProductDB.category == current_product.category,
-                    ProductDB.brand == current_product.brand
+        # Co-viewed/co-purchased neighbours first, then attribute-similar ones;
+        # both come from memory, so this is a single primary-key lookup
+        similar_ids = product_similarity.related(product_id, product_similarity.top_k)
+        candidate_ids = list(dict.fromkeys(
+            recommendation_engine.related(product_id, recommendation_engine.top_k) + (similar_ids or [])
+        ))
+        products = await fetch_products_in_order(session, candidate_ids, limit)
+        
+        if len(products) < limit and similar_ids is None:
+            # Product not indexed yet (e.g. created on another worker): fall back to SQL
+            result = await session.execute(select(ProductDB).where(ProductDB.id == product_id))
+            current_product = result.scalar_one_or_none()
+            
+            if not current_product:
+                raise HTTPException(status_code=404, detail="Product not found")
+            
+            # Fill with related products (same category or brand, excluding current product)
+            exclude_ids = {product_id} | {p.id for p in products}
+            result = await session.execute(
+                select(ProductDB)
+                .where(
+                    ProductDB.stock > 0,
+                    ProductDB.id.notin_(exclude_ids),
+                    or_(
+                        ProductDB.category == current_product.category,
+                        ProductDB.brand == current_product.brand
+                    )
                 )
+                .order_by(ProductDB.created_at.desc())
+                .limit(limit - len(products))
             )
-            .order_by(ProductDB.created_at.desc())
-            .limit(limit)
-        )
-        products = result.scalars().all()
-        
-        return [
-            {
-                "id": p.id,
-                "name": p.name,
-                "brand": p.brand,
-                "price": float(p.price),
-                "description": p.description,
-                "category": p.category,
-                "frame_type": p.frame_type,
-                "frame_shape": p.frame_shape,
-                "color": p.color,
-                "image_url": p.image_url,
-                "stock": p.stock
-            }
-            for p in products
-        ]
+            products = products + list(result.scalars().all())
+    
+    ratings = await get_rating_summaries([p.id for p in products])
+    
+    return [
+        {
+            "id": p.id,
+            "name": p.name,
+            "brand": p.brand,
+            "price": float(p.price),
+            "description": p.description,
+            "category": p.category,
+            "frame_type": p.frame_type,
+            "frame_shape": p.frame_shape,
+            "color": p.color,
+            "image_url": p.image_url,
+            "stock": p.stock,
+            "rating": ratings[p.id]
+        }
+        for p in products
+    ]
 
 # ============ Admin Stats ============
 
@@ -3252,6 +3763,68 @@ async def get_admin_stats(authorization: str = Header(None)):
             "total_revenue": float(total_revenue)
         }
 
+@api_router.get("/admin/redis/pool")
+async def get_redis_pool_metrics(authorization: str = Header(None)):
+    """Shared Redis pool utilization and circuit breaker state"""
+    user = await get_current_user(authorization)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return get_redis_pool().get_metrics()
+
+@api_router.get("/admin/rate-limits/metrics")
+async def get_rate_limit_metrics(authorization: str = Header(None)):
+    """Local-decision rate and sliding-window accuracy of this worker's limiter"""
+    user = await get_current_user(authorization)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return get_limiter_metrics(limiter)
+
+@api_router.get("/admin/maintenance")
+async def get_maintenance_status(authorization: str = Header(None)):
+    """Retention policy and the report of this worker's last run"""
+    user = await get_current_user(authorization)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return maintenance.get_stats()
+
+@api_router.post("/admin/maintenance/run")
+async def run_maintenance(authorization: str = Header(None)):
+    """Apply the retention policies now"""
+    user = await get_current_user(authorization)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    # Shares the run lock with the scheduled job on every worker
+    try:
+        return await maintenance.run()
+    except MaintenanceBusyError:
+        raise HTTPException(status_code=409, detail="Maintenance is already running")
+
+@api_router.get("/admin/payment-gateways")
+async def get_payment_gateway_health(authorization: str = Header(None)):
+    """Health of the payment gateways and the reconciler on this worker"""
+    user = await get_current_user(authorization)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return {
+        "gateways": await payment_gateways.check_health(),
+        "reconciliation": payment_reconciler.get_stats()
+    }
+
+@api_router.post("/admin/payment-gateways/reload")
+async def reload_payment_gateways(authorization: str = Header(None)):
+    """Re-read gateway credentials now (other workers pick up .env changes on their next check)"""
+    user = await get_current_user(authorization)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    changes = await payment_gateways.reload()
+    return {"changes": changes, "gateways": payment_gateways.get_stats()}
+
 # ============ Coupon Routes ============
 
 @api_router.post("/coupons/validate", response_model=ValidateCouponResponse)
@@ -3612,6 +4185,7 @@ async def save_cart_item(cart_item_id: str, authorization: str = Header(None)):
             # Just remove from cart
             await session.delete(cart_item)
             await session.commit()
+            await cache_service.remove_cart_item(user['user_id'], cart_item.product_id)
             return {"message": "Item already in saved items. Removed from cart."}
         
         # Create saved item
@@ -3629,6 +4203,8 @@ async def save_cart_item(cart_item_id: str, authorization: str = Header(None)):
         
         await session.commit()
         
+        await cache_service.remove_cart_item(user['user_id'], cart_item.product_id)
+        
         return {"message": "Item moved to saved items"}
 
 @api_router.post("/saved-items/{saved_item_id}/move-to-cart")
@@ -3682,7 +4258,8 @@ async def move_saved_item_to_cart(saved_item_id: str, authorization: str = Heade
                 id=str(uuid.uuid4()),
                 user_id=user['user_id'],
                 product_id=saved_item.product_id,
-                quantity=saved_item.quantity
+                quantity=saved_item.quantity,
+                added_at=datetime.now(timezone.utc)
             )
             session.add(cart_item)
         
@@ -3691,6 +4268,9 @@ async def move_saved_item_to_cart(saved_item_id: str, authorization: str = Heade
         
         await session.commit()
         
+        await cache_service.set_cart_item(user['user_id'], cart_item_state(cart_item))
+        await cache_service.set_product_snapshots([product_snapshot(product)])
+        
         return {"message": "Item moved to cart"}
 
 @api_router.delete("/saved-items/{saved_item_id}")
@@ -3773,6 +4353,46 @@ async def get_sales_analytics(
             "daily_sales": sales_data
         }
 
+@api_router.get("/admin/analytics/daily")
+async def get_daily_sales_rollup(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    authorization: str = Header(None)
+):
+    """Per-day order and revenue totals from the sales_daily rollup (admin only)"""
+    user = await get_current_user(authorization)
+    
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    try:
+        start = datetime.fromisoformat(start_date).date() if start_date else None
+        end = datetime.fromisoformat(end_date).date() if end_date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be ISO formatted")
+    
+    daily = await sales_rollup.daily(start, end)
+    return {
+        "summary": {
+            "total_orders": sum(day['orders'] for day in daily),
+            "total_revenue": round(sum(day['revenue'] for day in daily), 2),
+            "paid_revenue": round(sum(day['paid_revenue'] for day in daily), 2),
+        },
+        "daily": daily,
+        "events": domain_events.get_stats()
+    }
+
+@api_router.post("/admin/analytics/daily/rebuild")
+async def rebuild_daily_sales_rollup(authorization: str = Header(None)):
+    """Recompute the sales_daily rollup from the orders table (admin only)"""
+    user = await get_current_user(authorization)
+    
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    await sales_rollup.rebuild()
+    return {"message": "Sales rollup rebuilt"}
+
 @api_router.get("/admin/analytics/top-products")
 async def get_top_products(
     limit: int = 10,
@@ -3940,24 +4560,28 @@ async def get_inventory_alerts(authorization: str = Header(None)):
         raise HTTPException(status_code=403, detail="Admin access required")
     
     async with async_session_maker() as session:
-        # Get low stock threshold from environment or use default (10)
-        low_stock_threshold = int(os.environ.get('LOW_STOCK_THRESHOLD', '10'))
+        # Persisted global threshold, overridden per product where set
+        low_stock_threshold = low_stock_monitor.global_threshold
+        effective_threshold = func.coalesce(InventoryThresholdDB.threshold, low_stock_threshold)
         
         # Get products with low stock
         result = await session.execute(
-            select(ProductDB).where(ProductDB.stock <= low_stock_threshold).order_by(ProductDB.stock)
+            select(ProductDB, effective_threshold)
+            .outerjoin(InventoryThresholdDB, InventoryThresholdDB.product_id == ProductDB.id)
+            .where(ProductDB.stock <= effective_threshold)
+            .order_by(ProductDB.stock)
         )
-        products = result.scalars().all()
         
         alerts = []
-        for product in products:
-            alert_level = "critical" if product.stock == 0 else "warning" if product.stock <= low_stock_threshold / 2 else "low"
+        for product, threshold in result.all():
+            alert_level = LowStockMonitor.alert_level(product.stock, threshold)
             alerts.append({
                 "product_id": product.id,
                 "product_name": product.name,
                 "brand": product.brand,
                 "category": product.category,
                 "current_stock": product.stock,
+                "threshold": threshold,
                 "alert_level": alert_level,
                 "image_url": product.image_url
             })
@@ -3968,12 +4592,70 @@ async def get_inventory_alerts(authorization: str = Header(None)):
             "alerts": alerts
         }
 
+INVENTORY_STREAM_SCOPE = "inventory_alerts_stream"
+
+@api_router.post("/admin/inventory/alerts/stream-token")
+async def create_inventory_stream_token(authorization: str = Header(None)):
+    """Short-lived token for opening the alerts stream with EventSource (admin only)"""
+    user = await get_current_user(authorization)
+    
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return {
+        "token": create_stream_token(user, INVENTORY_STREAM_SCOPE),
+        "expires_in": STREAM_TOKEN_TTL
+    }
+
+@api_router.get("/admin/inventory/alerts/stream")
+async def stream_inventory_alerts(
+    request: Request,
+    token: Optional[str] = None,
+    authorization: str = Header(None)
+):
+    """Push low-stock alerts as Server-Sent Events (admin only)
+    
+    EventSource can't send headers, so it passes a stream token from
+    POST /admin/inventory/alerts/stream-token as ?token= instead of the JWT.
+    """
+    if authorization:
+        user = await get_current_user(authorization)
+    else:
+        user = verify_token(token) if token else None
+        if not user or user.get("scope") != INVENTORY_STREAM_SCOPE:
+            raise HTTPException(status_code=401, detail="Invalid stream token")
+    
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    async def events():
+        queue = low_stock_monitor.subscribe()
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    alert = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Keep proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: inventory_alert\ndata: {json.dumps(alert)}\n\n"
+        finally:
+            low_stock_monitor.unsubscribe(queue)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @api_router.put("/admin/inventory/threshold")
 async def update_stock_threshold(
     threshold: int,
+    product_id: Optional[str] = None,
     authorization: str = Header(None)
 ):
-    """Update low stock threshold (admin only)"""
+    """Update the global low stock threshold, or one product's override (admin only)"""
     user = await get_current_user(authorization)
     
     if user['role'] != 'admin':
@@ -3982,14 +4664,35 @@ async def update_stock_threshold(
     if threshold < 0:
         raise HTTPException(status_code=400, detail="Threshold must be non-negative")
     
-    # In a production app, this would be stored in a settings table
-    # For now, we'll return success and the value can be set via environment variable
+    if product_id:
+        async with async_session_maker() as session:
+            result = await session.execute(select(ProductDB.id).where(ProductDB.id == product_id))
+            if result.scalar_one_or_none() is None:
+                raise HTTPException(status_code=404, detail="Product not found")
+    
+    await low_stock_monitor.set_threshold(threshold, product_id)
+    
     return {
         "message": "Threshold updated successfully",
         "threshold": threshold,
-        "note": "Set LOW_STOCK_THRESHOLD environment variable to persist this setting"
+        "product_id": product_id
     }
 
+@api_router.delete("/admin/inventory/threshold/{product_id}")
+async def delete_stock_threshold(product_id: str, authorization: str = Header(None)):
+    """Remove a product's threshold override so the global threshold applies (admin only)"""
+    user = await get_current_user(authorization)
+    
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    if product_id == GLOBAL_THRESHOLD_KEY:
+        raise HTTPException(status_code=400, detail="The global threshold can't be removed")
+    
+    await low_stock_monitor.set_threshold(None, product_id)
+    
+    return {"message": "Threshold override removed", "product_id": product_id}
+
 class BulkStockUpdate(BaseModel):
     product_id: str
     stock: int
@@ -4005,33 +4708,29 @@ async def bulk_update_stock(
     if user['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Admin access required")
     
+    levels = {}
+    for update_item in updates:
+        if update_item.stock < 0:
+            raise HTTPException(status_code=400, detail=f"Stock cannot be negative for product {update_item.product_id}")
+        # A repeated product keeps its last level
+        levels[update_item.product_id] = update_item.stock
+    
     async with async_session_maker() as session:
-        updated_products = []
+        # One locking read and one joined UPDATE per chunk, all in one transaction
+        updated_products, missing = await apply_stock_levels(session, levels)
         
-        for update_item in updates:
-            if update_item.stock < 0:
-                raise HTTPException(status_code=400, detail=f"Stock cannot be negative for product {update_item.product_id}")
-            
-            result = await session.execute(
-                select(ProductDB).where(ProductDB.id == update_item.product_id)
-            )
-            product = result.scalar_one_or_none()
-            
-            if not product:
-                raise HTTPException(status_code=404, detail=f"Product {update_item.product_id} not found")
-            
-            old_stock = product.stock
-            product.stock = update_item.stock
-            
-            updated_products.append({
-                "product_id": product.id,
-                "product_name": product.name,
-                "old_stock": old_stock,
-                "new_stock": product.stock
-            })
+        if missing:
+            await session.rollback()
+            raise HTTPException(status_code=404, detail=f"Product {missing[0]} not found")
         
         await session.commit()
         
+        await cache_service.delete_product_snapshots([p["product_id"] for p in updated_products])
+        inventory_events.publish([
+            InventoryEvent(p["product_id"], p["product_name"], p["old_stock"], p["new_stock"], "bulk_update")
+            for p in updated_products
+        ])
+        
         return {
             "message": f"Successfully updated stock for {len(updated_products)} products",
             "updated_products": updated_products
@@ -4372,19 +5071,22 @@ async def init_db():
         logger.info(f"   Database: {DB_NAME}")
         logger.info(f"   User: {DB_USER}")
         
-        async with engine.begin() as conn:
+        # Single-process setups can opt in to migrating on boot
+        if os.environ.get('AUTO_MIGRATE', 'false').lower() == 'true':
+            applied = await run_migrations(engine, Base.metadata)
+            if applied:
+                logger.info(f"[DATABASE] Applied migrations: {', '.join(applied)}")
+        
+        async with engine.connect() as conn:
             # Test connection
             result = await conn.execute(select(func.version()))
             version = result.scalar()
             logger.info("[SUCCESS] Database connection successful!")
             logger.info(f"   MySQL Version: {version}")
             
-            # Create tables
-            logger.info("[DATABASE] Creating/verifying database tables...")
-            await conn.run_sync(Base.metadata.create_all)
-            
-            logger.info("[SUCCESS] Database tables created/verified successfully!")
-            logger.info("   Available tables: users, products, cart, orders, addresses, reviews, wishlist, etc.")
+            # Schema changes ship as migrations (python scripts/migrate.py); workers only verify the revision
+            revision = await check_revision(conn)
+            logger.info(f"[SUCCESS] Database schema at revision {revision}")
             
     except Exception as e:
         logger.error("=" * 70)
@@ -4397,6 +5099,7 @@ async def init_db():
         logger.error(f"  2. Database '{DB_NAME}' exists")
         logger.error(f"  3. User '{DB_USER}' has proper permissions")
         logger.error(f"  4. Connection details in .env are correct")
+        logger.error("  5. Migrations are applied: python scripts/migrate.py")
         logger.error("=" * 70)
         raise
 
@@ -4426,6 +5129,41 @@ async def startup_event():
         # Initialize database
         await init_db()
         
+        # Connect response cache (app keeps working without it)
+        await cache_service.connect()
+        
+        # Connect payment security (shares the cache's Redis pool)
+        try:
+            await payment_security.connect()
+        except Exception as e:
+            logger.warning(f"[REDIS] Payment security running without Redis: {e}")
+        
+        # Build the recommendation and similarity indexes now and refresh them periodically
+        recommendation_engine.start(async_session_maker)
+        product_similarity.start(async_session_maker)
+        
+        # Flush buffered product views to MySQL in the background
+        recently_viewed.start()
+        
+        # Periodic retention (one worker per interval via a Redis lock)
+        maintenance.start()
+        
+        # Deliver inventory events and relay low-stock alerts between workers
+        inventory_events.start()
+        low_stock_monitor.start()
+        
+        # Deliver order/payment domain events to their subscribers
+        domain_events.start()
+        
+        # Build payment gateways once (pooled connections, health-checked)
+        await payment_gateways.start()
+        
+        # Process queued payment webhooks
+        webhook_queue.start()
+        
+        # Check unsettled payments in the background
+        payment_reconciler.start()
+        
         print("\n" + "="*100)
         print("✅ " + " "*40 + "BACKEND SERVER READY" + " "*40)
         print("="*100)
@@ -4471,6 +5209,27 @@ async def shutdown_event():
         logger.info("[SHUTDOWN] SHUTTING DOWN LENSKART BACKEND SERVER")
         logger.info("=" * 70)
         
+        # Write buffered product views before Redis goes away
+        await recently_viewed.stop()
+        
+        # Stop the producers of new orders and payments first
+        await webhook_queue.stop()
+        await payment_reconciler.stop()
+        
+        # Then deliver queued order side effects (they use Redis and the database)
+        await domain_events.stop()
+        await inventory_events.stop()
+        await low_stock_monitor.stop()
+        await recommendation_engine.stop()
+        await product_similarity.stop()
+        await maintenance.stop()
+        
+        # Close cache connection (cancels in-flight background refreshes)
+        await cache_service.disconnect()
+        await payment_security.disconnect()
+        await get_redis_pool().close()
+        await payment_gateways.stop()
+        
         # Close database connection
         logger.info("[DATABASE] Closing database connection...")
         await engine.dispose()
@@ -4509,6 +5268,23 @@ app.add_exception_handler(RateLimitExceeded, rate_limit_error_handler)
 # Include the router in the main app
 app.include_router(api_router)
 
+def _idempotency_user(request: Request) -> Optional[str]:
+    """User an Idempotency-Key is scoped to (None leaves the request to the route's auth)"""
+    authorization = request.headers.get('authorization')
+    if not authorization or not authorization.startswith("Bearer "):
+        return None
+    payload = verify_token(authorization.split(" ")[1])
+    return payload.get('user_id') if payload and not payload.get('scope') else None
+
+# Retried checkout/order requests with the same Idempotency-Key replay the first response.
+# Added before CORS so that replayed responses still get CORS headers.
+app.add_middleware(
+    IdempotencyMiddleware,
+    payment_security=payment_security,
+    paths=["/api/payment/checkout", "/api/payment/razorpay/create-order", "/api/orders"],
+    user_resolver=_idempotency_user,
+)
+
 # Add middleware (order matters - first added is outermost)
 app.add_middleware(
     CORSMiddleware,
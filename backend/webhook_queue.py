@@ -0,0 +1,354 @@
+"""Webhook Ingestion Queue
+
+Payment webhooks used to be processed inside the provider's HTTP request, so
+sale-time bursts timed out, got retried by the providers and amplified the
+load. Webhooks now go through a durable queue:
+- The endpoint verifies the signature, inserts the raw event into the
+  webhook_events table and acks immediately
+- Duplicate deliveries are dropped on insert (unique gateway + event ID) and
+  short-circuited through PaymentSecurityManager's processed-webhook keys
+- Workers claim events with FOR UPDATE SKIP LOCKED, so every API worker can
+  process without double-claiming
+- Events of one payment session are handled strictly in arrival order: only
+  the oldest unfinished event of a session can be claimed
+- The handler's writes and the event's "done" mark commit in one transaction
+- Failures retry with backoff, then park as 'failed' for inspection
+
+MySQL is the queue (not Redis): the Redis instance runs without persistence
+and with LRU eviction, so it can't hold events that must not be lost.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import socket
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, Callable, Awaitable, List
+
+from sqlalchemy import text, bindparam
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = "pending"
+STATUS_FAILED = "failed"
+
+# Oldest unfinished event of each session, skipping rows another worker holds
+CLAIM_EVENTS = text(
+    "SELECT e.id FROM webhook_events e "
+    "WHERE e.status = 'pending' AND e.available_at <= :now "
+    "AND NOT EXISTS ("
+    "  SELECT 1 FROM webhook_events prior "
+    "  WHERE prior.session_id = e.session_id AND prior.id < e.id "
+    "  AND prior.status IN ('pending', 'processing')"
+    ") "
+    "ORDER BY e.id LIMIT :limit FOR UPDATE SKIP LOCKED"
+)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+@dataclass
+class WebhookEvent:
+    id: int
+    gateway: str
+    event_id: str
+    session_id: str
+    event_type: str
+    payment_status: str
+    payload: str
+    attempts: int
+
+    @property
+    def dedup_key(self) -> str:
+        return f"{self.gateway}:{self.event_id}"
+
+
+# handler(session, event) -> optional callback to run after the commit
+WebhookHandler = Callable[[Any, WebhookEvent], Awaitable[Optional[Callable[[], Awaitable[None]]]]]
+
+
+class WebhookQueue:
+    """Durable webhook queue with idempotent, per-session ordered workers"""
+
+    def __init__(self, session_maker, payment_security=None):
+        """Initialize queue
+
+        Args:
+            session_maker: Async session factory
+            payment_security: PaymentSecurityManager for processed-webhook keys (optional)
+        """
+        self.session_maker = session_maker
+        self.payment_security = payment_security
+        self.batch_size = int(os.environ.get('WEBHOOK_BATCH_SIZE', '20'))
+        self.poll_interval = float(os.environ.get('WEBHOOK_POLL_INTERVAL_SECONDS', '1.0'))
+        self.lease_seconds = int(os.environ.get('WEBHOOK_LEASE_SECONDS', '60'))
+        self.max_attempts = int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', '8'))
+        self.retry_base_seconds = float(os.environ.get('WEBHOOK_RETRY_BASE_SECONDS', '5'))
+        self.retention_days = int(os.environ.get('WEBHOOK_RETENTION_DAYS', '30'))
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._handlers: Dict[str, WebhookHandler] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._last_purge: Optional[datetime] = None
+        self.processed = 0
+        self.failed = 0
+        self.duplicates = 0
+
+    def register(self, gateway: str, handler: WebhookHandler):
+        """Set the handler for a gateway's events"""
+        self._handlers[gateway] = handler
+
+    # ============ Ingestion ============
+
+    @staticmethod
+    def event_id_for(body: bytes, event_id: Optional[str]) -> str:
+        """Provider event ID, or a hash of the raw body when there is none"""
+        return event_id or hashlib.sha256(body).hexdigest()
+
+    async def enqueue(
+        self,
+        gateway: str,
+        body: bytes,
+        session_id: str,
+        event_type: str,
+        payment_status: str,
+        event_id: Optional[str] = None
+    ) -> bool:
+        """Durably store a verified webhook
+
+        Returns:
+            False if the event was already received
+        """
+        event_id = self.event_id_for(body, event_id)
+        if self.payment_security and await self.payment_security.check_webhook_processed(f"{gateway}:{event_id}"):
+            self.duplicates += 1
+            return False
+
+        now = _utcnow()
+        async with self.session_maker() as session:
+            result = await session.execute(
+                text(
+                    "INSERT IGNORE INTO webhook_events "
+                    "(gateway, event_id, session_id, event_type, payment_status, payload, status, "
+                    "attempts, available_at, received_at) "
+                    "VALUES (:gateway, :event_id, :session_id, :event_type, :payment_status, :payload, "
+                    "'pending', 0, :now, :now)"
+                ),
+                {
+                    "gateway": gateway,
+                    "event_id": event_id,
+                    "session_id": session_id or "",
+                    "event_type": event_type or "",
+                    "payment_status": payment_status or "",
+                    "payload": body.decode("utf-8", errors="replace"),
+                    "now": now,
+                }
+            )
+            await session.commit()
+
+        if result.rowcount == 0:
+            self.duplicates += 1
+            return False
+
+        self._wakeup.set()
+        return True
+
+    # ============ Processing ============
+
+    async def _recover_expired(self, session):
+        """Return events whose worker died mid-processing to the queue"""
+        await session.execute(
+            text(
+                "UPDATE webhook_events SET status = 'pending', locked_by = NULL "
+                "WHERE status = 'processing' AND locked_until < :now"
+            ),
+            {"now": _utcnow()}
+        )
+
+    async def claim(self) -> List[WebhookEvent]:
+        """Lease the next batch of events (at most one per session)"""
+        now = _utcnow()
+        async with self.session_maker() as session:
+            await self._recover_expired(session)
+            ids = (await session.execute(CLAIM_EVENTS, {"now": now, "limit": self.batch_size})).scalars().all()
+            if not ids:
+                await session.commit()
+                return []
+
+            await session.execute(
+                text(
+                    "UPDATE webhook_events SET status = 'processing', attempts = attempts + 1, "
+                    "locked_by = :worker, locked_until = :until WHERE id IN :ids"
+                ).bindparams(bindparam("ids", expanding=True)),
+                {"ids": list(ids), "worker": self.worker_id, "until": now + timedelta(seconds=self.lease_seconds)}
+            )
+            rows = (await session.execute(
+                text(
+                    "SELECT id, gateway, event_id, session_id, event_type, payment_status, payload, attempts "
+                    "FROM webhook_events WHERE id IN :ids ORDER BY id"
+                ).bindparams(bindparam("ids", expanding=True)),
+                {"ids": list(ids)}
+            )).mappings().all()
+            await session.commit()
+
+        return [WebhookEvent(**row) for row in rows]
+
+    async def _process(self, event: WebhookEvent):
+        handler = self._handlers.get(event.gateway)
+        try:
+            if handler is None:
+                raise RuntimeError(f"No webhook handler for gateway '{event.gateway}'")
+
+            async with self.session_maker() as session:
+                after_commit = await handler(session, event)
+                await session.execute(
+                    text(
+                        "UPDATE webhook_events SET status = 'done', processed_at = :now, "
+                        "last_error = NULL, locked_by = NULL WHERE id = :id"
+                    ),
+                    {"id": event.id, "now": _utcnow()}
+                )
+                await session.commit()
+        except Exception as e:
+            await self._fail(event, e)
+            return
+
+        self.processed += 1
+        if self.payment_security:
+            await self.payment_security.mark_webhook_processed(event.dedup_key)
+        if after_commit:
+            try:
+                await after_commit()
+            except Exception as e:
+                logger.warning(f"[WEBHOOK] Post-commit step failed for {event.dedup_key}: {str(e)}")
+
+    async def _fail(self, event: WebhookEvent, error: Exception):
+        parked = event.attempts >= self.max_attempts
+        delay = self.retry_base_seconds * 2 ** (event.attempts - 1)
+        logger.error(
+            f"[WEBHOOK] {event.dedup_key} ({event.event_type}) failed on attempt {event.attempts}"
+            f"{', giving up' if parked else f', retrying in {delay:.0f}s'}: {str(error)}"
+        )
+        if parked:
+            self.failed += 1
+
+        async with self.session_maker() as session:
+            await session.execute(
+                text(
+                    "UPDATE webhook_events SET status = :status, available_at = :available_at, "
+                    "last_error = :error, locked_by = NULL WHERE id = :id"
+                ),
+                {
+                    "id": event.id,
+                    "status": STATUS_FAILED if parked else STATUS_PENDING,
+                    "available_at": _utcnow() + timedelta(seconds=delay),
+                    "error": str(error)[:2000],
+                }
+            )
+            await session.commit()
+
+    async def process_pending(self) -> int:
+        """Claim and process one batch
+
+        Returns:
+            Number of events claimed
+        """
+        events = await self.claim()
+        # One event per session per batch, so they can run concurrently
+        await asyncio.gather(*[self._process(event) for event in events])
+        return len(events)
+
+    async def retry(self, event_id: int) -> bool:
+        """Put a parked event back on the queue"""
+        async with self.session_maker() as session:
+            result = await session.execute(
+                text(
+                    "UPDATE webhook_events SET status = 'pending', attempts = 0, available_at = :now "
+                    "WHERE id = :id AND status = 'failed'"
+                ),
+                {"id": event_id, "now": _utcnow()}
+            )
+            await session.commit()
+        if result.rowcount:
+            self._wakeup.set()
+        return bool(result.rowcount)
+
+    async def purge(self) -> int:
+        """Delete processed events past the retention window"""
+        if self.retention_days <= 0:
+            return 0
+        deleted = 0
+        cutoff = _utcnow() - timedelta(days=self.retention_days)
+        while True:
+            async with self.session_maker() as session:
+                result = await session.execute(
+                    text("DELETE FROM webhook_events WHERE status = 'done' AND processed_at < :cutoff LIMIT 1000"),
+                    {"cutoff": cutoff}
+                )
+                await session.commit()
+            deleted += result.rowcount
+            if result.rowcount < 1000:
+                return deleted
+
+    async def get_stats(self) -> Dict[str, Any]:
+        async with self.session_maker() as session:
+            rows = (await session.execute(
+                text("SELECT status, COUNT(*), MIN(received_at) FROM webhook_events GROUP BY status")
+            )).all()
+        return {
+            "queue": {
+                status: {"count": count, "oldest": oldest.isoformat() if oldest else None}
+                for status, count, oldest in rows
+            },
+            "worker": {
+                "id": self.worker_id,
+                "processed": self.processed,
+                "failed": self.failed,
+                "duplicates": self.duplicates,
+            },
+        }
+
+    # ============ Lifecycle ============
+
+    def start(self):
+        """Start the background worker"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"[WEBHOOK] Queue worker started ({self.worker_id})")
+
+    async def _run(self):
+        while True:
+            try:
+                # Cleared before claiming so an enqueue during processing still wakes us
+                self._wakeup.clear()
+                claimed = await self.process_pending()
+                if claimed < self.batch_size:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+
+                now = _utcnow()
+                if self._last_purge is None or now - self._last_purge > timedelta(hours=1):
+                    self._last_purge = now
+                    await self.purge()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"[WEBHOOK] Worker error: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def stop(self):
+        """Stop the background worker (leased events are recovered after the lease expires)"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
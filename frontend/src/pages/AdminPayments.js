@@ -30,6 +30,7 @@ const AdminPayments = ({ user, onLogout }) => {
   const [loading, setLoading] = useState(true);
   const [searchQuery, setSearchQuery] = useState('');
   const [statusFilter, setStatusFilter] = useState('all');
+  const [gatewayFilter, setGatewayFilter] = useState('all');
   const [currentPage, setCurrentPage] = useState(1);
   const [selectedPayment, setSelectedPayment] = useState(null);
   const [showDetailsDialog, setShowDetailsDialog] = useState(false);
@@ -45,15 +46,18 @@ const AdminPayments = ({ user, onLogout }) => {
 
   useEffect(() => {
     fetchPayments();
-  }, []);
+  }, [statusFilter, gatewayFilter]);
 
   const fetchPayments = async () => {
     try {
       setLoading(true);
+      // Status and gateway are filtered server-side (indexed)
       const response = await axiosInstance.get('/admin/payments', {
         params: {
           limit: 100,
-          offset: 0
+          offset: 0,
+          payment_status: statusFilter === 'all' ? undefined : statusFilter,
+          gateway: gatewayFilter === 'all' ? undefined : gatewayFilter
         }
       });
       setPayments(response.data);
@@ -169,9 +173,7 @@ const AdminPayments = ({ user, onLogout }) => {
       payment.session_id?.toLowerCase().includes(searchQuery.toLowerCase()) ||
       payment.user_id?.toLowerCase().includes(searchQuery.toLowerCase());
     
-    const matchesStatus = statusFilter === 'all' || payment.payment_status === statusFilter;
-    
-    return matchesSearch && matchesStatus;
+    return matchesSearch;
   });
 
   // Pagination
@@ -271,6 +273,20 @@ const AdminPayments = ({ user, onLogout }) => {
                     <SelectItem value="refunded">Refunded</SelectItem>
                   </SelectContent>
                 </Select>
+                
+                <Select value={gatewayFilter} onValueChange={(value) => {
+                  setGatewayFilter(value);
+                  setCurrentPage(1);
+                }}>
+                  <SelectTrigger className="w-full md:w-48">
+                    <SelectValue placeholder="Gateway" />
+                  </SelectTrigger>
+                  <SelectContent>
+                    <SelectItem value="all">All Gateways</SelectItem>
+                    <SelectItem value="stripe">Stripe</SelectItem>
+                    <SelectItem value="razorpay">Razorpay</SelectItem>
+                  </SelectContent>
+                </Select>
               </div>
 
               {/* Payments Table */}
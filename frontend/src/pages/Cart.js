@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
 import { Button } from '@/components/ui/button';
 import { Card, CardContent } from '@/components/ui/card';
@@ -28,12 +28,27 @@ const Cart = ({ user, onLogout, cartCount, savedItemsCount, fetchCartCount, fetc
   // Saved items state
   const [savedItems, setSavedItems] = useState([]);
   const [savedItemsLoading, setSavedItemsLoading] = useState(false);
+  
+  // Idempotency keys per gateway: retries of the same checkout reuse the key,
+  // so the server replays the first session instead of creating another
+  const checkoutKeys = useRef({});
+  const checkoutKey = (gateway) => {
+    if (!checkoutKeys.current[gateway]) {
+      checkoutKeys.current[gateway] = crypto.randomUUID();
+    }
+    return checkoutKeys.current[gateway];
+  };
 
   useEffect(() => {
     fetchCart();
     fetchAvailableGateways();
     fetchSavedItems();
   }, []);
+  
+  // A changed cart or coupon is a new checkout
+  useEffect(() => {
+    checkoutKeys.current = {};
+  }, [cartItems, appliedCoupon]);
 
   const fetchAvailableGateways = async () => {
     try {
@@ -204,7 +219,9 @@ const Cart = ({ user, onLogout, cartCount, savedItemsCount, fetchCartCount, fetc
         checkoutData.discount_amount = discount;
       }
       
-      const response = await axiosInstance.post('/payment/checkout', checkoutData);
+      const response = await axiosInstance.post('/payment/checkout', checkoutData, {
+        headers: { 'Idempotency-Key': checkoutKey('stripe') }
+      });
       
       if (response.data && response.data.url) {
         console.log('Redirecting to Stripe checkout:', response.data.url);
@@ -220,7 +237,9 @@ const Cart = ({ user, onLogout, cartCount, savedItemsCount, fetchCartCount, fetc
 
   const handleRazorpayCheckout = async () => {
     const originUrl = window.location.origin;
-    const response = await axiosInstance.post('/payment/razorpay/create-order', { origin_url: originUrl });
+    const response = await axiosInstance.post('/payment/razorpay/create-order', { origin_url: originUrl }, {
+      headers: { 'Idempotency-Key': checkoutKey('razorpay') }
+    });
     
     const options = {
       key: response.data.key_id,
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { Link } from 'react-router-dom';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
@@ -10,6 +10,10 @@ import { toast } from 'sonner';
 import { axiosInstance } from '@/App';
 import SEO from '@/components/SEO';
 
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL || 'http://localhost:8001';
+// Wait before reopening a dropped alert stream (with a fresh stream token)
+const STREAM_RETRY_MS = 5000;
+
 const Inventory = ({ user, onLogout }) => {
   const [alerts, setAlerts] = useState([]);
   const [threshold, setThreshold] = useState(10);
@@ -18,11 +22,69 @@ const Inventory = ({ user, onLogout }) => {
   const [showThresholdDialog, setShowThresholdDialog] = useState(false);
   const [showBulkUpdateDialog, setShowBulkUpdateDialog] = useState(false);
   const [bulkUpdates, setBulkUpdates] = useState({});
+  const alertStream = useRef(null);
 
   useEffect(() => {
     fetchInventoryAlerts();
+    
+    // After the snapshot, alerts are pushed over SSE instead of re-fetched
+    let retryTimer = null;
+    let closed = false;
+    
+    const openStream = async () => {
+      if (closed || axiosInstance.isMockMode?.()) return;
+      try {
+        // EventSource can't send the Authorization header, so it gets a
+        // short-lived token that only opens this stream
+        const response = await axiosInstance.post('/admin/inventory/alerts/stream-token');
+        if (closed) return;
+        const source = new EventSource(
+          `${BACKEND_URL}/api/admin/inventory/alerts/stream?token=${encodeURIComponent(response.data.token)}`
+        );
+        source.addEventListener('inventory_alert', (event) => applyAlert(JSON.parse(event.data)));
+        source.onerror = () => {
+          // The token has expired by the time EventSource would reconnect, so reopen with a new one
+          source.close();
+          if (!closed) retryTimer = setTimeout(openStream, STREAM_RETRY_MS);
+        };
+        alertStream.current = source;
+      } catch (error) {
+        console.error('Inventory alert stream error:', error);
+        if (!closed) retryTimer = setTimeout(openStream, STREAM_RETRY_MS);
+      }
+    };
+    openStream();
+    
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      alertStream.current?.close();
+    };
   }, []);
 
+  // Merge one pushed alert into the list (resolved alerts drop out)
+  const applyAlert = (alert) => {
+    setAlerts(prev => {
+      const rest = prev.filter(a => a.product_id !== alert.product_id);
+      if (alert.alert_level === 'resolved') return rest;
+      const existing = prev.find(a => a.product_id === alert.product_id) || {};
+      const updated = {
+        ...existing,
+        product_id: alert.product_id,
+        product_name: alert.product_name,
+        current_stock: alert.new_stock,
+        threshold: alert.threshold,
+        alert_level: alert.alert_level
+      };
+      return [...rest, updated].sort((a, b) => a.current_stock - b.current_stock);
+    });
+    setBulkUpdates(prev => ({ ...prev, [alert.product_id]: alert.new_stock }));
+    
+    if (alert.alert_level !== 'resolved') {
+      toast.warning(`${alert.product_name}: ${alert.new_stock} left in stock`);
+    }
+  };
+
   const fetchInventoryAlerts = async () => {
     setLoading(true);
     try {
@@ -52,6 +52,7 @@ const PaymentSuccess = ({ user, onLogout, cartCount }) => {
   const pollPaymentStatus = async (attempts = 0) => {
     const maxAttempts = 5;
     const pollInterval = 2000; // 2 seconds
+    const waitSeconds = 10; // Server holds the request until the payment settles
 
     if (attempts >= maxAttempts) {
       toast.error('Payment status check timed out. Please check your orders.');
@@ -60,7 +61,10 @@ const PaymentSuccess = ({ user, onLogout, cartCount }) => {
     }
 
     try {
-      const response = await axiosInstance.get(`/payment/status/${sessionId}`);
+      const response = await axiosInstance.get(`/payment/status/${sessionId}`, {
+        params: { wait: waitSeconds },
+        timeout: (waitSeconds + 5) * 1000
+      });
       setPaymentStatus(response.data);
 
       if (response.data.payment_status === 'paid') {
@@ -11,6 +11,8 @@ import SEO from '@/components/SEO';
 import { trackProductView as trackProductViewGA, trackAddToCart, trackReviewSubmit } from '@/utils/analytics';
 import { ProductAddedToast } from '@/components/EnhancedToast';
 
+const REVIEWS_PAGE_SIZE = 10;
+
 const ProductDetail = ({ user, onLogout, cartCount, fetchCartCount }) => {
   const { productId } = useParams();
   const navigate = useNavigate();
@@ -18,6 +20,8 @@ const ProductDetail = ({ user, onLogout, cartCount, fetchCartCount }) => {
   const [loading, setLoading] = useState(true);
   const [reviews, setReviews] = useState([]);
   const [reviewsLoading, setReviewsLoading] = useState(true);
+  const [reviewsPage, setReviewsPage] = useState(0);
+  const [userReview, setUserReview] = useState(null);
   const [showReviewForm, setShowReviewForm] = useState(false);
   const [editingReview, setEditingReview] = useState(null);
   const [rating, setRating] = useState(5);
@@ -32,12 +36,16 @@ const ProductDetail = ({ user, onLogout, cartCount, fetchCartCount }) => {
 
   useEffect(() => {
     fetchProduct();
-    fetchReviews();
+    fetchReviews(0);
     fetchRelatedProducts();
     fetchProductImages();
     trackProductView();
   }, [productId]);
 
+  useEffect(() => {
+    fetchUserReview();
+  }, [productId, user]);
+
   const trackProductView = async () => {
     if (user) {
       try {
@@ -84,10 +92,14 @@ const ProductDetail = ({ user, onLogout, cartCount, fetchCartCount }) => {
     }
   };
 
-  const fetchReviews = async () => {
+  const fetchReviews = async (page) => {
     try {
-      const response = await axiosInstance.get(`/products/${productId}/reviews`);
+      const offset = page * REVIEWS_PAGE_SIZE;
+      const response = await axiosInstance.get(
+        `/products/${productId}/reviews?limit=${REVIEWS_PAGE_SIZE}&offset=${offset}`
+      );
       setReviews(response.data);
+      setReviewsPage(page);
     } catch (error) {
       console.error('Failed to load reviews');
     } finally {
@@ -95,6 +107,27 @@ const ProductDetail = ({ user, onLogout, cartCount, fetchCartCount }) => {
     }
   };
 
+  // The user's own review may be on any page, so it is fetched directly
+  const fetchUserReview = async () => {
+    if (!user) {
+      setUserReview(null);
+      return;
+    }
+    try {
+      const response = await axiosInstance.get(`/products/${productId}/reviews/mine`);
+      setUserReview(response.data.review);
+    } catch (error) {
+      console.error('Failed to load your review');
+    }
+  };
+
+  // Reload the rating summary, the first page and the user's review after a write
+  const refreshReviews = () => {
+    fetchProduct();
+    fetchReviews(0);
+    fetchUserReview();
+  };
+
   const addToCart = async () => {
     if (!user) {
       navigate('/login');
@@ -174,7 +207,7 @@ const ProductDetail = ({ user, onLogout, cartCount, fetchCartCount }) => {
       setComment('');
       setShowReviewForm(false);
       setEditingReview(null);
-      fetchReviews();
+      refreshReviews();
     } catch (error) {
       toast.error(error.response?.data?.detail || 'Failed to submit review');
     }
@@ -193,7 +226,7 @@ const ProductDetail = ({ user, onLogout, cartCount, fetchCartCount }) => {
     try {
       await axiosInstance.delete(`/reviews/${reviewId}`);
       toast.success('Review deleted successfully');
-      fetchReviews();
+      refreshReviews();
     } catch (error) {
       toast.error('Failed to delete review');
     }
@@ -254,11 +287,12 @@ const ProductDetail = ({ user, onLogout, cartCount, fetchCartCount }) => {
     setIsZoomed(false);
   };
 
-  const averageRating = reviews.length > 0 
-    ? (reviews.reduce((sum, r) => sum + r.rating, 0) / reviews.length).toFixed(1)
+  // Average and count come from the product's rating summary, not the loaded page
+  const reviewCount = product?.rating?.count || 0;
+  const averageRating = product?.rating?.average != null
+    ? product.rating.average.toFixed(1)
     : 0;
-
-  const userReview = user ? reviews.find(r => r.user_id === user.user_id) : null;
+  const reviewPages = Math.ceil(reviewCount / REVIEWS_PAGE_SIZE);
 
   if (loading) {
     return (
@@ -488,7 +522,7 @@ const ProductDetail = ({ user, onLogout, cartCount, fetchCartCount }) => {
           <div className="flex items-center justify-between mb-8">
             <div>
               <h2 className="text-3xl font-bold text-gray-900">Customer Reviews</h2>
-              {reviews.length > 0 && (
+              {reviewCount > 0 && (
                 <div className="flex items-center gap-2 mt-2">
                   <div className="flex">
                     {[1, 2, 3, 4, 5].map((star) => (
@@ -505,7 +539,7 @@ const ProductDetail = ({ user, onLogout, cartCount, fetchCartCount }) => {
                   <span className="text-lg font-semibold text-gray-700">
                     {averageRating} out of 5
                   </span>
-                  <span className="text-gray-500">({reviews.length} reviews)</span>
+                  <span className="text-gray-500">({reviewCount} reviews)</span>
                 </div>
               )}
             </div>
@@ -577,7 +611,7 @@ const ProductDetail = ({ user, onLogout, cartCount, fetchCartCount }) => {
           {/* Reviews List */}
           {reviewsLoading ? (
             <p className="text-gray-600">Loading reviews...</p>
-          ) : reviews.length === 0 ? (
+          ) : reviews.length === 0 && reviewsPage === 0 ? (
             <Card className="glass border-0">
               <CardContent className="p-8 text-center">
                 <p className="text-gray-600 mb-4">No reviews yet. Be the first to review this product!</p>
@@ -642,6 +676,31 @@ const ProductDetail = ({ user, onLogout, cartCount, fetchCartCount }) => {
                   </CardContent>
                 </Card>
               ))}
+              {reviewPages > 1 && (
+                <div className="flex items-center justify-center gap-4 pt-4">
+                  <Button
+                    variant="outline"
+                    size="sm"
+                    disabled={reviewsPage === 0}
+                    onClick={() => fetchReviews(reviewsPage - 1)}
+                  >
+                    <ChevronLeft className="w-4 h-4 mr-1" />
+                    Previous
+                  </Button>
+                  <span className="text-sm text-gray-600">
+                    Page {reviewsPage + 1} of {reviewPages}
+                  </span>
+                  <Button
+                    variant="outline"
+                    size="sm"
+                    disabled={reviewsPage + 1 >= reviewPages}
+                    onClick={() => fetchReviews(reviewsPage + 1)}
+                  >
+                    Next
+                    <ChevronRight className="w-4 h-4 ml-1" />
+                  </Button>
+                </div>
+              )}
             </div>
           )}
         </div>
@@ -69,7 +69,7 @@ class ApiAdapter {
   async request(method, url, data = null, config = {}) {
     // If explicitly using mock mode, use mock API
     if (this.useMock) {
-      return this.handleMockRequest(method, url, data);
+      return this.handleMockRequest(method, url, data, config);
     }
 
     // Try real API first
@@ -95,7 +95,7 @@ class ApiAdapter {
       if (error.code === 'ECONNABORTED' || error.code === 'ERR_NETWORK' || !error.response) {
         console.log(`⚠️ Backend request failed, using mock data for: ${url}`);
         this.useMock = true; // Switch to mock mode
-        return this.handleMockRequest(method, url, data);
+        return this.handleMockRequest(method, url, data, config);
       }
       
       // For other errors (401, 404, etc.), throw them
@@ -103,11 +103,14 @@ class ApiAdapter {
     }
   }
 
-  handleMockRequest(method, url, data) {
+  handleMockRequest(method, url, data, config = {}) {
     // Remove leading slash and query params for routing
     const cleanUrl = url.split('?')[0].replace(/^\//, '');
     const queryString = url.includes('?') ? url.split('?')[1] : '';
-    const params = Object.fromEntries(new URLSearchParams(queryString));
+    // Query params from the URL and from axios-style config.params (unset ones dropped, as axios does)
+    const configParams = Object.entries(config?.params || {})
+      .filter(([, value]) => value !== undefined && value !== null);
+    const params = { ...Object.fromEntries(new URLSearchParams(queryString)), ...Object.fromEntries(configParams) };
 
     // Route to appropriate mock API method
     try {
@@ -275,7 +278,11 @@ class ApiAdapter {
       // Reviews routes
       if (cleanUrl.match(/^products\/[^/]+\/reviews$/) && method === 'GET') {
         const productId = cleanUrl.split('/')[1];
-        return mockApiService.getProductReviews(productId);
+        return mockApiService.getProductReviews(productId, params);
+      }
+      if (cleanUrl.match(/^products\/[^/]+\/reviews\/mine$/) && method === 'GET') {
+        const productId = cleanUrl.split('/')[1];
+        return mockApiService.getMyReview(productId);
       }
       if (cleanUrl === 'reviews' && method === 'POST') {
         return mockApiService.addReview(data);
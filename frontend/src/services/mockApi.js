@@ -123,12 +123,22 @@ class MockApiService {
 
   async getProduct(id) {
     await delay();
-    const { currentProducts } = getMockState();
+    const { currentProducts, currentReviews } = getMockState();
     const product = currentProducts.find(p => p.id === id);
     if (!product) {
       throw new Error('Product not found');
     }
-    return { data: product };
+    // Same rating summary shape as the backend
+    const ratings = currentReviews.filter(r => r.product_id === id).map(r => r.rating);
+    const histogram = Object.fromEntries([1, 2, 3, 4, 5].map(star => [
+      String(star), ratings.filter(r => r === star).length
+    ]));
+    const rating = {
+      count: ratings.length,
+      average: ratings.length ? Math.round(ratings.reduce((sum, r) => sum + r, 0) / ratings.length * 100) / 100 : null,
+      histogram
+    };
+    return { data: { ...product, rating } };
   }
 
   async createProduct(productData) {
@@ -637,11 +647,25 @@ class MockApiService {
   }
 
   // Reviews endpoints
-  async getProductReviews(productId) {
+  async getProductReviews(productId, params = {}) {
     await delay();
     const { currentReviews } = getMockState();
-    const productReviews = currentReviews.filter(r => r.product_id === productId);
-    return { data: productReviews };
+    const limit = parseInt(params.limit) || 20;
+    const offset = parseInt(params.offset) || 0;
+    const productReviews = currentReviews
+      .filter(r => r.product_id === productId)
+      .sort((a, b) => new Date(b.created_at) - new Date(a.created_at));
+    return { data: productReviews.slice(offset, offset + limit) };
+  }
+
+  async getMyReview(productId) {
+    await delay();
+    const { currentReviews } = getMockState();
+    const storedUser = localStorage.getItem('user');
+    const currentUser = storedUser ? JSON.parse(storedUser) : {};
+    const userId = currentUser.user_id || currentUser.id;
+    const review = currentReviews.find(r => r.product_id === productId && r.user_id === userId);
+    return { data: { review: review || null } };
   }
 
   async addReview(reviewData) {
@@ -911,10 +935,19 @@ class MockApiService {
   async getAdminPayments(params = {}) {
     await delay();
     const { currentPayments } = getMockState();
-    const limit = params.limit || 100;
-    const offset = params.offset || 0;
-    
-    return { data: currentPayments.slice(offset, offset + limit) };
+    const limit = parseInt(params.limit) || 100;
+    const offset = parseInt(params.offset) || 0;
+    
+    // Same filters as the backend; payments without a gateway are Stripe
+    const payments = currentPayments
+      .filter(p => !params.payment_status || p.payment_status === params.payment_status)
+      .filter(p => !params.gateway || (p.metadata?.gateway || 'stripe') === params.gateway)
+      .filter(p => !params.user_id || p.user_id === params.user_id)
+      .filter(p => !params.created_from || new Date(p.created_at) >= new Date(params.created_from))
+      .filter(p => !params.created_to || new Date(p.created_at) < new Date(params.created_to))
+      .sort((a, b) => new Date(b.created_at) - new Date(a.created_at));
+    
+    return { data: payments.slice(offset, offset + limit) };
   }
 
   async getPaymentDetails(sessionId) {
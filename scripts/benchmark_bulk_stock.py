@@ -0,0 +1,108 @@
+"""
+Benchmark bulk stock updates: per-row round trips vs set-based chunks.
+
+Inserts synthetic products inside a transaction, times both approaches
+against them and rolls everything back, so the catalog is left untouched.
+Needs the MySQL database configured in backend/.env.
+
+Usage:
+    python scripts/benchmark_bulk_stock.py [--sizes 1000 10000 100000] [--legacy-max 10000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add parent directory to path to import from backend
+sys.path.append(str(Path(__file__).parent.parent / 'backend'))
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+
+from inventory import apply_stock_levels
+
+# Load environment variables
+ROOT_DIR = Path(__file__).parent.parent / 'backend'
+load_dotenv(ROOT_DIR / '.env')
+
+DB_HOST = os.environ.get('DB_HOST', 'localhost')
+DB_PORT = os.environ.get('DB_PORT', '3001')
+DB_USER = os.environ.get('DB_USER', 'root')
+DB_PASSWORD = os.environ.get('DB_PASSWORD', '')
+DB_NAME = os.environ.get('DB_NAME', 'specs')
+
+DATABASE_URL = f"mysql+aiomysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+INSERT_PRODUCT = text(
+    "INSERT INTO products (id, name, brand, price, description, category, frame_type, "
+    "frame_shape, color, image_url, stock, created_at) VALUES (:id, :name, 'Bench', 99.0, '', "
+    "'men', 'full-rim', 'round', 'Black', '', :stock, :created_at)"
+)
+
+
+async def seed(session, count: int):
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    rows = [
+        {"id": f"bench-{i:07d}", "name": f"Bench product {i}", "stock": 100, "created_at": now}
+        for i in range(count)
+    ]
+    for start in range(0, count, 5000):
+        await session.execute(INSERT_PRODUCT, rows[start:start + 5000])
+    return [row["id"] for row in rows]
+
+
+async def legacy_update(session, levels):
+    """The previous implementation: one SELECT and one UPDATE per product"""
+    for product_id, stock in levels.items():
+        result = await session.execute(text("SELECT * FROM products WHERE id = :id"), {"id": product_id})
+        result.one()
+        await session.execute(
+            text("UPDATE products SET stock = :stock WHERE id = :id"), {"id": product_id, "stock": stock}
+        )
+
+
+def report(label: str, size: int, seconds: float):
+    print(f"  {label:<12} {size:>8} rows  {seconds:8.3f}s  {size / seconds:10.0f} rows/s")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--legacy-max", type=int, default=10_000,
+                        help="skip the per-row approach above this many rows")
+    args = parser.parse_args()
+
+    engine = create_async_engine(DATABASE_URL, echo=False)
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    rng = random.Random(42)
+
+    try:
+        for size in args.sizes:
+            print(f"{size} products:")
+            async with session_maker() as session:
+                product_ids = await seed(session, size)
+
+                if size <= args.legacy_max:
+                    levels = {pid: rng.randint(0, 500) for pid in product_ids}
+                    started = time.perf_counter()
+                    await legacy_update(session, levels)
+                    report("per-row", size, time.perf_counter() - started)
+
+                levels = {pid: rng.randint(0, 500) for pid in product_ids}
+                started = time.perf_counter()
+                updated, missing = await apply_stock_levels(session, levels)
+                report("set-based", size, time.perf_counter() - started)
+                assert not missing and len(updated) == size
+
+                await session.rollback()
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
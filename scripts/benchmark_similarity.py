@@ -0,0 +1,98 @@
+"""
+Benchmark the attribute-similarity index on a synthetic catalog.
+
+Measures index build time, cold top-K ranking throughput (full scan per
+query), cached lookups and incremental updates.
+
+Usage:
+    python scripts/benchmark_similarity.py [--products 100000] [--queries 2000]
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Add parent directory to path to import from backend
+sys.path.append(str(Path(__file__).parent.parent / 'backend'))
+
+from product_similarity import ProductSimilarityIndex
+
+CATEGORIES = ['men', 'women', 'kids', 'sunglasses']
+FRAME_TYPES = ['full-rim', 'half-rim', 'rimless']
+FRAME_SHAPES = ['rectangular', 'round', 'cat-eye', 'aviator', 'wayfarer', 'square', 'oval']
+COLORS = ['Black', 'Gold', 'Silver', 'Tortoise', 'Blue', 'Red', 'Brown', 'Clear', 'Pink', 'Green']
+BRANDS = [f"Brand{i}" for i in range(200)]
+
+
+def make_catalog(count: int, seed: int = 42):
+    rng = random.Random(seed)
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": f"prod-{i:06d}",
+            "category": rng.choice(CATEGORIES),
+            "frame_type": rng.choice(FRAME_TYPES),
+            "frame_shape": rng.choice(FRAME_SHAPES),
+            "color": rng.choice(COLORS),
+            "brand": rng.choice(BRANDS),
+            "price": round(rng.uniform(20, 800), 2),
+            "stock": rng.choice([0] + [rng.randint(1, 200)] * 9),
+            "created_at": start + timedelta(minutes=i),
+        }
+        for i in range(count)
+    ]
+
+
+def report(label: str, seconds: float, operations: int):
+    per_op_ms = seconds / operations * 1000
+    print(f"  {label:<32} {operations:>8} ops  {seconds:8.3f}s  "
+          f"{per_op_ms:8.3f} ms/op  {operations / seconds:10.0f} ops/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    args = parser.parse_args()
+
+    catalog = make_catalog(args.products)
+    rng = random.Random(7)
+    query_ids = [rng.choice(catalog)["id"] for _ in range(args.queries)]
+
+    index = ProductSimilarityIndex()
+    # Measure ranking, not the eviction policy
+    index.cache_size = args.queries + 1
+
+    print(f"Catalog: {args.products} products, top_k={index.top_k}")
+
+    started = time.perf_counter()
+    index.build(catalog)
+    report("build", time.perf_counter() - started, 1)
+
+    started = time.perf_counter()
+    for product_id in query_ids:
+        index.related(product_id, index.top_k)
+    report("top-K ranking (cold)", time.perf_counter() - started, len(query_ids))
+
+    started = time.perf_counter()
+    for product_id in query_ids:
+        index.related(product_id, index.top_k)
+    report("top-K lookup (cached)", time.perf_counter() - started, len(query_ids))
+
+    updates = [dict(rng.choice(catalog), color=rng.choice(COLORS)) for _ in range(200)]
+    started = time.perf_counter()
+    for product in updates:
+        index.upsert(product)
+    report("incremental upsert", time.perf_counter() - started, len(updates))
+    print(f"  cached lists kept after upserts: {index.get_stats()['cached_neighbor_lists']}")
+
+    stock_changes = {rng.choice(catalog)["id"]: rng.randint(0, 5) for _ in range(1000)}
+    started = time.perf_counter()
+    index.update_stock(stock_changes)
+    report("stock update (1000 products)", time.perf_counter() - started, 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Bulk import products from a CSV or NDJSON file.
+
+Rows are validated with ProductCreate and upserted in chunks
+(INSERT ... ON DUPLICATE KEY UPDATE). Rows with an existing id update
+that product; rows without one are created. The file is streamed, so
+catalogs of any size run in constant memory.
+
+Usage:
+    python scripts/import_products.py catalog.csv [--format csv|ndjson] [--batch-size 1000]
+"""
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+# Add parent directory to path to import from backend
+sys.path.append(str(Path(__file__).parent.parent / 'backend'))
+
+from server import get_product_importer, cache_service
+from product_import import ImportFormatError, IMPORT_FORMATS, detect_format, parse_rows
+
+CHUNK_SIZE = 64 * 1024
+
+
+async def read_chunks(path: Path):
+    with open(path, 'rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            yield chunk
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--format", choices=IMPORT_FORMATS)
+    parser.add_argument("--batch-size", type=int)
+    args = parser.parse_args()
+
+    try:
+        import_format = args.format or detect_format(None, args.path.name)
+    except ImportFormatError as e:
+        parser.error(str(e))
+
+    # Product caches are invalidated per batch when Redis is reachable
+    await cache_service.connect()
+    try:
+        report = await get_product_importer(args.batch_size).run(
+            parse_rows(read_chunks(args.path), import_format)
+        )
+    except ImportFormatError as e:
+        print(f"Import failed: {e}")
+        sys.exit(1)
+    finally:
+        await cache_service.disconnect()
+
+    print(f"{report['upserted']} products upserted in {report['batches']} batches ({report['seconds']}s)")
+    if report['failed']:
+        print(f"{report['failed']} rows failed:")
+        for error in report['errors']:
+            print(f"   row {error['row']}: {json.dumps(error['errors'])}")
+        if report['errors_truncated']:
+            print("   ... more errors not shown")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,51 @@
+"""
+Apply pending database migrations.
+
+Run once per deploy, before starting the API workers; workers only check
+that the schema is at the expected revision and refuse to start otherwise.
+
+Usage:
+    python scripts/migrate.py             # upgrade to the latest revision
+    python scripts/migrate.py --check     # print current/expected revision, exit 1 if behind
+    python scripts/migrate.py --target 0002
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Add parent directory to path to import from backend
+sys.path.append(str(Path(__file__).parent.parent / 'backend'))
+
+from server import Base, engine
+from migrations import HEAD, MIGRATIONS, current_revision, upgrade
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="report the revision without migrating")
+    parser.add_argument("--target", help="stop after this revision")
+    args = parser.parse_args()
+
+    try:
+        async with engine.connect() as conn:
+            current = await current_revision(conn)
+        print(f"Current revision: {current or 'none'}  (latest: {HEAD})")
+
+        if args.check:
+            pending = [m for m in MIGRATIONS if current is None or m.revision > current]
+            for migration in pending:
+                print(f"  pending {migration.revision}: {migration.description}")
+            sys.exit(1 if pending else 0)
+
+        applied = await upgrade(engine, Base.metadata, target=args.target)
+        if applied:
+            print(f"Applied migrations: {', '.join(applied)}")
+        else:
+            print("Database is up to date")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
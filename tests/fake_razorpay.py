@@ -0,0 +1,127 @@
+"""
+Local fake of the Razorpay orders API for tests.
+
+Serves POST/GET /v1/orders and GET /v1/orders/{id} from memory, checks basic
+auth, and can inject failures and latency:
+
+    fake = FakeRazorpay()
+    fake.fail_next(2, status_code=503)   # next two requests get a 503
+    fake.delay = 0.2                     # every request sleeps 200ms
+
+Tests use it in-process through httpx.ASGITransport(app=fake.app). It can
+also be served for manual testing against the real backend:
+
+    uvicorn tests.fake_razorpay:app --port 9010
+    RAZORPAY_API_BASE=http://localhost:9010/v1 ...
+"""
+import asyncio
+import base64
+import secrets
+import time
+from typing import Dict, List, Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+KEY_ID = "rzp_test_fake"
+KEY_SECRET = "fake_secret"
+
+
+class FakeRazorpay:
+    def __init__(self, key_id: str = KEY_ID, key_secret: str = KEY_SECRET):
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.orders: Dict[str, dict] = {}
+        self.requests: List[str] = []
+        self.delay = 0.0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._failures: List[tuple] = []
+        self.app = Starlette(routes=[
+            Route("/v1/orders", self.create_order, methods=["POST"]),
+            Route("/v1/orders", self.list_orders, methods=["GET"]),
+            Route("/v1/orders/{order_id}", self.fetch_order, methods=["GET"]),
+        ])
+
+    def fail_next(self, count: int, status_code: int = 503, retry_after: Optional[str] = None):
+        """Answer the next `count` requests with an error"""
+        self._failures.extend([(status_code, retry_after)] * count)
+
+    def mark_paid(self, order_id: str):
+        self.orders[order_id]["status"] = "paid"
+        self.orders[order_id]["amount_paid"] = self.orders[order_id]["amount"]
+        self.orders[order_id]["amount_due"] = 0
+
+    @staticmethod
+    def error(status_code: int, description: str, code: str = "BAD_REQUEST_ERROR", headers=None):
+        return JSONResponse(
+            {"error": {"code": code, "description": description}},
+            status_code=status_code,
+            headers=headers,
+        )
+
+    async def _before(self, request: Request) -> Optional[JSONResponse]:
+        self.requests.append(f"{request.method} {request.url.path}")
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+        expected = base64.b64encode(f"{self.key_id}:{self.key_secret}".encode()).decode()
+        if request.headers.get("authorization") != f"Basic {expected}":
+            return self.error(401, "Authentication failed")
+
+        if self._failures:
+            status_code, retry_after = self._failures.pop(0)
+            headers = {"Retry-After": retry_after} if retry_after else None
+            return self.error(status_code, "Injected failure", code="SERVER_ERROR", headers=headers)
+        return None
+
+    async def _handle(self, request: Request, handler):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await self._before(request) or await handler(request)
+        finally:
+            self.in_flight -= 1
+
+    async def create_order(self, request: Request):
+        async def handler(request: Request):
+            body = await request.json()
+            amount = body.get("amount")
+            if not isinstance(amount, int) or amount < 100:
+                return self.error(400, "The amount must be atleast INR 1.00")
+            order = {
+                "id": f"order_{secrets.token_hex(7)}",
+                "entity": "order",
+                "amount": amount,
+                "amount_paid": 0,
+                "amount_due": amount,
+                "currency": body.get("currency", "INR"),
+                "receipt": body.get("receipt"),
+                "status": "created",
+                "attempts": 0,
+                "notes": body.get("notes") or [],
+                "created_at": int(time.time()),
+            }
+            self.orders[order["id"]] = order
+            return JSONResponse(order)
+        return await self._handle(request, handler)
+
+    async def list_orders(self, request: Request):
+        async def handler(request: Request):
+            count = int(request.query_params.get("count", 10))
+            items = list(self.orders.values())[-count:]
+            return JSONResponse({"entity": "collection", "count": len(items), "items": items})
+        return await self._handle(request, handler)
+
+    async def fetch_order(self, request: Request):
+        async def handler(request: Request):
+            order = self.orders.get(request.path_params["order_id"])
+            if order is None:
+                return self.error(400, "The id provided does not exist")
+            return JSONResponse(order)
+        return await self._handle(request, handler)
+
+
+app = FakeRazorpay().app
@@ -0,0 +1,151 @@
+"""
+Tests for IdempotencyMiddleware in backend/middleware.py: a repeated request
+replays the stored response, a key reused with a different body is rejected,
+and a concurrent duplicate waits for the first request instead of running
+the handler again. The wait is bounded even when the in-flight check errors.
+"""
+import asyncio
+import secrets
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+sys.path.append(str(Path(__file__).parent.parent / 'backend'))
+
+from middleware import IdempotencyMiddleware
+
+
+class FakePaymentSecurity:
+    """Idempotency responses and in-flight locks kept in memory"""
+
+    def __init__(self):
+        self.responses = {}
+        self.locks = {}
+        self.lock_checks = 0
+
+    async def check_idempotency_key(self, idempotency_key, user_id):
+        return self.responses.get((user_id, idempotency_key))
+
+    async def set_idempotency_response(self, idempotency_key, user_id, response, ttl_hours=24):
+        self.responses[(user_id, idempotency_key)] = response
+
+    async def acquire_idempotency_lock(self, idempotency_key, user_id, ttl_seconds=60):
+        if (user_id, idempotency_key) in self.locks:
+            return None
+        token = secrets.token_hex(8)
+        self.locks[(user_id, idempotency_key)] = token
+        return token
+
+    async def keep_idempotency_lock(self, idempotency_key, user_id, token, ttl_seconds=60):
+        await asyncio.Event().wait()
+
+    async def is_idempotency_locked(self, idempotency_key, user_id):
+        self.lock_checks += 1
+        return (user_id, idempotency_key) in self.locks
+
+    async def release_idempotency_lock(self, idempotency_key, user_id, token):
+        if self.locks.get((user_id, idempotency_key)) == token:
+            del self.locks[(user_id, idempotency_key)]
+
+
+def make_app(payment_security, handler_delay=0.0):
+    app = FastAPI()
+    calls = []
+
+    @app.post("/api/orders")
+    async def create_order(request: Request):
+        calls.append(await request.json())
+        await asyncio.sleep(handler_delay)
+        return {"order_id": f"order-{len(calls)}"}
+
+    app.add_middleware(
+        IdempotencyMiddleware,
+        payment_security=payment_security,
+        paths=["/api/orders"],
+        user_resolver=lambda request: request.headers.get("X-User"),
+    )
+    return app, calls
+
+
+def post(client, body, key="key-1"):
+    return client.post("/api/orders", json=body, headers={"Idempotency-Key": key, "X-User": "user-1"})
+
+
+def run_with_client(app, scenario):
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await scenario(client)
+
+    return asyncio.run(main())
+
+
+def test_replay_returns_stored_response():
+    app, calls = make_app(FakePaymentSecurity())
+
+    async def scenario(client):
+        return await post(client, {"cart": 1}), await post(client, {"cart": 1})
+
+    first, second = run_with_client(app, scenario)
+    assert len(calls) == 1
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json() == {"order_id": "order-1"}
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+
+
+def test_key_reused_with_different_body_is_rejected():
+    app, calls = make_app(FakePaymentSecurity())
+
+    async def scenario(client):
+        await post(client, {"cart": 1})
+        return await post(client, {"cart": 2})
+
+    response = run_with_client(app, scenario)
+    assert len(calls) == 1
+    assert response.status_code == 422
+
+
+def test_concurrent_duplicate_waits_for_first_response(monkeypatch):
+    monkeypatch.setenv('IDEMPOTENCY_POLL_INTERVAL_SECONDS', '0.01')
+    payment_security = FakePaymentSecurity()
+    app, calls = make_app(payment_security, handler_delay=0.1)
+
+    async def scenario(client):
+        return await asyncio.gather(post(client, {"cart": 1}), post(client, {"cart": 1}))
+
+    first, second = run_with_client(app, scenario)
+    assert len(calls) == 1
+    assert first.json() == second.json() == {"order_id": "order-1"}
+    assert {first.headers.get("Idempotent-Replayed"), second.headers.get("Idempotent-Replayed")} == {None, "true"}
+    assert payment_security.locks == {}
+
+
+@pytest.mark.parametrize("lock_check", ["errors", "held"])
+def test_wait_for_held_key_is_bounded(monkeypatch, lock_check):
+    monkeypatch.setenv('IDEMPOTENCY_WAIT_SECONDS', '0.2')
+    monkeypatch.setenv('IDEMPOTENCY_POLL_INTERVAL_SECONDS', '0.02')
+    payment_security = FakePaymentSecurity()
+    # Another worker holds the key and never finishes
+    payment_security.locks[("user-1", "key-1")] = "other-holder"
+    if lock_check == "errors":
+        # is_idempotency_locked reports False when Redis errors
+        async def is_idempotency_locked(idempotency_key, user_id):
+            payment_security.lock_checks += 1
+            return False
+
+        payment_security.is_idempotency_locked = is_idempotency_locked
+    app, calls = make_app(payment_security)
+
+    async def scenario(client):
+        return await post(client, {"cart": 1})
+
+    response = run_with_client(app, scenario)
+    assert calls == []
+    assert response.status_code == 409
+    assert response.headers["Retry-After"] == "1"
+    # One check per poll interval, not a hot loop
+    assert payment_security.lock_checks <= 0.2 / 0.02 + 1
@@ -0,0 +1,62 @@
+"""
+Tests for LeasedTokenBucketRateLimiter in backend/rate_limiter.py: workers
+lease tokens from one shared counter, so however their requests interleave,
+the total allowed per window never exceeds the limit.
+
+Each limiter instance stands in for one worker; they share a limits
+MemoryStorage the way workers share Redis.
+"""
+import sys
+from pathlib import Path
+
+import pytest
+from limits import parse
+from limits.storage import MemoryStorage
+
+sys.path.append(str(Path(__file__).parent.parent / 'backend'))
+
+from rate_limiter import LeasedTokenBucketRateLimiter
+
+
+def workers(count: int):
+    storage = MemoryStorage()
+    return [LeasedTokenBucketRateLimiter(storage) for _ in range(count)]
+
+
+@pytest.mark.parametrize("limit", ["100/minute", "5/minute", "3/minute"])
+def test_two_workers_share_one_limit(limit):
+    item = parse(limit)
+    first, second = workers(2)
+
+    allowed = [0, 0]
+    for i in range(item.amount * 3):
+        worker = i % 2
+        if (first, second)[worker].hit(item, "user:1"):
+            allowed[worker] += 1
+
+    assert sum(allowed) == item.amount
+    # Both workers got a share of the budget
+    assert all(allowed)
+
+
+def test_uneven_traffic_stays_within_limit():
+    item = parse("100/minute")
+    busy, quiet = workers(2)
+
+    # The quiet worker leases a chunk it barely spends before the busy one drains the rest
+    allowed = int(quiet.hit(item, "user:1"))
+    allowed += sum(busy.hit(item, "user:1") for _ in range(item.amount * 2))
+    allowed += sum(quiet.hit(item, "user:1") for _ in range(item.amount))
+
+    assert allowed == item.amount
+    # Once the shared budget is gone, the busy worker decides locally
+    assert busy.get_metrics()["local_decisions"] > busy.get_metrics()["leases"]
+
+
+def test_limits_are_per_identifier():
+    item = parse("5/minute")
+    first, second = workers(2)
+
+    assert sum(first.hit(item, "user:1") for _ in range(10)) == 5
+    assert sum(second.hit(item, "user:2") for _ in range(10)) == 5
+    assert not second.hit(item, "user:1")
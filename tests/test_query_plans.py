@@ -0,0 +1,171 @@
+"""
+Query-plan regression tests for the hot queries.
+
+Each query mirrors a handler in backend/server.py. EXPLAIN must offer an
+index whose leading columns match the filter (and sort) of the query, so a
+dropped index or a query rewritten into an unindexable shape fails here
+instead of showing up as a full table scan in production.
+
+With QUERY_PLAN_STRICT=1 (CI against a seeded database) the chosen access
+type must also not be a full scan; on near-empty tables MySQL may
+legitimately prefer one, so that check is opt-in.
+
+Runs against the MySQL database configured in backend/.env (or
+QUERY_PLAN_DATABASE_URL) and is skipped when it isn't reachable.
+"""
+import os
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from dotenv import load_dotenv
+
+sqlalchemy = pytest.importorskip("sqlalchemy")
+pytest.importorskip("pymysql")
+
+from sqlalchemy import create_engine, text
+
+ROOT_DIR = Path(__file__).parent.parent / 'backend'
+load_dotenv(ROOT_DIR / '.env')
+
+DATABASE_URL = os.environ.get('QUERY_PLAN_DATABASE_URL') or (
+    f"mysql+pymysql://{os.environ.get('DB_USER', 'root')}:{os.environ.get('DB_PASSWORD', '')}"
+    f"@{os.environ.get('DB_HOST', 'localhost')}:{os.environ.get('DB_PORT', '3001')}"
+    f"/{os.environ.get('DB_NAME', 'specs')}"
+)
+STRICT = os.environ.get('QUERY_PLAN_STRICT') == '1'
+
+SINCE = datetime(2024, 1, 1)
+UNTIL = datetime(2024, 12, 31)
+
+# (name, table, SQL, params, acceptable leading index columns)
+HOT_QUERIES = [
+    (
+        "product listing by category, newest first", "products",
+        "SELECT * FROM products WHERE category = :category ORDER BY created_at DESC LIMIT 20",
+        {"category": "men"}, [("category",)],
+    ),
+    (
+        "related products fallback (in stock, same category or brand)", "products",
+        "SELECT * FROM products WHERE stock > 0 AND (category = :category OR brand = :brand) "
+        "ORDER BY created_at DESC LIMIT 8",
+        {"category": "men", "brand": "RayBan"},
+        [("category", "stock"), ("brand", "stock"), ("created_at",)],
+    ),
+    (
+        "low-stock alerts", "products",
+        "SELECT * FROM products WHERE stock <= :threshold ORDER BY stock",
+        {"threshold": 10}, [("stock",)],
+    ),
+    (
+        "analytics date range", "orders",
+        "SELECT * FROM orders WHERE created_at >= :since AND created_at <= :until",
+        {"since": SINCE, "until": UNTIL}, [("created_at",)],
+    ),
+    (
+        "paid revenue", "orders",
+        "SELECT SUM(total_amount) FROM orders WHERE payment_status = 'paid'",
+        {}, [("payment_status", "created_at")],
+    ),
+    (
+        "user order history", "orders",
+        "SELECT * FROM orders WHERE user_id = :user_id ORDER BY created_at DESC",
+        {"user_id": "user-1"}, [("user_id", "created_at")],
+    ),
+    (
+        "cart item lookup", "cart",
+        "SELECT * FROM cart WHERE user_id = :user_id AND product_id = :product_id",
+        {"user_id": "user-1", "product_id": "prod-001"}, [("user_id", "product_id")],
+    ),
+    (
+        "wishlist item lookup", "wishlist",
+        "SELECT * FROM wishlist WHERE user_id = :user_id AND product_id = :product_id",
+        {"user_id": "user-1", "product_id": "prod-001"}, [("user_id", "product_id")],
+    ),
+    (
+        "saved item lookup", "saved_items",
+        "SELECT * FROM saved_items WHERE user_id = :user_id AND product_id = :product_id",
+        {"user_id": "user-1", "product_id": "prod-001"}, [("user_id", "product_id")],
+    ),
+    (
+        "recently viewed upsert key", "recently_viewed",
+        "SELECT * FROM recently_viewed WHERE user_id = :user_id AND product_id = :product_id",
+        {"user_id": "user-1", "product_id": "prod-001"}, [("user_id", "product_id")],
+    ),
+    (
+        "review page, newest first", "reviews",
+        "SELECT * FROM reviews WHERE product_id = :product_id ORDER BY created_at DESC LIMIT 20",
+        {"product_id": "prod-001"}, [("product_id", "created_at")],
+    ),
+    (
+        "order tracking history", "order_tracking",
+        "SELECT * FROM order_tracking WHERE order_id = :order_id ORDER BY created_at",
+        {"order_id": "order-1"}, [("order_id", "created_at")],
+    ),
+    (
+        "admin payments by status and date", "payment_transactions",
+        "SELECT * FROM payment_transactions WHERE payment_status = :status "
+        "AND created_at >= :since AND created_at < :until ORDER BY created_at DESC LIMIT 100",
+        {"status": "pending", "since": SINCE, "until": UNTIL}, [("payment_status", "created_at")],
+    ),
+    (
+        "admin payments by gateway", "payment_transactions",
+        "SELECT * FROM payment_transactions WHERE gateway = :gateway ORDER BY created_at DESC LIMIT 100",
+        {"gateway": "razorpay"}, [("gateway", "created_at")],
+    ),
+    (
+        "admin payments by user", "payment_transactions",
+        "SELECT * FROM payment_transactions WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 100",
+        {"user_id": "user-1"}, [("user_id", "created_at"), ("user_id",)],
+    ),
+]
+
+
+@pytest.fixture(scope="module")
+def connection():
+    engine = create_engine(DATABASE_URL)
+    try:
+        conn = engine.connect()
+    except Exception as e:
+        pytest.skip(f"MySQL not reachable for query-plan tests: {e}")
+    try:
+        yield conn
+    finally:
+        conn.close()
+        engine.dispose()
+
+
+def index_columns(connection, table: str) -> dict:
+    """Index name -> column tuple (in key order)"""
+    indexes: dict = {}
+    for row in connection.execute(text(f"SHOW INDEX FROM `{table}`")).mappings():
+        indexes.setdefault(row["Key_name"], []).append((row["Seq_in_index"], row["Column_name"]))
+    return {name: tuple(column for _, column in sorted(parts)) for name, parts in indexes.items()}
+
+
+@pytest.mark.parametrize(
+    "table, sql, params, expected",
+    [query[1:] for query in HOT_QUERIES],
+    ids=[query[0] for query in HOT_QUERIES],
+)
+def test_hot_query_uses_index(connection, table, sql, params, expected):
+    plan = [
+        row for row in connection.execute(text(f"EXPLAIN {sql}"), params).mappings()
+        if row["table"] == table
+    ]
+    assert plan, f"EXPLAIN returned no row for {table}"
+    row = plan[0]
+
+    indexes = index_columns(connection, table)
+    candidates = [name for name in (row["possible_keys"] or "").split(",") if name]
+    usable = [
+        name for name in candidates
+        if any(indexes.get(name, ())[:len(columns)] == columns for columns in expected)
+    ]
+    assert usable, (
+        f"No index on {table} with leading columns {expected}; "
+        f"possible keys: {candidates or 'none'} (access type {row['type']})"
+    )
+
+    if STRICT:
+        assert row["type"] != "ALL", f"Full scan of {table}: {dict(row)}"
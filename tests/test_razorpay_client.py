@@ -0,0 +1,221 @@
+"""
+Tests for the async Razorpay client against the in-process fake server
+(tests/fake_razorpay.py): order round trips, retry policy, concurrency on a
+single pooled client and local signature checks.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent / 'backend'))
+
+from razorpay_client import AsyncRazorpayClient, RazorpayError
+from payment_gateway import RazorpayGateway
+from tests.fake_razorpay import FakeRazorpay, KEY_ID, KEY_SECRET
+
+BASE_URL = "http://razorpay.test/v1"
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setenv("RAZORPAY_RETRY_BACKOFF", "0.001")
+    monkeypatch.setenv("RAZORPAY_RETRY_BACKOFF_MAX", "0.01")
+
+
+@pytest.fixture
+def fake():
+    return FakeRazorpay()
+
+
+def make_client(fake, key_secret=KEY_SECRET, transport=None):
+    return AsyncRazorpayClient(
+        KEY_ID, key_secret, base_url=BASE_URL,
+        transport=transport or httpx.ASGITransport(app=fake.app),
+    )
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_create_and_fetch_order(fake):
+    async def scenario():
+        client = make_client(fake)
+        try:
+            order = await client.create_order({"amount": 49900, "currency": "INR", "notes": {"user_id": "u1"}})
+            fetched = await client.fetch_order(order["id"])
+        finally:
+            await client.aclose()
+        return order, fetched
+
+    order, fetched = run(scenario())
+    assert order["status"] == "created"
+    assert fetched == order
+    assert fetched["notes"] == {"user_id": "u1"}
+
+
+def test_api_error_is_raised_with_details(fake):
+    async def scenario():
+        client = make_client(fake)
+        try:
+            await client.create_order({"amount": 10, "currency": "INR"})
+        finally:
+            await client.aclose()
+
+    with pytest.raises(RazorpayError) as excinfo:
+        run(scenario())
+    assert excinfo.value.status_code == 400
+    assert excinfo.value.code == "BAD_REQUEST_ERROR"
+
+
+def test_bad_credentials_are_not_retried(fake):
+    async def scenario():
+        client = make_client(fake, key_secret="wrong")
+        try:
+            await client.fetch_order("order_x")
+        finally:
+            await client.aclose()
+
+    with pytest.raises(RazorpayError) as excinfo:
+        run(scenario())
+    assert excinfo.value.status_code == 401
+    assert len(fake.requests) == 1
+
+
+def test_fetch_retries_server_errors(fake):
+    async def scenario():
+        client = make_client(fake)
+        try:
+            order = await client.create_order({"amount": 10000, "currency": "INR"})
+            fake.fail_next(2, status_code=502)
+            return await client.fetch_order(order["id"])
+        finally:
+            await client.aclose()
+
+    assert run(scenario())["status"] == "created"
+    assert len(fake.requests) == 4
+
+
+def test_create_retries_only_unprocessed_responses(fake):
+    async def scenario():
+        client = make_client(fake)
+        try:
+            fake.fail_next(1, status_code=429, retry_after="0")
+            order = await client.create_order({"amount": 10000, "currency": "INR"})
+            # A 500 may have created the order already, so it is not retried
+            fake.fail_next(1, status_code=500)
+            with pytest.raises(RazorpayError):
+                await client.create_order({"amount": 10000, "currency": "INR"})
+            return order
+        finally:
+            await client.aclose()
+
+    order = run(scenario())
+    assert list(fake.orders) == [order["id"]]
+    assert len(fake.requests) == 3
+
+
+def test_gives_up_after_max_retries(fake, monkeypatch):
+    monkeypatch.setenv("RAZORPAY_MAX_RETRIES", "2")
+
+    async def scenario():
+        client = make_client(fake)
+        try:
+            fake.fail_next(5)
+            await client.fetch_order("order_x")
+        finally:
+            await client.aclose()
+
+    with pytest.raises(RazorpayError) as excinfo:
+        run(scenario())
+    assert excinfo.value.status_code == 503
+    assert len(fake.requests) == 3
+
+
+def test_connect_errors_are_retried_for_create(fake):
+    attempts = []
+    inner = httpx.ASGITransport(app=fake.app)
+
+    class FlakyTransport(httpx.AsyncBaseTransport):
+        async def handle_async_request(self, request):
+            attempts.append(request.url.path)
+            if len(attempts) == 1:
+                raise httpx.ConnectError("connection refused", request=request)
+            return await inner.handle_async_request(request)
+
+    async def scenario():
+        client = make_client(fake, transport=FlakyTransport())
+        try:
+            return await client.create_order({"amount": 10000, "currency": "INR"})
+        finally:
+            await client.aclose()
+
+    assert run(scenario())["id"] in fake.orders
+    assert len(attempts) == 2
+
+
+def test_requests_run_concurrently_on_one_client(fake):
+    fake.delay = 0.1
+
+    async def scenario():
+        client = make_client(fake)
+        try:
+            started = time.perf_counter()
+            await asyncio.gather(*[
+                client.create_order({"amount": 10000, "currency": "INR"}) for _ in range(10)
+            ])
+            return time.perf_counter() - started
+        finally:
+            await client.aclose()
+
+    elapsed = run(scenario())
+    assert fake.max_in_flight == 10
+    assert elapsed < 0.5
+
+
+def test_payment_signature():
+    client = AsyncRazorpayClient(KEY_ID, KEY_SECRET, base_url=BASE_URL)
+    signature = hmac.new(KEY_SECRET.encode(), b"order_1|pay_1", hashlib.sha256).hexdigest()
+
+    assert client.verify_payment_signature("order_1", "pay_1", signature)
+    assert not client.verify_payment_signature("order_1", "pay_2", signature)
+    assert not client.verify_payment_signature("order_1", "pay_1", "")
+    run(client.aclose())
+
+
+def test_gateway_status_and_webhook(fake, monkeypatch):
+    monkeypatch.setenv("RAZORPAY_WEBHOOK_SECRET", "whsec")
+    body = json.dumps({
+        "event": "payment.captured",
+        "payload": {"payment": {"entity": {"order_id": "order_1"}}},
+    }).encode()
+    signature = hmac.new(b"whsec", body, hashlib.sha256).hexdigest()
+
+    async def scenario():
+        gateway = RazorpayGateway(
+            KEY_ID, KEY_SECRET, base_url=BASE_URL, transport=httpx.ASGITransport(app=fake.app)
+        )
+        try:
+            checkout = await gateway.create_checkout_session(499.0, "inr", "", "", {"user_id": "u1"})
+            pending = await gateway.get_payment_status(checkout.session_id)
+            fake.mark_paid(checkout.session_id)
+            paid = await gateway.get_payment_status(checkout.session_id)
+            webhook = await gateway.verify_webhook(body, signature)
+            with pytest.raises(ValueError):
+                await gateway.verify_webhook(body, "0" * 64)
+        finally:
+            await gateway.close()
+        return checkout, pending, paid, webhook
+
+    checkout, pending, paid, webhook = run(scenario())
+    assert fake.orders[checkout.session_id]["amount"] == 49900
+    assert pending.payment_status == "pending"
+    assert paid.payment_status == "paid" and paid.amount_total == 499.0
+    assert webhook.session_id == "order_1" and webhook.payment_status == "paid"
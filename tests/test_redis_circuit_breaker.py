@@ -0,0 +1,92 @@
+"""
+Tests for the Redis circuit breaker in backend/redis_pool.py: the half-open
+trial call must always be settled, whatever it raises, so the breaker can't
+stay half-open (and short-circuit every call) for the life of the process.
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+import redis.asyncio as redis
+from redis.exceptions import ConnectionError as RedisConnectionError, NoScriptError, ResponseError
+
+sys.path.append(str(Path(__file__).parent.parent / 'backend'))
+
+from redis_pool import CircuitBreaker, CircuitOpenError, GuardedRedis
+
+
+def opened_breaker() -> CircuitBreaker:
+    """A breaker that has just tripped and lets its trial call through now"""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == "open"
+    return breaker
+
+
+def client_raising(monkeypatch, breaker: CircuitBreaker, error: BaseException) -> GuardedRedis:
+    calls = []
+
+    async def execute_command(self, *args, **options):
+        calls.append(args)
+        if len(calls) == 1:
+            raise error
+        return "PONG"
+
+    monkeypatch.setattr(redis.Redis, "execute_command", execute_command)
+    return GuardedRedis(breaker=breaker)
+
+
+@pytest.mark.parametrize("error", [NoScriptError("NOSCRIPT"), ResponseError("WRONGTYPE")])
+def test_redis_error_on_trial_closes_breaker(monkeypatch, error):
+    breaker = opened_breaker()
+    client = client_raising(monkeypatch, breaker, error)
+
+    async def scenario():
+        with pytest.raises(type(error)):
+            await client.execute_command("EVALSHA", "abc", 0)
+        # Redis answered, so it is reachable: the next call goes through
+        assert breaker.state == "closed"
+        assert await client.execute_command("PING") == "PONG"
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_trial_releases_half_open_slot(monkeypatch):
+    breaker = opened_breaker()
+    client = client_raising(monkeypatch, breaker, asyncio.CancelledError())
+
+    async def scenario():
+        with pytest.raises(asyncio.CancelledError):
+            await client.execute_command("GET", "key")
+        assert breaker.state == "half_open"
+        assert await client.execute_command("PING") == "PONG"
+        assert breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_connection_error_on_trial_reopens_breaker(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    client = client_raising(monkeypatch, breaker, RedisConnectionError("refused"))
+
+    async def scenario():
+        with pytest.raises(RedisConnectionError):
+            await client.execute_command("GET", "key")
+        assert breaker.state == "open"
+
+    asyncio.run(scenario())
+
+
+def test_open_breaker_short_circuits(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    client = client_raising(monkeypatch, breaker, ResponseError("unused"))
+
+    async def scenario():
+        with pytest.raises(CircuitOpenError):
+            await client.execute_command("GET", "key")
+
+    asyncio.run(scenario())
+    assert breaker.short_circuited == 1
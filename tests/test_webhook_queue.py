@@ -0,0 +1,181 @@
+"""
+Tests for the durable webhook queue in backend/webhook_queue.py: duplicate
+deliveries are dropped, events of one payment session are handled in
+arrival order, and an event that keeps failing is parked after
+WEBHOOK_MAX_ATTEMPTS instead of retrying forever.
+
+The queue's SQL runs against SQLite behind a minimal async session. The
+two MySQL-only clauses it uses (INSERT IGNORE, FOR UPDATE SKIP LOCKED)
+are rewritten on the way to the driver.
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, event, text
+
+sys.path.append(str(Path(__file__).parent.parent / 'backend'))
+
+from webhook_queue import WebhookQueue
+
+WEBHOOK_EVENTS = """
+CREATE TABLE webhook_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    gateway VARCHAR(20) NOT NULL,
+    event_id VARCHAR(255) NOT NULL,
+    session_id VARCHAR(255) NOT NULL,
+    event_type VARCHAR(100) NOT NULL,
+    payment_status VARCHAR(50) NOT NULL,
+    payload TEXT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    locked_by VARCHAR(100),
+    locked_until DATETIME,
+    available_at DATETIME NOT NULL,
+    received_at DATETIME NOT NULL,
+    processed_at DATETIME,
+    UNIQUE (gateway, event_id)
+)
+"""
+
+
+class FakeSession:
+    """Just enough of AsyncSession for the queue: execute and commit"""
+
+    def __init__(self, engine):
+        self.connection = engine.connect()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        # Uncommitted work is rolled back, as with a real session
+        self.connection.close()
+
+    async def execute(self, statement, params=None):
+        return self.connection.execute(statement, params or {})
+
+    async def commit(self):
+        self.connection.commit()
+
+
+class FakePaymentSecurity:
+    """Processed-webhook keys kept in memory"""
+
+    def __init__(self):
+        self.processed = set()
+
+    async def check_webhook_processed(self, key):
+        return key in self.processed
+
+    async def mark_webhook_processed(self, key):
+        self.processed.add(key)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'queue.db'}")
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def mysql_to_sqlite(conn, cursor, statement, parameters, context, executemany):
+        statement = statement.replace("INSERT IGNORE", "INSERT OR IGNORE")
+        return statement.replace(" FOR UPDATE SKIP LOCKED", ""), parameters
+
+    with engine.begin() as conn:
+        conn.execute(text(WEBHOOK_EVENTS))
+    yield engine
+    engine.dispose()
+
+
+def make_queue(engine, monkeypatch, **env) -> WebhookQueue:
+    # Failed events become available again at once
+    monkeypatch.setenv('WEBHOOK_RETRY_BASE_SECONDS', '0')
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    return WebhookQueue(lambda: FakeSession(engine), FakePaymentSecurity())
+
+
+def statuses(engine):
+    with engine.connect() as conn:
+        return dict(conn.execute(text("SELECT event_id, status FROM webhook_events")).all())
+
+
+def test_duplicate_enqueue_is_dropped(engine, monkeypatch):
+    queue = make_queue(engine, monkeypatch)
+    handled = []
+
+    async def handler(session, webhook_event):
+        handled.append(webhook_event.event_id)
+
+    queue.register("stripe", handler)
+
+    async def scenario():
+        assert await queue.enqueue("stripe", b"{}", "cs_1", "checkout.session.completed", "paid", "evt_1")
+        # Redelivered before it was processed: dropped by the unique key
+        assert not await queue.enqueue("stripe", b"{}", "cs_1", "checkout.session.completed", "paid", "evt_1")
+        assert await queue.process_pending() == 1
+        # Redelivered after it was processed: dropped by the processed-webhook key
+        assert not await queue.enqueue("stripe", b"{}", "cs_1", "checkout.session.completed", "paid", "evt_1")
+        assert await queue.process_pending() == 0
+
+    asyncio.run(scenario())
+    assert handled == ["evt_1"]
+    assert queue.duplicates == 2
+    assert statuses(engine) == {"evt_1": "done"}
+
+
+def test_events_of_one_session_run_in_order(engine, monkeypatch):
+    queue = make_queue(engine, monkeypatch)
+    handled = []
+    failing = {"evt_a1"}
+
+    async def handler(session, webhook_event):
+        handled.append(webhook_event.event_id)
+        if webhook_event.event_id in failing:
+            failing.discard(webhook_event.event_id)
+            raise RuntimeError("gateway timeout")
+
+    queue.register("stripe", handler)
+
+    async def scenario():
+        await queue.enqueue("stripe", b"a1", "cs_a", "payment_intent.processing", "unpaid", "evt_a1")
+        await queue.enqueue("stripe", b"a2", "cs_a", "checkout.session.completed", "paid", "evt_a2")
+        await queue.enqueue("stripe", b"b1", "cs_b", "checkout.session.completed", "paid", "evt_b1")
+
+        # One event per session per batch: evt_a2 waits behind evt_a1
+        assert await queue.process_pending() == 2
+        # evt_a1 failed and is pending again, so it still goes before evt_a2
+        assert await queue.process_pending() == 1
+        assert await queue.process_pending() == 1
+        assert await queue.process_pending() == 0
+
+    asyncio.run(scenario())
+    assert handled == ["evt_a1", "evt_b1", "evt_a1", "evt_a2"]
+    assert statuses(engine) == {"evt_a1": "done", "evt_a2": "done", "evt_b1": "done"}
+
+
+def test_failure_parks_event_after_max_attempts(engine, monkeypatch):
+    queue = make_queue(engine, monkeypatch, WEBHOOK_MAX_ATTEMPTS='3')
+    attempts = []
+
+    async def handler(session, webhook_event):
+        attempts.append(webhook_event.attempts)
+        raise RuntimeError("order pipeline unavailable")
+
+    queue.register("razorpay", handler)
+
+    async def scenario():
+        await queue.enqueue("razorpay", b"{}", "order_1", "payment.captured", "paid", "evt_1")
+        for _ in range(3):
+            assert await queue.process_pending() == 1
+        # Parked: no longer claimed
+        assert await queue.process_pending() == 0
+
+    asyncio.run(scenario())
+    assert attempts == [1, 2, 3]
+    assert queue.failed == 1
+    assert statuses(engine) == {"evt_1": "failed"}
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT last_error FROM webhook_events")).scalar() == "order pipeline unavailable"